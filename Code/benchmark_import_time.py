@@ -0,0 +1,67 @@
+"""
+Import-time benchmark of the PubMedium modules.
+Starts a fresh interpreter for every measurement and reports the best wall-clock time of 'import <module>',
+together with the heavy third-party modules loaded by the import (which should be none for the CLI).
+
+    python benchmark_import_time.py
+    python benchmark_import_time.py --repeat 20 --max-ms 150 pubmed_cli
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules measured by default.
+DEFAULT_MODULES = ["pubmed_cli", "pubmed_fetcher", "pubmed_corpus_creator", "pubmed_writers"]
+
+# Third-party modules which must not be loaded eagerly.
+HEAVY_MODULES = ["requests", "numpy", "pandas", "bs4", "aiohttp"]
+
+# Code run in the fresh interpreter: prints the import time in ms and the heavy modules loaded.
+_MEASUREMENT_CODE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(module: str, repeat: int) -> tuple[float, str]:
+    """
+    Measures the import time of a module.
+    :param module: The name of the module.
+    :param repeat: The number of measurements; the best one is returned.
+    :return: Tuple of the best import time in ms and the heavy modules loaded.
+    """
+    code = _MEASUREMENT_CODE.format(module=module, heavy=HEAVY_MODULES)
+    code_folder = os.path.dirname(os.path.abspath(__file__))
+    best = float("inf")
+    heavy = ""
+
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=code_folder, capture_output=True, text=True,
+                                check=True).stdout.split()
+        best = min(best, float(output[0]))
+        heavy = output[1] if len(output) > 1 else ""
+
+    return best, heavy
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import-time benchmark of the PubMedium modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="The modules to measure.")
+    parser.add_argument("--repeat", type=int, default=10, help="Number of measurements per module.")
+    parser.add_argument("--max-ms", type=float, default=0.0,
+                        help="If set, exits with 1 when a module takes longer or loads a heavy module.")
+    arguments = parser.parse_args()
+
+    failed = False
+    for module in arguments.modules:
+        milliseconds, heavy = measure(module, arguments.repeat)
+        print(f"{module:<28}{milliseconds:8.1f} ms   heavy modules loaded: {heavy or '-'}")
+
+        if arguments.max_ms > 0 and (milliseconds > arguments.max_ms or heavy):
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -1,3 +1,11 @@
+import sys
+
+from pubmed_cli import main
+
+if len(sys.argv) > 1:
+    # Non-interactive use, e.g. 'python create_corpus.py --size 100 --topics dicom,pacs --output-folder C:/Temp'.
+    sys.exit(main(["corpus"] + sys.argv[1:]))
+
 from pubmed_corpus_creator import PubMedCorpusCreator
 
 
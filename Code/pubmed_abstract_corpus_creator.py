@@ -0,0 +1,245 @@
+import hashlib
+import os
+import re
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from pubmed_fetcher import PubMedFetcher
+from pubmed_publication import PubMedPublication
+from pubmed_shards import PubMedShardCodec, PubMedShardWriter, DEFAULT_MAXIMUM_SHARD_SIZE
+
+# Number of publications handed to a worker process at once.
+DEFAULT_BATCH_SIZE = 1000
+
+# Maximum Hamming distance of the 64 bit SimHashes of two abstracts considered near-identical.
+# The index splits the hashes into NEAR_DUPLICATE_DISTANCE + 1 bands, so every such pair shares a band.
+NEAR_DUPLICATE_DISTANCE = 3
+
+# Number of words of the shingles the SimHash is computed over.
+SHINGLE_SIZE = 3
+
+_WHITESPACE_PATTERN = re.compile(r"[ \t\u00a0]+")
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class PubMedAbstractCorpusCreator(PubMedFetcher):
+    """
+    Creates abstract-only corpora, independent of PMC PDFs: the abstracts are streamed from a topic search
+    or from local PubMed XML files, normalized (keeping the labels of structured abstracts), deduplicated
+    (exact and near-identical texts, by hashing) and written into compressed shards (see PubMedShardReader).
+    Normalization, hashing and compression run in worker processes; the main process only deduplicates
+    and appends the encoded records.
+    """
+    def create_abstract_corpus(self, output_folder: str, topics: Optional[list[str]] = None,
+                               files: Optional[list[str]] = None, processes: Optional[int] = None,
+                               batch_size: int = DEFAULT_BATCH_SIZE, compression: str = "gzip",
+                               maximum_shard_size: int = DEFAULT_MAXIMUM_SHARD_SIZE,
+                               remove_near_duplicates: bool = True) -> int:
+        """
+        Creates an abstract corpus.
+        :param output_folder: The folder to write the shards into. If the folder does not exist, it will be created.
+        :param topics: List of topics to fetch the publications for (combined by AND).
+        :param files: List of local PubMed XML files (.xml, .xml.gz) to read the publications from, instead of topics.
+        :param processes: The number of worker processes. Default: the number of CPUs.
+        :param batch_size: The number of publications handed to a worker at once.
+        :param compression: The compression of the shards: "gzip" (default), "zstd" or "none".
+        :param maximum_shard_size: The size in bytes after which a new shard is started.
+        :param remove_near_duplicates: If set to True (default), near-identical abstracts are skipped, too.
+        :return: The number of abstracts written.
+        """
+        if files is not None:
+            publications = self.iterate_from_files(files)
+        elif topics is not None and len(topics) > 0:
+            PubMedFetcher.print_intermediate_results = False
+            publications = self.iterate_by_topics(topics)
+        else:
+            print("Neither topics nor files defined. Canceling.")
+            return 0
+
+        exact_hashes = set()
+        near_duplicate_index = SimHashIndex(NEAR_DUPLICATE_DISTANCE)
+        number_of_duplicates = 0
+
+        with PubMedShardWriter(output_folder, maximum_shard_size, compression) as writer:
+            for pmid, pmc_id, exact_hash, simhash, payload in self._prepare(publications, processes, batch_size,
+                                                                             compression):
+                if exact_hash in exact_hashes or \
+                        (remove_near_duplicates and near_duplicate_index.contains_near(simhash)):
+                    number_of_duplicates += 1
+                    continue
+
+                exact_hashes.add(exact_hash)
+                if remove_near_duplicates:
+                    near_duplicate_index.add(simhash)
+
+                writer.write_encoded(payload, [str(pmid), pmc_id])
+
+                if writer.count % 10000 == 0:
+                    print(f"Written {writer.count} abstracts ({number_of_duplicates} duplicates skipped)")
+
+            print(f"*** Created {writer.count} abstracts in {output_folder} ({number_of_duplicates} duplicates skipped).")
+
+            return writer.count
+
+    # region Protected auxiliary
+    def _prepare(self, publications: Iterable[PubMedPublication], processes: Optional[int], batch_size: int,
+                 compression: str) -> Iterator[tuple]:
+        """
+        Prepares the abstracts in worker processes, keeping the order and a bounded number of batches in flight.
+        :param publications: The publications.
+        :param processes: The number of worker processes.
+        :param batch_size: The number of publications per batch.
+        :param compression: The compression of the shards.
+        :return: Iterator over the tuples (PMID, PMC ID, exact hash, SimHash, encoded record).
+        """
+        processes = processes or os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = deque()
+
+            for batch in self._batches(publications, batch_size):
+                futures.append(executor.submit(prepare_abstracts, batch, compression))
+
+                if len(futures) >= 2 * processes:
+                    yield from futures.popleft().result()
+
+            while len(futures) > 0:
+                yield from futures.popleft().result()
+
+    def _batches(self, publications: Iterable[PubMedPublication], batch_size: int) -> Iterator[list[tuple]]:
+        """
+        Groups the publications with an abstract into batches of small, picklable tuples.
+        :param publications: The publications.
+        :param batch_size: The number of publications per batch.
+        :return: Iterator over the batches of tuples (PMID, PMC ID, title, abstract sections).
+        """
+        batch = []
+
+        for publication in publications:
+            sections = publication.abstract_sections
+            if len(sections) == 0 and len(publication.abstract.strip()) > 0:
+                sections = [("", publication.abstract)]
+
+            if len(sections) == 0:
+                continue
+
+            batch.append((publication.publication_id, publication.article_ids.get("PMC", ""),
+                          publication.article_title, sections))
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if len(batch) > 0:
+            yield batch
+    # endregion
+
+
+class SimHashIndex:
+    """
+    Finds 64 bit SimHashes within a given Hamming distance of a new one.
+    The hashes are split into distance + 1 bands; two hashes within the distance agree in at least one band,
+    so only the hashes sharing a band have to be compared.
+    """
+    def __init__(self, distance: int = NEAR_DUPLICATE_DISTANCE):
+        """
+        Creates an empty index.
+        :param distance: The maximum Hamming distance of near-identical hashes.
+        """
+        self.distance = distance
+        self._band_bits = 64 // (distance + 1)
+        self._bands: list[dict[int, list[int]]] = [{} for _ in range(distance + 1)]
+
+    def add(self, simhash: int):
+        """
+        Adds a hash.
+        :param simhash: The hash.
+        :return: None.
+        """
+        for band, band_value in enumerate(self._band_values(simhash)):
+            self._bands[band].setdefault(band_value, []).append(simhash)
+
+    def contains_near(self, simhash: int) -> bool:
+        """
+        :param simhash: The hash.
+        :return: True if a hash within the distance was added.
+        """
+        for band, band_value in enumerate(self._band_values(simhash)):
+            for candidate in self._bands[band].get(band_value, ()):
+                if (candidate ^ simhash).bit_count() <= self.distance:
+                    return True
+
+        return False
+
+    # region Protected auxiliary
+    def _band_values(self, simhash: int) -> list[int]:
+        """
+        :param simhash: The hash.
+        :return: The values of the bands of the hash.
+        """
+        mask = (1 << self._band_bits) - 1
+        return [(simhash >> (band * self._band_bits)) & mask for band in range(len(self._bands))]
+    # endregion
+
+
+# region Worker functions
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a text: Unicode NFKC (ligatures, full width forms), single spaces, no empty lines.
+    :param text: The text.
+    :return: The normalized text.
+    """
+    lines = (_WHITESPACE_PATTERN.sub(" ", line).strip() for line in unicodedata.normalize("NFKC", text).splitlines())
+    return "\n".join(line for line in lines if len(line) > 0)
+
+
+def simhash(text: str) -> int:
+    """
+    Computes the 64 bit SimHash of a text over its word shingles.
+    :param text: The text.
+    :return: The hash.
+    """
+    import numpy as np
+
+    words = _WORD_PATTERN.findall(text.lower())
+    shingles = {" ".join(words[index: index + SHINGLE_SIZE]) for index in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), 64)
+    fingerprint = np.packbits(bits.sum(axis=0) * 2 > len(shingles))
+
+    return int.from_bytes(fingerprint.tobytes(), "big")
+
+
+def prepare_abstracts(batch: list[tuple], compression: str) -> list[tuple]:
+    """
+    Prepares a batch of abstracts (run in a worker process): normalizes the sections, hashes and encodes the records.
+    :param batch: List of tuples (PMID, PMC ID, title, abstract sections).
+    :param compression: The compression of the shards.
+    :return: List of tuples (PMID, PMC ID, exact hash, SimHash, encoded record).
+    """
+    codec = PubMedShardCodec(compression)
+    result = []
+
+    for pmid, pmc_id, title, sections in batch:
+        sections = [(label, normalize_text(text)) for label, text in sections]
+        text = "\n".join(f"{label}: {section}" if len(label) > 0 else section for label, section in sections)
+
+        if len(text) == 0:
+            continue
+
+        comparable_text = " ".join(_WORD_PATTERN.findall(text.lower()))
+        exact_hash = hashlib.blake2b(comparable_text.encode("utf-8"), digest_size=16).digest()
+
+        record = {"PMID": pmid, "PMCID": pmc_id, "title": title, "sections": sections, "text": text}
+        result.append((pmid, pmc_id, exact_hash, simhash(comparable_text), codec.encode(record)))
+
+    return result
+# endregion
+
+
+if __name__ == '__main__':
+    creator = PubMedAbstractCorpusCreator()
+    creator.create_abstract_corpus("C:/Temp/dicom_abstracts", topics=["dicom"])
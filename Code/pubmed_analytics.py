@@ -0,0 +1,334 @@
+from array import array
+from typing import Iterable, Optional
+
+import numpy as np
+
+from pubmed_author_registry import normalize_name
+from pubmed_publication import PubMedPublication
+
+# region Constants
+PUBLICATION_FIELDS = ["year", "month", "journal", "language"]   # One value per publication.
+MULTI_VALUED_FIELDS = ["keyword", "author"]                     # Any number of values per publication.
+AUTHOR_FIELDS = ["last_name", "fore_name"]                      # One value per distinct author.
+# endregion
+
+
+class PubMedAnalytics:
+    """
+    Column store of a set of publications for fast aggregations. The publications are read once and turned into
+    categorical NumPy arrays: every field has its sorted distinct values (categories) and an array of codes into them.
+    Group-by counts are np.bincount over the codes, co-occurrences are counted over (code, code) pairs
+    and returned as sparse COO arrays.
+
+    Fields:
+    * "year", "month", "journal", "language": one value per publication.
+    * "keyword", "author": any number of values per publication (authors as "Last, Fore", one per distinct author).
+    * "last_name", "fore_name": one value per distinct author (normalized, see normalize_name), for name statistics.
+    Distinct authors are told apart by their registry ID (see PubMedFetcher.deduplicate_authors);
+    authors without ID count once per publication.
+    """
+    def __init__(self, publications: Iterable[PubMedPublication]):
+        """
+        Reads the publications, e.g. a list returned by PubMedFetcher.fetch_by_topics() or a stream of
+        PubMedFetcher.iterate_by_topics().
+        :param publications: The publications.
+        """
+        encoders = {field: {} for field in PUBLICATION_FIELDS + MULTI_VALUED_FIELDS + AUTHOR_FIELDS}
+        codes = {field: array("i") for field in encoders}
+        publication_indices = {field: array("i") for field in MULTI_VALUED_FIELDS}
+        pmids = array("q")
+        date_ordinals = array("i")
+        author_rows: dict[int, int] = {}            # Registry ID -> author row.
+
+        for publication in publications:
+            index = len(pmids)
+            pmids.append(publication.publication_id)
+
+            date = publication.publication_date
+            date_ordinals.append(date.ordinal)
+            codes["year"].append(self._encode(encoders["year"], date.year if date.year > 0 else None))
+            codes["month"].append(self._encode(encoders["month"], date.month if 1 <= date.month <= 12 else None))
+            codes["journal"].append(self._encode(encoders["journal"], publication.journal_title.strip() or None))
+            codes["language"].append(self._encode(encoders["language"], publication.language.strip() or None))
+
+            for keyword in set(keyword.strip() for keyword in publication.keywords):
+                if len(keyword) > 0:
+                    codes["keyword"].append(self._encode(encoders["keyword"], keyword))
+                    publication_indices["keyword"].append(index)
+
+            for author in publication.authors:
+                row = author_rows.get(author.id) if author.id > 0 else None
+
+                if row is None:
+                    row = len(codes["last_name"])
+                    last_name = normalize_name(author.last_name)
+                    first_fore_name = normalize_name(author.fore_name).split(" ")[0]
+                    codes["last_name"].append(self._encode(encoders["last_name"], last_name or None))
+                    codes["fore_name"].append(self._encode(encoders["fore_name"], first_fore_name or None))
+                    if author.id > 0:
+                        author_rows[author.id] = row
+
+                # Authors are categories of their own, told apart by row; the names are attached in _finish().
+                codes["author"].append(self._encode(encoders["author"], row, str(author)))
+                publication_indices["author"].append(index)
+
+        self.pmids = np.asarray(pmids, dtype=np.int64)
+        self.date_ordinals = np.asarray(date_ordinals, dtype=np.int32)     # See PubMedPublicationDate.ordinal.
+
+        self._categories: dict[str, np.ndarray] = {}
+        self._codes: dict[str, np.ndarray] = {}
+        self._publication_indices: dict[str, np.ndarray] = {}
+
+        for field, encoder in encoders.items():
+            self._categories[field], self._codes[field] = self._finish(encoder, codes[field])
+
+        for field, indices in publication_indices.items():
+            self._publication_indices[field] = np.asarray(indices, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.pmids)
+
+    # region Public features
+    def categories(self, field: str) -> np.ndarray:
+        """
+        :param field: The field.
+        :return: The sorted distinct values of the field.
+        """
+        self._check_field(field)
+        return self._categories[field]
+
+    def codes(self, field: str) -> np.ndarray:
+        """
+        :param field: The field.
+        :return: The codes (indices into categories()) of the values; -1 for missing values.
+                 For multi-valued fields, see publication_indices().
+        """
+        self._check_field(field)
+        return self._codes[field]
+
+    def publication_indices(self, field: str) -> np.ndarray:
+        """
+        :param field: A publication or multi-valued field.
+        :return: For every code of the field, the index of its publication (into pmids).
+        """
+        self._check_field(field, author_fields=False)
+
+        if field in self._publication_indices:
+            return self._publication_indices[field]
+
+        return np.arange(len(self.pmids), dtype=np.int32)
+
+    def select_dates(self, start: int = 0, end: int = 99991231) -> np.ndarray:
+        """
+        Selects the publications of a date range, e.g. select_dates(20190101, 20191231).
+        :param start: The first date as ordinal (see PubMedPublicationDate.ordinal).
+        :param end: The last date as ordinal.
+        :return: The indices (into pmids) of the publications, whose dates are known to the year at least.
+        """
+        return np.flatnonzero((self.date_ordinals >= start) & (self.date_ordinals <= end))
+
+    def counts(self, field: str) -> dict:
+        """
+        Counts the publications (for "author": the publications of each author; for "last_name" and "fore_name":
+        the distinct authors) per value of a field.
+        :param field: The field.
+        :return: Dictionary value -> count, ordered by value; values without publications are left out.
+                 Distinct authors of the same name are added up (see top() to tell them apart).
+        """
+        values, counts = self._count(field)
+
+        result = {}
+        for value, count in zip(values.tolist(), counts.tolist()):
+            result[value] = result.get(value, 0) + count
+
+        return result
+
+    def top(self, field: str, k: int = 10) -> list[tuple]:
+        """
+        Finds the most frequent values of a field.
+        :param field: The field.
+        :param k: The number of values.
+        :return: List of tuples (value, count), by descending count.
+        """
+        values, counts = self._count(field)
+        return self._top(counts, k, lambda index: (values[index].item(), int(counts[index])))
+
+    def group_counts(self, field: str, by: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Counts the publications per pair of values of a field and of a publication field,
+        e.g. group_counts("keyword", by="year").
+        :param field: A publication or multi-valued field.
+        :param by: A publication field ("year", "month", "journal", "language").
+        :return: Sparse counts in COO form: codes of the field (rows), codes of the by field (columns), counts.
+                 See categories() for the values.
+        """
+        self._check_field(field, author_fields=False)
+        if by not in PUBLICATION_FIELDS:
+            raise ValueError(f"Cannot group by '{by}'; use one of {PUBLICATION_FIELDS}")
+
+        rows = self._codes[field]
+        columns = self._codes[by][self.publication_indices(field)]
+        valid = (rows >= 0) & (columns >= 0)
+
+        return self._count_pairs(rows[valid], columns[valid], len(self._categories[by]))
+
+    def co_occurrence(self, field: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Counts the publications in which two values of a multi-valued field occur together,
+        e.g. co-authorships (field "author") or keyword pairs (field "keyword").
+        :param field: A multi-valued field.
+        :return: Sparse upper triangle in COO form: codes (rows), codes (columns, greater than the rows), counts.
+                 See categories() for the values.
+        """
+        if field not in MULTI_VALUED_FIELDS:
+            raise ValueError(f"No co-occurrences of '{field}'; use one of {MULTI_VALUED_FIELDS}")
+
+        number_of_categories = len(self._categories[field])
+
+        # Distinct (publication, code) pairs, sorted by publication, then code.
+        keys = np.unique(self._publication_indices[field].astype(np.int64) * number_of_categories + self._codes[field])
+        publications = keys // number_of_categories
+        codes = keys % number_of_categories
+
+        # Every entry is paired with the following entries of its publication.
+        group_ends = np.searchsorted(publications, publications, side="right")
+        partners = group_ends - np.arange(len(keys)) - 1
+        rows = np.repeat(np.arange(len(keys)), partners)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(partners) - partners, partners) + 1
+
+        return self._count_pairs(codes[rows], codes[rows + offsets], number_of_categories)
+
+    def top_pairs(self, field: str, k: int = 10) -> list[tuple]:
+        """
+        Finds the most frequent co-occurrences of a multi-valued field, e.g. the most frequent co-author pairs.
+        :param field: A multi-valued field.
+        :param k: The number of pairs.
+        :return: List of tuples (value, value, count), by descending count.
+        """
+        rows, columns, counts = self.co_occurrence(field)
+        values = self._categories[field]
+
+        return self._top(counts, k, lambda index: (values[rows[index]].item(), values[columns[index]].item(),
+                                                   int(counts[index])))
+
+    def co_occurrence_matrix(self, field: str):
+        """
+        The co-occurrences of a multi-valued field as symmetric sparse matrix. Requires scipy.
+        :param field: A multi-valued field.
+        :return: scipy.sparse.csr_matrix of shape (number of categories, number of categories).
+        """
+        from scipy.sparse import coo_matrix
+
+        rows, columns, counts = self.co_occurrence(field)
+        size = len(self._categories[field])
+
+        return coo_matrix((np.concatenate([counts, counts]),
+                           (np.concatenate([rows, columns]), np.concatenate([columns, rows]))),
+                          shape=(size, size)).tocsr()
+    # endregion
+
+    # region Protected auxiliary
+    def _encode(self, encoder: dict, value, label: Optional[str] = None) -> int:
+        """
+        Encodes a value with the code of its first occurrence.
+        :param encoder: Dictionary value -> (code, label).
+        :param value: The value; None for missing values.
+        :param label: The label of the category, if not the value itself.
+        :return: The code; -1 for missing values.
+        """
+        if value is None:
+            return -1
+
+        entry = encoder.get(value)
+        if entry is None:
+            entry = encoder[value] = (len(encoder), value if label is None else label)
+
+        return entry[0]
+
+    def _finish(self, encoder: dict, codes: array) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Turns the codes of first occurrence into codes of the sorted categories.
+        :param encoder: Dictionary value -> (code, label).
+        :param codes: The codes of first occurrence.
+        :return: Tuple of the sorted categories and the codes into them.
+        """
+        codes = np.asarray(codes, dtype=np.int32)
+        labels = [label for _, label in encoder.values()]
+
+        if len(labels) == 0:
+            return np.zeros(0, dtype=object), codes
+
+        # Not np.unique: authors of the same name are distinct categories.
+        labels = np.asarray(labels)
+        order = np.argsort(labels, kind="stable")
+        new_codes = np.append(np.argsort(order).astype(np.int32), np.int32(-1))     # Code -1 (missing) stays -1.
+
+        return labels[order], new_codes[codes]
+
+    def _count(self, field: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param field: The field.
+        :return: Tuple of the values with a count above 0 and their counts.
+        """
+        self._check_field(field)
+
+        codes = self._codes[field]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self._categories[field]))
+        present = np.flatnonzero(counts)
+
+        return self._categories[field][present], counts[present]
+
+    def _count_pairs(self, rows: np.ndarray, columns: np.ndarray, number_of_columns: int) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Counts equal (row, column) pairs.
+        :param rows: The row codes.
+        :param columns: The column codes.
+        :param number_of_columns: The number of column categories.
+        :return: The distinct rows and columns, and their counts.
+        """
+        keys, counts = np.unique(rows.astype(np.int64) * number_of_columns + columns, return_counts=True)
+        return (keys // number_of_columns).astype(np.int32), (keys % number_of_columns).astype(np.int32), counts
+
+    def _top(self, counts: np.ndarray, k: int, entry) -> list[tuple]:
+        """
+        Selects the entries with the k highest counts without sorting all of them.
+        :param counts: The counts.
+        :param k: The number of entries.
+        :param entry: Function creating the result tuple of an index.
+        :return: The entries, by descending count.
+        """
+        if k <= 0 or len(counts) == 0:
+            return []
+
+        if k < len(counts):
+            indices = np.argpartition(-counts, k - 1)[:k]
+        else:
+            indices = np.arange(len(counts))
+
+        indices = indices[np.argsort(-counts[indices], kind="stable")]
+        return [entry(index) for index in indices]
+
+    def _check_field(self, field: str, author_fields: bool = True):
+        """
+        Raises a ValueError for unknown fields (and for author fields, if not allowed).
+        :param field: The field.
+        :param author_fields: If set to False, the author fields are not allowed.
+        :return: None.
+        """
+        fields = PUBLICATION_FIELDS + MULTI_VALUED_FIELDS + (AUTHOR_FIELDS if author_fields else [])
+        if field not in fields:
+            raise ValueError(f"Unknown field '{field}'; use one of {fields}")
+    # endregion
+
+
+if __name__ == '__main__':
+    from pubmed_fetcher import PubMedFetcher
+
+    analytics = PubMedAnalytics(PubMedFetcher().iterate_by_topics(["dicom", "mri"]))
+
+    print(f"{len(analytics)} publications")
+    print(analytics.counts("year"))
+    print(analytics.top("journal", 5))
+    print(analytics.top("last_name", 10))
+    print(analytics.top_pairs("author", 5))
@@ -0,0 +1,391 @@
+import asyncio
+import xml.etree.ElementTree as ET
+from concurrent.futures import Executor
+from typing import AsyncIterator, Iterable, Optional, Union
+
+import aiohttp
+
+from pubmed_dead_letter_queue import STAGE_FETCH
+from pubmed_fetcher import PubMedFetcher, NCBI_SEARCH_URL, NCBI_FETCH_URL, MAXIMUM_IDS_IN_GET_REQUEST, \
+    MAXIMUM_NUMBER_OF_FAILED_REQUESTS, MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES, parse_publications
+from pubmed_partitioning import PubMedPartition
+from pubmed_publication import PubMedPublication
+from pubmed_query import PubMedQuery
+
+
+class AsyncRateLimiter:
+    """
+    Spaces requests evenly so that no more than a given number of requests per second is sent.
+    Usage: 'async with limiter: ...'.
+    """
+    def __init__(self, requests_per_second: float):
+        """
+        Creates an instance of AsyncRateLimiter.
+        :param requests_per_second: The maximum number of requests per second.
+        """
+        self._interval = 1.0 / requests_per_second
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until the next request may be sent.
+        :return: None.
+        """
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class AsyncPubMedFetcher:
+    """
+    asyncio counterpart of PubMedFetcher: non-blocking HTTP with a pooled aiohttp session and a rate limiter.
+    It offers the network methods of PubMedFetcher as coroutines and asynchronous iterators, and composes
+    a PubMedFetcher (attribute fetcher) for the state shared with it: the batch sizer, the author registry and
+    the dead-letter queue. Responses are parsed by parse_publications() in an executor, so that the event loop
+    stays responsive; authors and dead letters are registered in the calling process.
+    The class variables of PubMedFetcher (extract_references, deduplicate_authors, ...) apply.
+    For local PubMed XML files, use PubMedFetcher.iterate_from_files().
+    Every coroutine can be cancelled; the pending request is then aborted and its connection released.
+    Usage:
+        async with AsyncPubMedFetcher() as fetcher:
+            publications = await fetcher.fetch_by_topics(['dicom', 'mri'])
+    """
+    # region Class variables
+    requests_per_second = 3                     # NCBI allows 3 requests per second without an API key (10 with one).
+    maximum_connections = 10                    # Size of the connection pool.
+    # endregion
+
+    def __init__(self, executor: Optional[Executor] = None):
+        """
+        Initialization of the composed fetcher, the session, the rate limiter and the executor.
+        :param executor: The executor to parse responses in, a thread or a process pool. If None (default),
+                         the loop's default executor is used.
+        """
+        self.fetcher = PubMedFetcher()
+        self.batch_sizer = self.fetcher.batch_sizer
+        self.author_registry = self.fetcher.author_registry
+        self.dead_letter_queue = self.fetcher.dead_letter_queue
+
+        self._executor = executor
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._rate_limiter = AsyncRateLimiter(AsyncPubMedFetcher.requests_per_second)
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    # region Public features
+    async def fetch_by_topics(self, topics: list[str], from_year: int = 1800,
+                              partition: Optional[PubMedPartition] = None) -> list[PubMedPublication]:
+        """
+        Fetches publications by topic list (combined by 'AND'), see PubMedFetcher.fetch_by_topics().
+        Days holding more IDs than esearch returns are recorded in fetcher.truncated_searches.
+        :param topics: List of topics.
+        :param from_year: Minimum year from which to start. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched.
+        :return: List of publications found.
+        """
+        return [publication async for publication in self.iterate_by_topics(topics, from_year, partition)]
+
+    async def iterate_by_topics(self, topics: list[str], from_year: int = 1800,
+                                partition: Optional[PubMedPartition] = None) -> AsyncIterator[PubMedPublication]:
+        """
+        Iterates over the publications of a topic list (combined by 'AND') as soon as each portion is parsed.
+        :param topics: List of topics.
+        :param from_year: Minimum year from which to start. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched.
+        :return: Asynchronous iterator over the publications found.
+        """
+        ids = await self.search_by_topics(topics, from_year, partition)
+
+        async for publication in self._iterate_publications_async(ids):
+            yield publication
+
+    async def search_by_topics(self, topics: list[str], from_year: int = 1800,
+                               partition: Optional[PubMedPartition] = None) -> list[int]:
+        """
+        Searches the PMIDs of a topic list (combined by 'AND') without fetching the publications.
+        :param topics: List of topics.
+        :param from_year: Minimum year of publication. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the PMIDs of this shard are returned.
+        :return: List of PMIDs found.
+        """
+        term = PubMedQuery.from_topics(topics).canonical()
+        ids = [int(id) for id in await self._extract_ids_by_term_async(term, from_year)]
+
+        return ids if partition is None else partition.select(ids)
+
+    async def iterate_by_ids(self, pubmed_ids: Iterable[int]) -> AsyncIterator[PubMedPublication]:
+        """
+        Iterates over the publications of a list of PMIDs, e.g. the PMIDs of a dead-letter file.
+        :param pubmed_ids: The PMIDs.
+        :return: Asynchronous iterator over the publications fetched.
+        """
+        async for publication in self._iterate_publications_async([int(id) for id in pubmed_ids]):
+            yield publication
+
+    async def fetch_by_queries(self, queries: list[Union[str, PubMedQuery]], evaluate_locally: bool = False,
+                               partition: Optional[PubMedPartition] = None) -> dict[str, list[PubMedPublication]]:
+        """
+        Fetches publications for a batch of boolean queries, see PubMedFetcher.fetch_by_queries().
+        The searches run concurrently (within the rate limit); every publication is fetched only once.
+        :param queries: List of query expressions (strings or instances of PubMedQuery).
+        :param evaluate_locally: If set to True, every distinct term is searched once and the queries are evaluated
+                                 locally with set algebra.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched.
+        :return: Dictionary with the query expressions as keys and the lists of the publications found as values.
+        """
+        parsed_queries, terms = self.fetcher._plan_queries(queries, evaluate_locally)
+        id_lists = await asyncio.gather(*[self._extract_ids_by_term_async(term) for term in terms])
+
+        ids_by_query, unique_ids = self.fetcher._combine_query_ids(parsed_queries, terms, list(id_lists),
+                                                                   evaluate_locally, partition)
+        publications = {publication.publication_id: publication
+                        async for publication in self._iterate_publications_async(unique_ids)}
+
+        return {expression: [publications[id] for id in ids if id in publications]
+                for expression, ids in ids_by_query.items()}
+
+    async def close(self):
+        """
+        Closes the HTTP session and its connection pool.
+        :return: None.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    # endregion
+
+    # region Protected auxiliary
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Gets the HTTP session, creating it on first use.
+        :return: The session.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=AsyncPubMedFetcher.maximum_connections)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+        return self._session
+
+    async def _request(self, method: str, url: str, **kwargs) -> tuple[int, bytes]:
+        """
+        Sends a rate-limited request.
+        :param method: "GET" or "POST".
+        :param url: The URL.
+        :param kwargs: Further arguments of aiohttp.ClientSession.request(), e.g. params or data.
+        :return: Tuple of the status code and the body of the response.
+        """
+        async with self._rate_limiter:
+            async with self._get_session().request(method, url, **kwargs) as response:
+                return response.status, await response.read()
+
+    async def _parse_publications_async(self, body: bytes, pubmed_ids: list) -> list[PubMedPublication]:
+        """
+        Parses an efetch response in the executor, then registers the authors and the failures.
+        :param body: The body of the response.
+        :param pubmed_ids: The IDs requested.
+        :return: The publications.
+        :raises ET.ParseError: If the response is no XML.
+        """
+        publications, failures = await asyncio.get_running_loop().run_in_executor(
+            self._executor, parse_publications, body, pubmed_ids, PubMedFetcher.extract_references)
+
+        return self.fetcher._register_parsed(publications, failures, len(pubmed_ids))
+
+    async def _extract_ids_by_term_async(self, term: str, from_year: int = 1800) -> list[str]:
+        """
+        Retrieves PubMed IDs for an esearch term, splitting large results into publication date ranges,
+        see PubMedFetcher._extract_ids_by_term().
+        :param term: The search term.
+        :param from_year: Minimum year of publication.
+        :return: List of PubMed IDs found.
+        """
+        result = []
+        date_ranges = [self.fetcher._get_date_range(from_year)]
+
+        while len(date_ranges) > 0:
+            date_range = date_ranges.pop()
+            params = self.fetcher._get_search_parameters(term, date_range)
+            count, ids_portion = await self._search_with_retries_async(params, self.fetcher._parse_search)
+
+            halves = self.fetcher._split_date_range(term, date_range, count)
+            if halves is not None:
+                date_ranges += halves
+                continue
+
+            result += ids_portion
+            if PubMedFetcher.print_intermediate_results:
+                print(f"Extracted {len(ids_portion)} topic IDs up to {date_range[1]} ({len(result)} in total)")
+
+        return result
+
+    async def _search_with_retries_async(self, params: dict, parse):
+        """
+        Sends an esearch request and parses the (small) response, retrying like PubMedFetcher._search_with_retries().
+        :param params: The parameters of the request.
+        :param parse: The function parsing the text of the response.
+        :return: The result of the parse function.
+        :raises ValueError: If all MAXIMUM_NUMBER_OF_FAILED_REQUESTS attempts failed.
+        """
+        error = ""
+        for attempt in range(MAXIMUM_NUMBER_OF_FAILED_REQUESTS):
+            if attempt > 0:
+                await asyncio.sleep(self.fetcher._backoff_seconds(attempt))
+
+            try:
+                status, body = await self._request("GET", NCBI_SEARCH_URL, params=params)
+                if status != 200:
+                    error = f"STATUS_{status}"
+                    continue
+
+                return parse(body.decode("utf-8", errors="replace"))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ET.ParseError, ValueError) as exception:
+                error = f"{type(exception).__name__}: {exception}"
+
+        raise ValueError(f"esearch failed {MAXIMUM_NUMBER_OF_FAILED_REQUESTS} times: {error}")
+
+    async def _iterate_publications_async(self, pubmed_ids: list) -> AsyncIterator[PubMedPublication]:
+        """
+        Fetches publications in portions sized by the batch sizer and yields them once parsed.
+        Failures are handled like in PubMedFetcher._iterate_publications(): transient errors are retried after
+        a backoff, other failures are retried smaller, then bisected, with the failing IDs going to
+        the dead-letter queue.
+        :param pubmed_ids: List of PubMed IDs to extract.
+        :return: Asynchronous iterator over the publications extracted.
+        :raises ValueError: If transient errors persist.
+        """
+        start_index = 0
+        number_of_failed_requests = 0
+
+        while start_index < len(pubmed_ids):
+            ids_to_process = pubmed_ids[start_index: start_index + self.batch_sizer.size]
+
+            publications, error, latency, response_size = await self._fetch_with_backoff_async(ids_to_process)
+
+            if publications is None:
+                number_of_failed_requests += 1
+                self.batch_sizer.record_failure()
+
+                if number_of_failed_requests < MAXIMUM_NUMBER_OF_FAILED_REQUESTS:
+                    continue
+
+                publications = await self._isolate_failures_async(ids_to_process, error)
+            else:
+                self.batch_sizer.record_success(len(ids_to_process), latency, response_size)
+
+            number_of_failed_requests = 0
+            start_index += len(ids_to_process)
+
+            for publication in publications:
+                yield publication
+
+    async def _fetch_with_backoff_async(self, pubmed_ids: list) -> tuple[Optional[list[PubMedPublication]], str,
+                                                                         float, int]:
+        """
+        Fetches a portion of publications, retrying transient errors after a backoff,
+        see PubMedFetcher._fetch_with_backoff().
+        :param pubmed_ids: The PubMed IDs.
+        :return: Tuple of the publications (None after a non-transient failure), the error, the latency and
+                 the size of the response of the last attempt.
+        :raises ValueError: If MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES attempts in a row failed transiently.
+        """
+        loop = asyncio.get_running_loop()
+        error = ""
+
+        for attempt in range(1, MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES + 1):
+            started = loop.time()
+            publications, error, status, response_size = await self._try_to_fetch_async(pubmed_ids)
+            latency = loop.time() - started
+
+            if publications is not None or not self.fetcher._is_transient(status):
+                return publications, error, latency, response_size
+
+            if attempt < MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES:
+                await asyncio.sleep(self.fetcher._backoff_seconds(attempt))
+
+        raise ValueError(f"efetch failed {MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES} times in a row: {error}")
+
+    async def _try_to_fetch_async(self, pubmed_ids: list) -> tuple[Optional[list[PubMedPublication]], str, int, int]:
+        """
+        Fetches a portion of publications once and parses it in the executor.
+        :param pubmed_ids: The PubMed IDs.
+        :return: Tuple of the publications (None if the request failed), the error, the status code
+                 (0 if the server could not be reached) and the size of the response.
+        """
+        try:
+            status, body = await self._download_publications_async(pubmed_ids)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            return None, f"{type(exception).__name__}: {exception}", 0, 0
+
+        if status != 200:
+            return None, f"STATUS_{status}", status, len(body)
+
+        try:
+            return await self._parse_publications_async(body, pubmed_ids), "", status, len(body)
+        except ET.ParseError as exception:
+            return None, f"Unparseable response: {exception}", status, len(body)
+
+    async def _isolate_failures_async(self, pubmed_ids: list, error: str) -> list[PubMedPublication]:
+        """
+        Isolates the IDs of a failing portion by bisection, see PubMedFetcher._isolate_failures().
+        :param pubmed_ids: The PubMed IDs of the failing portion.
+        :param error: The error of the portion.
+        :return: The publications which could be fetched.
+        :raises ValueError: If transient errors persist.
+        """
+        if len(pubmed_ids) == 1:
+            self.dead_letter_queue.add(int(pubmed_ids[0]), STAGE_FETCH, error)
+            return []
+
+        result = []
+        middle = len(pubmed_ids) // 2
+
+        for half in (pubmed_ids[:middle], pubmed_ids[middle:]):
+            publications, error, _, _ = await self._fetch_with_backoff_async(half)
+
+            if publications is None:
+                publications = await self._isolate_failures_async(half, error)
+
+            result += publications
+
+        return result
+
+    async def _download_publications_async(self, pubmed_ids: list) -> tuple[int, bytes]:
+        """
+        Sends the efetch request for a list of PubMed IDs; large lists are sent by POST.
+        :param pubmed_ids: The list of PubMed IDs to fetch.
+        :return: Tuple of the status code and the body of the response.
+        """
+        data = {"db": "pubmed", "retmode": "xml", "id": ",".join(str(id) for id in pubmed_ids)}
+
+        if len(pubmed_ids) > MAXIMUM_IDS_IN_GET_REQUEST:
+            return await self._request("POST", NCBI_FETCH_URL, data=data)
+
+        return await self._request("GET", NCBI_FETCH_URL, params=data)
+    # endregion
+
+
+if __name__ == '__main__':
+    async def main():
+        async with AsyncPubMedFetcher() as fetcher:
+            async for publication in fetcher.iterate_by_topics(['dicom', 'prostate', 'mri']):
+                print(publication)
+
+    asyncio.run(main())
@@ -0,0 +1,301 @@
+import bisect
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+from pubmed_author import PubMedAuthor
+
+# Characters removed from normalized names and affiliations.
+_NON_ALPHANUMERIC_PATTERN = re.compile(r"[^0-9a-z ]+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Prefixes of ORCID URLs, e.g. "https://orcid.org/0000-0002-1825-0097".
+_ORCID_PREFIX_PATTERN = re.compile(r"^(https?://)?(www\.)?orcid\.org/", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_name(name: str) -> str:
+    """
+    Normalizes a name for comparison: no accents, lower case, letters, digits and single spaces only.
+    :param name: The name, e.g. "Müller-Lüdenscheidt".
+    :return: The normalized name, e.g. "muller ludenscheidt".
+    """
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return _WHITESPACE_PATTERN.sub(" ", _NON_ALPHANUMERIC_PATTERN.sub(" ", stripped.lower())).strip()
+
+
+def normalize_identifier(source: str, identifier: str) -> tuple[str, str]:
+    """
+    Normalizes an author identifier; ORCIDs lose their URL prefix and their hyphens.
+    :param source: The source of the identifier, e.g. "ORCID".
+    :param identifier: The identifier.
+    :return: Tuple of the normalized source and identifier.
+    """
+    source = (source or "").strip().upper()
+    identifier = (identifier or "").strip()
+
+    if source == "ORCID":
+        identifier = _ORCID_PREFIX_PATTERN.sub("", identifier).replace("-", "").upper()
+
+    return source, identifier
+
+
+class PubMedAuthorRegistry:
+    """
+    Registry of the authors met in fetched publications.
+    Assigns stable local IDs (starting at 1) and deduplicates authors: by their identifiers (ORCID etc.),
+    otherwise by normalized full name and a common affiliation. Authors of the same name without a common
+    affiliation or identifier get IDs of their own. Different identifiers of the same source always mean
+    different persons.
+    Registered authors are shared by the publications, but copied on write: when a later registration adds
+    identifiers or affiliations, the registry continues with an extended copy, so that publications built before
+    do not change. Publications with the same author ID may thus hold different instances: earlier publications
+    keep the older, smaller copy, and later ones may carry affiliations and identifiers missing from their own record
+    (and write them in to_xml()). Compare authors by ID; get() returns the current, most complete instance.
+    Affiliation strings are stored once.
+    """
+    def __init__(self):
+        """
+        Initialization of the indices.
+        """
+        self._authors: list[PubMedAuthor] = []                          # Current instance; index: author ID - 1.
+        self._by_identifier: dict[tuple[str, str], int] = {}            # Key: normalized (source, identifier).
+        self._by_name_affiliation: dict[tuple[str, str], int] = {}      # Key: name key and normalized affiliation.
+        self._identifiers: dict[int, dict[str, str]] = {}               # Normalized identifiers by author ID.
+        self._normalized_affiliations: dict[int, set[str]] = {}         # Normalized affiliations by author ID.
+        self._affiliations: dict[str, str] = {}                         # Interned affiliation strings.
+        self._sorted_names: list[tuple[str, int]] = []                  # (normalized "last fore", author ID), sorted.
+        self._number_of_sorted_authors = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._authors)
+
+    # region Public features
+    def register(self, author: PubMedAuthor) -> PubMedAuthor:
+        """
+        Registers an author, merging it into a known author if it is the same person.
+        The cost does not depend on the number of known authors of the same name.
+        :param author: The author extracted from a publication.
+        :return: The registered author, with its ID assigned.
+        """
+        with self._lock:
+            identifiers = {}
+            for source, identifier in author.identification.items():
+                if identifier:
+                    normalized_source, normalized_identifier = normalize_identifier(source, identifier)
+                    identifiers.setdefault(normalized_source, normalized_identifier)
+
+            affiliations = {normalize_name(affiliation) for affiliation in author.affiliations}
+            affiliations.discard("")
+            name_key = self._name_key(author)
+
+            author_id = self._find_by_identifiers(identifiers)
+
+            if author_id is None:
+                author_id = self._find_by_name(name_key, identifiers, affiliations)
+
+            if author_id is None:
+                return self._add(author, name_key, identifiers, affiliations)
+
+            return self._merge(author_id, author, name_key, identifiers, affiliations)
+
+    def get(self, author_id: int) -> Optional[PubMedAuthor]:
+        """
+        :param author_id: The local ID of an author.
+        :return: The author (its current instance), or None if the ID is unknown.
+        """
+        if 1 <= author_id <= len(self._authors):
+            return self._authors[author_id - 1]
+
+        return None
+
+    def find_by_identifier(self, identifier: str, source: str = "ORCID") -> Optional[PubMedAuthor]:
+        """
+        :param identifier: The identifier, e.g. an ORCID (with or without URL prefix and hyphens).
+        :param source: The source of the identifier. Default: "ORCID".
+        :return: The author, or None if the identifier is unknown.
+        """
+        author_id = self._by_identifier.get(normalize_identifier(source, identifier))
+        return None if author_id is None else self._authors[author_id - 1]
+
+    def find_by_name_prefix(self, prefix: str, maximum_count: int = 100) -> list[PubMedAuthor]:
+        """
+        Finds the authors whose "last name fore name" starts with a prefix, e.g. "smith j".
+        :param prefix: The prefix (normalized before comparison).
+        :param maximum_count: The maximum number of authors to return.
+        :return: The list of authors found, ordered by name.
+        """
+        with self._lock:
+            self._sort_names()
+            normalized_prefix = normalize_name(prefix)
+            result = []
+
+            index = bisect.bisect_left(self._sorted_names, (normalized_prefix, 0))
+            while index < len(self._sorted_names) and len(result) < maximum_count:
+                name, author_id = self._sorted_names[index]
+                if not name.startswith(normalized_prefix):
+                    break
+
+                result.append(self._authors[author_id - 1])
+                index += 1
+
+            return result
+    # endregion
+
+    # region Protected auxiliary
+    def _name_key(self, author: PubMedAuthor) -> str:
+        """
+        :param author: The author.
+        :return: The name key: normalized last name and fore name (initials if there is no fore name).
+        """
+        fore_name = normalize_name(author.fore_name) or normalize_name(author.initials)
+        return f"{normalize_name(author.last_name)}|{fore_name}"
+
+    def _find_by_identifiers(self, identifiers: dict[str, str]) -> Optional[int]:
+        """
+        :param identifiers: The normalized identifiers of an author (source: identifier).
+        :return: The ID of the known author with one of the identifiers, or None.
+        """
+        for identifier in identifiers.items():
+            author_id = self._by_identifier.get(identifier)
+            if author_id is not None:
+                return author_id
+
+        return None
+
+    def _find_by_name(self, name_key: str, identifiers: dict[str, str], affiliations: set[str]) -> Optional[int]:
+        """
+        Finds a known author of the same name with a common affiliation.
+        :param name_key: The name key of the author.
+        :param identifiers: The normalized identifiers of the author.
+        :param affiliations: The normalized affiliations of the author.
+        :return: The ID of the known author, or None.
+        """
+        for affiliation in affiliations:
+            author_id = self._by_name_affiliation.get((name_key, affiliation))
+
+            if author_id is not None and not self._conflicts(author_id, identifiers):
+                return author_id
+
+        return None
+
+    def _conflicts(self, author_id: int, identifiers: dict[str, str]) -> bool:
+        """
+        :param author_id: The ID of a known author.
+        :param identifiers: The normalized identifiers of another author.
+        :return: True if the authors have different identifiers of the same source.
+        """
+        known_identifiers = self._identifiers[author_id]
+        return any(known_identifiers.get(source, identifier) != identifier
+                   for source, identifier in identifiers.items())
+
+    def _add(self, author: PubMedAuthor, name_key: str, identifiers: dict[str, str],
+             affiliations: set[str]) -> PubMedAuthor:
+        """
+        Adds a new author.
+        :param author: The author.
+        :param name_key: The name key of the author.
+        :param identifiers: The normalized identifiers of the author.
+        :param affiliations: The normalized affiliations of the author.
+        :return: The author, with its ID assigned.
+        """
+        author.id = len(self._authors) + 1
+        author.affiliations = [self._intern(affiliation) for affiliation in author.affiliations]
+
+        self._authors.append(author)
+        self._identifiers[author.id] = dict(identifiers)
+        self._normalized_affiliations[author.id] = set(affiliations)
+        self._index(author.id, name_key, identifiers, affiliations)
+
+        return author
+
+    def _merge(self, author_id: int, author: PubMedAuthor, name_key: str, identifiers: dict[str, str],
+               affiliations: set[str]) -> PubMedAuthor:
+        """
+        Merges the identifiers and affiliations of an author into a known author. If the author adds any,
+        the known author is replaced by an extended copy; the instance held by earlier publications is not changed.
+        :param author_id: The ID of the known author.
+        :param author: The author to merge.
+        :param name_key: The name key of the author.
+        :param identifiers: The normalized identifiers of the author.
+        :param affiliations: The normalized affiliations of the author.
+        :return: The current instance of the known author.
+        """
+        known_author = self._authors[author_id - 1]
+        known_identifiers = self._identifiers[author_id]
+        known_affiliations = self._normalized_affiliations[author_id]
+
+        new_identification = {source: identifier for source, identifier in author.identification.items()
+                              if identifier and source not in known_author.identification
+                              and normalize_identifier(source, identifier)[0] not in known_identifiers}
+        new_affiliations = []
+        for affiliation in author.affiliations:
+            normalized_affiliation = normalize_name(affiliation)
+            if normalized_affiliation and normalized_affiliation not in known_affiliations:
+                known_affiliations.add(normalized_affiliation)
+                new_affiliations.append(self._intern(affiliation))
+
+        for source, identifier in identifiers.items():
+            known_identifiers.setdefault(source, identifier)
+
+        self._index(author_id, name_key, identifiers, affiliations)
+
+        if len(new_identification) == 0 and len(new_affiliations) == 0:
+            return known_author
+
+        extended_author = PubMedAuthor()
+        extended_author.id = author_id
+        extended_author.last_name = known_author.last_name
+        extended_author.fore_name = known_author.fore_name
+        extended_author.initials = known_author.initials
+        extended_author.identification = {**known_author.identification, **new_identification}
+        extended_author.affiliations = known_author.affiliations + new_affiliations
+        self._authors[author_id - 1] = extended_author
+
+        return extended_author
+
+    def _index(self, author_id: int, name_key: str, identifiers: dict[str, str], affiliations: set[str]):
+        """
+        Adds the identifiers and the name and affiliation keys of an author to the indices.
+        :param author_id: The ID of the author.
+        :param name_key: The name key.
+        :param identifiers: The normalized identifiers.
+        :param affiliations: The normalized affiliations.
+        :return: None.
+        """
+        for identifier in identifiers.items():
+            self._by_identifier.setdefault(identifier, author_id)
+
+        for affiliation in affiliations:
+            self._by_name_affiliation.setdefault((name_key, affiliation), author_id)
+
+    def _intern(self, affiliation: str) -> str:
+        """
+        :param affiliation: An affiliation string.
+        :return: The single stored instance of the string.
+        """
+        return self._affiliations.setdefault(affiliation, affiliation)
+
+    def _sort_names(self):
+        """
+        Adds the authors registered since the last call to the sorted name list.
+        :return: None.
+        """
+        if self._number_of_sorted_authors == len(self._authors):
+            return
+
+        new_names = [(normalize_name(f"{author.last_name} {author.fore_name}"), author.id)
+                     for author in self._authors[self._number_of_sorted_authors:]]
+
+        if len(new_names) > len(self._sorted_names) // 8:
+            self._sorted_names = sorted(self._sorted_names + new_names)
+        else:
+            for name in new_names:
+                bisect.insort(self._sorted_names, name)
+
+        self._number_of_sorted_authors = len(self._authors)
+    # endregion
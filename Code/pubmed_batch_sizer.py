@@ -0,0 +1,63 @@
+class PubMedBatchSizer:
+    """
+    Adapts the number of IDs sent per efetch request to the observed server behaviour.
+    The batch grows while responses come back fast and small, and shrinks on slow or big responses,
+    as well as on errors (414 URI too long, 5xx server errors).
+    """
+    def __init__(self, initial_size: int = 200, minimum_size: int = 1, maximum_size: int = 10000,
+                 target_latency: float = 5.0, maximum_response_bytes: int = 32 * 1024 * 1024):
+        """
+        Creates an instance of PubMedBatchSizer.
+        :param initial_size: The batch size to start with.
+        :param minimum_size: The smallest batch size the sizer will shrink to.
+        :param maximum_size: The largest batch size the sizer will grow to (efetch accepts at most 10000 IDs).
+        :param target_latency: Latency in seconds a single request should not exceed.
+        :param maximum_response_bytes: Memory budget in bytes for a single response.
+        """
+        self.minimum_size = minimum_size
+        self.maximum_size = maximum_size
+        self.target_latency = target_latency
+        self.maximum_response_bytes = maximum_response_bytes
+        self.size = self._clamp(initial_size)
+
+    def record_success(self, number_of_ids: int, latency: float, response_bytes: int):
+        """
+        Adjusts the batch size after a successful request.
+        :param number_of_ids: The number of IDs requested.
+        :param latency: The time the request took, in seconds.
+        :param response_bytes: The size of the response body in bytes.
+        :return: None.
+        """
+        if number_of_ids <= 0:
+            return
+
+        if latency > self.target_latency:
+            new_size = self.size // 2
+        elif latency < self.target_latency / 2 and number_of_ids >= self.size:
+            # Only grow when the full batch was used, otherwise the last (short) portion would inflate the size.
+            new_size = self.size * 3 // 2 + 1
+        else:
+            new_size = self.size
+
+        # Keep the next response inside the memory budget, judging by the bytes per ID observed.
+        bytes_per_id = max(response_bytes / number_of_ids, 1.0)
+        new_size = min(new_size, int(self.maximum_response_bytes / bytes_per_id))
+
+        self.size = self._clamp(new_size)
+
+    def record_failure(self):
+        """
+        Halves the batch size after a failed request.
+        :return: None.
+        """
+        self.size = self._clamp(self.size // 2)
+
+    # region Protected auxiliary
+    def _clamp(self, size: int) -> int:
+        """
+        Limits a batch size to the range [minimum_size, maximum_size].
+        :param size: The size to limit.
+        :return: The limited size.
+        """
+        return max(self.minimum_size, min(self.maximum_size, size))
+    # endregion
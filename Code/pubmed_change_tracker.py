@@ -0,0 +1,212 @@
+import json
+import sqlite3
+from typing import Callable, Iterable, Iterator, Optional
+
+from pubmed_publication import PubMedPublication
+
+# Kinds of changes reported by PubMedChangeTracker.
+ADDED = "added"
+MODIFIED = "modified"
+UNCHANGED = "unchanged"
+DELETED = "deleted"
+
+# Number of changes after which the database is committed.
+COMMIT_EVERY = 1000
+
+
+class PubMedChangeTracker:
+    """
+    Remembers the content hash (PubMedPublication.content_hash) of every processed publication in an SQLite database,
+    so that refresh jobs can skip the publications which did not change since the last run.
+    Every addition, modification and deletion is appended to an optional change feed (JSON lines:
+    {"PMID": ..., "change": "added" | "modified" | "deleted", "content_hash": ...}).
+    A hash is stored only once its publication is processed, and the changes become permanent by commit() only:
+    before_commit (e.g. PubMedStreamWriter.flush()) is called first, so that no publication is recorded whose
+    output is not on disk. Used as a context manager, the tracker commits at the end and rolls back on an exception,
+    so that the publications not committed are processed again by the next run.
+    """
+    def __init__(self, database_file: str, change_feed_file: Optional[str] = None,
+                 before_commit: Optional[Callable[[], None]] = None):
+        """
+        Opens (or creates) the database and the change feed.
+        :param database_file: The SQLite database file.
+        :param change_feed_file: The file the changes are appended to. If None, no change feed is written.
+        :param before_commit: Called before every commit, e.g. the flush() of the writer of the processed
+                              publications.
+        """
+        self.before_commit = before_commit
+
+        self._connection = sqlite3.connect(database_file)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS publications "
+                                 "(pmid INTEGER PRIMARY KEY, content_hash TEXT NOT NULL, refresh INTEGER NOT NULL)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._connection.commit()
+
+        row = self._connection.execute("SELECT value FROM state WHERE key = 'refresh'").fetchone()
+        self._refresh = row[0] if row is not None else 0
+
+        self._change_feed = open(change_feed_file, "a", encoding="utf-8") if change_feed_file else None
+        self._uncommitted_changes: list[str] = []        # Lines of the change feed, written on commit.
+        self._number_of_uncommitted_changes = 0
+        self.counts = {ADDED: 0, MODIFIED: 0, UNCHANGED: 0, DELETED: 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+
+        self.close()
+        return False
+
+    # region Public features
+    def classify(self, publication: PubMedPublication) -> str:
+        """
+        Compares the content hash of a publication with the stored one and stores the new hash.
+        :param publication: The publication.
+        :return: ADDED, MODIFIED or UNCHANGED.
+        """
+        row = self._connection.execute("SELECT content_hash FROM publications WHERE pmid = ?",
+                                       (publication.publication_id,)).fetchone()
+
+        if row is None:
+            change = ADDED
+        elif row[0] != publication.content_hash:
+            change = MODIFIED
+        else:
+            change = UNCHANGED
+
+        self._connection.execute("INSERT OR REPLACE INTO publications (pmid, content_hash, refresh) VALUES (?, ?, ?)",
+                                 (publication.publication_id, publication.content_hash, self._refresh))
+
+        if change != UNCHANGED:
+            self._write_change(publication.publication_id, change, publication.content_hash)
+
+        self.counts[change] += 1
+        self._changed()
+
+        return change
+
+    def is_unchanged(self, publication: PubMedPublication) -> bool:
+        """
+        Checks whether a publication is unchanged, without storing anything;
+        call classify() once the publication is processed.
+        :param publication: The publication.
+        :return: True if the stored content hash equals the one of the publication.
+        """
+        row = self._connection.execute("SELECT content_hash FROM publications WHERE pmid = ?",
+                                       (publication.publication_id,)).fetchone()
+
+        return row is not None and row[0] == publication.content_hash
+
+    def filter_changed(self, publications: Iterable[PubMedPublication]) -> Iterator[PubMedPublication]:
+        """
+        Yields only the added and modified publications of a stream, e.g. PubMedFetcher.iterate_by_topics().
+        A yielded publication is classified (its hash stored) when the consumer asks for the next one,
+        that is, after the consumer processed it.
+        :param publications: The publications.
+        :return: Iterator over the added and modified publications.
+        """
+        for publication in publications:
+            if not self.is_unchanged(publication):
+                yield publication
+
+            self.classify(publication)
+
+    def record_deleted(self, pmids: Iterable[int]):
+        """
+        Records deleted publications, e.g. PubMedFetcher.deleted_publication_ids after reading update files.
+        :param pmids: The PMIDs of the deleted publications.
+        :return: None.
+        """
+        for pmid in pmids:
+            if self._connection.execute("DELETE FROM publications WHERE pmid = ?", (pmid,)).rowcount > 0:
+                self._write_change(pmid, DELETED, "")
+                self.counts[DELETED] += 1
+                self._changed()
+
+    def begin_refresh(self):
+        """
+        Starts a full refresh: the publications not classified until end_refresh() are considered deleted.
+        :return: None.
+        """
+        self._refresh += 1
+        self._connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('refresh', ?)", (self._refresh,))
+        self._connection.commit()
+
+    def end_refresh(self) -> list[int]:
+        """
+        Ends a full refresh, recording the publications not seen since begin_refresh() as deleted.
+        :return: The PMIDs of the deleted publications.
+        """
+        pmids = [row[0] for row in self._connection.execute("SELECT pmid FROM publications WHERE refresh < ?",
+                                                            (self._refresh,))]
+        self.record_deleted(pmids)
+        self.commit()
+
+        return pmids
+
+    def commit(self):
+        """
+        Calls before_commit, commits the database and writes the changes to the change feed.
+        :return: None.
+        """
+        if self.before_commit is not None:
+            self.before_commit()
+
+        self._connection.commit()
+        self._number_of_uncommitted_changes = 0
+
+        if self._change_feed is not None:
+            self._change_feed.writelines(self._uncommitted_changes)
+            self._change_feed.flush()
+
+        self._uncommitted_changes = []
+
+    def rollback(self):
+        """
+        Discards the changes since the last commit, e.g. after the processing of the publications failed.
+        :return: None.
+        """
+        self._connection.rollback()
+        self._number_of_uncommitted_changes = 0
+        self._uncommitted_changes = []
+
+    def close(self):
+        """
+        Commits and closes the database and the change feed.
+        :return: None.
+        """
+        if self._number_of_uncommitted_changes > 0:
+            self.commit()
+
+        self._connection.close()
+
+        if self._change_feed is not None:
+            self._change_feed.close()
+    # endregion
+
+    # region Protected auxiliary
+    def _write_change(self, pmid: int, change: str, content_hash: str):
+        """
+        Adds a change to the lines written to the change feed on the next commit.
+        :param pmid: The PMID.
+        :param change: The kind of change.
+        :param content_hash: The new content hash (empty for deletions).
+        :return: None.
+        """
+        if self._change_feed is not None:
+            self._uncommitted_changes.append(
+                json.dumps({"PMID": pmid, "change": change, "content_hash": content_hash}) + "\n")
+
+    def _changed(self):
+        """
+        Counts a change and commits periodically.
+        :return: None.
+        """
+        self._number_of_uncommitted_changes += 1
+
+        if self._number_of_uncommitted_changes >= COMMIT_EVERY:
+            self.commit()
+    # endregion
@@ -0,0 +1,344 @@
+import xml.etree.ElementTree as ET
+from typing import Iterable, Optional
+
+import numpy as np
+
+from pubmed_dead_letter_queue import STAGE_LINK
+from pubmed_fetcher import PubMedFetcher
+from pubmed_publication import PubMedPublication
+
+# region Constants
+NCBI_LINK_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi"  # elink endpoint.
+LINK_NAME_REFERENCES = "pubmed_pubmed_refs"                                 # Link from an article to its references.
+LINK_NAME_CITED_BY = "pubmed_pubmed_citedin"                                # Link from an article to the citing articles.
+NUMBER_OF_IDS_IN_LINK_REQUEST = 200                                         # Number of IDs resolved per elink request.
+# endregion
+
+
+class PubMedCitationGraph:
+    """
+    In-memory citation index of PubMed articles.
+    Edges point from the citing article to the cited one. They are collected from the references of fetched
+    publications and from elink, and stored as compact CSR adjacency arrays (NumPy) in both directions,
+    which are rebuilt lazily after changes.
+    elink requests go through a PubMedFetcher, sharing its rate limit and its retries; the PMIDs of portions
+    which still fail are added to its dead-letter queue and stay unresolved, so that a later expand() retries them.
+    """
+    def __init__(self, fetcher: Optional[PubMedFetcher] = None):
+        """
+        Initialization of the node index, the edge buffers and the elink cache.
+        :param fetcher: The fetcher to send the elink requests with. If None (default), a new one is created.
+        """
+        self.fetcher = fetcher if fetcher is not None else PubMedFetcher()
+
+        self._node_index: dict[int, int] = {}               # PMID -> node index.
+        self._pmids: list[int] = []                         # node index -> PMID.
+        self._sources: list[int] = []                       # Node indices of the citing articles (unbuilt edges).
+        self._targets: list[int] = []                       # Node indices of the cited articles (unbuilt edges).
+        self._link_cache: dict[tuple[str, int], list[int]] = {}   # (link name, PMID) -> linked PMIDs.
+        self._dirty = True
+
+        self._pmid_array = np.zeros(0, dtype=np.int64)
+        self._out_indptr = np.zeros(1, dtype=np.int64)
+        self._out_indices = np.zeros(0, dtype=np.int32)
+        self._in_indptr = np.zeros(1, dtype=np.int64)
+        self._in_indices = np.zeros(0, dtype=np.int32)
+
+    # region Building
+    def add_citation(self, citing_pmid: int, cited_pmid: int):
+        """
+        Adds an edge from a citing to a cited article. Duplicate edges are removed when the arrays are built.
+        :param citing_pmid: PMID of the citing article.
+        :param cited_pmid: PMID of the cited article.
+        :return: None.
+        """
+        self._sources.append(self._get_node(citing_pmid))
+        self._targets.append(self._get_node(cited_pmid))
+        self._dirty = True
+
+    def add_publications(self, publications: Iterable[PubMedPublication]):
+        """
+        Adds the references of fetched publications which carry a PubMed ID.
+        :param publications: The publications.
+        :return: None.
+        """
+        for publication in publications:
+            self._get_node(publication.publication_id)
+            for reference in publication.references:
+                cited_pmid = self._to_pmid(reference.article_ids.get("PUBMED", ""))
+                if cited_pmid > 0:
+                    self.add_citation(publication.publication_id, cited_pmid)
+
+    def expand(self, pmids: Iterable[int], depth: int = 1, references: bool = True, cited_by: bool = False):
+        """
+        Expands the graph with elink, breadth first, resolving every level in bulk requests.
+        Each article is resolved only once; results of elink are cached. Articles whose elink request failed
+        are not expanded.
+        :param pmids: The PMIDs to start from.
+        :param depth: The number of levels to expand.
+        :param references: If set to True (default), follows the references of the articles.
+        :param cited_by: If set to True, follows the articles citing the articles.
+        :return: None.
+        """
+        visited = set()
+        level = {int(pmid) for pmid in pmids}
+
+        for _ in range(depth):
+            level -= visited
+            if len(level) == 0:
+                break
+
+            visited |= level
+            next_level = set()
+            sorted_level = sorted(level)
+
+            if references:
+                for pmid, linked_pmids in self._resolve_links(sorted_level, LINK_NAME_REFERENCES).items():
+                    for cited_pmid in linked_pmids:
+                        self.add_citation(pmid, cited_pmid)
+                    next_level.update(linked_pmids)
+
+            if cited_by:
+                for pmid, linked_pmids in self._resolve_links(sorted_level, LINK_NAME_CITED_BY).items():
+                    for citing_pmid in linked_pmids:
+                        self.add_citation(citing_pmid, pmid)
+                    next_level.update(linked_pmids)
+
+            level = next_level
+    # endregion
+
+    # region Queries
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self._pmids)
+
+    @property
+    def number_of_edges(self) -> int:
+        self._build()
+        return len(self._out_indices)
+
+    def __contains__(self, pmid: int) -> bool:
+        return pmid in self._node_index
+
+    def references(self, pmid: int) -> np.ndarray:
+        """
+        :param pmid: The PMID of an article.
+        :return: The PMIDs of the articles it cites.
+        """
+        self._build()
+        return self._neighbors(pmid, self._out_indptr, self._out_indices)
+
+    def cited_by(self, pmid: int) -> np.ndarray:
+        """
+        :param pmid: The PMID of an article.
+        :return: The PMIDs of the articles citing it.
+        """
+        self._build()
+        return self._neighbors(pmid, self._in_indptr, self._in_indices)
+
+    def out_degree(self, pmid: int) -> int:
+        """
+        :param pmid: The PMID of an article.
+        :return: The number of articles it cites.
+        """
+        return len(self.references(pmid))
+
+    def in_degree(self, pmid: int) -> int:
+        """
+        :param pmid: The PMID of an article.
+        :return: The number of articles citing it.
+        """
+        return len(self.cited_by(pmid))
+
+    def out_degrees(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Tuple of the array of all PMIDs and the array of their out-degrees.
+        """
+        self._build()
+        return self._pmid_array, np.diff(self._out_indptr)
+
+    def in_degrees(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Tuple of the array of all PMIDs and the array of their in-degrees.
+        """
+        self._build()
+        return self._pmid_array, np.diff(self._in_indptr)
+
+    def co_citation_count(self, first_pmid: int, second_pmid: int) -> int:
+        """
+        :param first_pmid: The PMID of the first article.
+        :param second_pmid: The PMID of the second article.
+        :return: The number of articles citing both articles.
+        """
+        return len(np.intersect1d(self.cited_by(first_pmid), self.cited_by(second_pmid), assume_unique=True))
+
+    def co_cited(self, pmid: int, top: int = 10) -> list[tuple[int, int]]:
+        """
+        Finds the articles most often cited together with an article.
+        :param pmid: The PMID of the article.
+        :param top: The maximum number of articles to return.
+        :return: List of tuples (PMID, co-citation count), by descending count.
+        """
+        self._build()
+        if pmid not in self._node_index:
+            return []
+
+        node = self._node_index[pmid]
+        citing_nodes = self._in_indices[self._in_indptr[node]: self._in_indptr[node + 1]]
+
+        if len(citing_nodes) == 0:
+            return []
+
+        co_cited_nodes = np.concatenate([self._out_indices[self._out_indptr[citing]: self._out_indptr[citing + 1]]
+                                         for citing in citing_nodes])
+        counts = np.bincount(co_cited_nodes, minlength=self.number_of_nodes)
+        counts[node] = 0
+
+        top = min(top, int(np.count_nonzero(counts)))
+        if top <= 0:
+            return []
+
+        best_nodes = np.argpartition(-counts, top - 1)[:top]
+        best_nodes = best_nodes[np.argsort(-counts[best_nodes], kind="stable")]
+
+        return [(int(self._pmid_array[best]), int(counts[best])) for best in best_nodes]
+    # endregion
+
+    # region Protected auxiliary
+    def _get_node(self, pmid: int) -> int:
+        """
+        Gets the node index of a PMID, adding the node if necessary.
+        :param pmid: The PMID.
+        :return: The node index.
+        """
+        node = self._node_index.get(pmid)
+
+        if node is None:
+            node = len(self._pmids)
+            self._node_index[pmid] = node
+            self._pmids.append(pmid)
+            self._dirty = True
+
+        return node
+
+    def _to_pmid(self, source: str) -> int:
+        """
+        Converts a PMID string to an integer.
+        :param source: The string.
+        :return: The PMID, or 0 if the string is not a number.
+        """
+        try:
+            return int(source)
+        except (TypeError, ValueError):
+            return 0
+
+    def _build(self):
+        """
+        Builds the CSR arrays of both directions from the edge buffers, removing duplicate edges.
+        :return: None.
+        """
+        if not self._dirty:
+            return
+
+        number_of_nodes = len(self._pmids)
+        sources = np.asarray(self._sources, dtype=np.int64)
+        targets = np.asarray(self._targets, dtype=np.int64)
+
+        keys = np.unique(sources * number_of_nodes + targets)
+        sources = (keys // max(number_of_nodes, 1)).astype(np.int32)
+        targets = (keys % max(number_of_nodes, 1)).astype(np.int32)
+
+        # Keep the buffers deduplicated, so that they do not grow with repeated additions.
+        self._sources = sources.tolist()
+        self._targets = targets.tolist()
+
+        self._pmid_array = np.asarray(self._pmids, dtype=np.int64)
+        self._out_indptr, self._out_indices = self._to_csr(sources, targets, number_of_nodes)
+        self._in_indptr, self._in_indices = self._to_csr(targets, sources, number_of_nodes)
+        self._dirty = False
+
+    def _to_csr(self, rows: np.ndarray, columns: np.ndarray, number_of_nodes: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Creates CSR arrays from edge arrays.
+        :param rows: The row (source) node of every edge.
+        :param columns: The column (target) node of every edge.
+        :param number_of_nodes: The number of nodes.
+        :return: Tuple of the index pointer array and the index array.
+        """
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=number_of_nodes), out=indptr[1:])
+
+        return indptr, columns[order]
+
+    def _neighbors(self, pmid: int, indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """
+        Gets the neighbors of an article in one direction.
+        :param pmid: The PMID of the article.
+        :param indptr: The CSR index pointer array.
+        :param indices: The CSR index array.
+        :return: The PMIDs of the neighbors.
+        """
+        node = self._node_index.get(pmid)
+
+        if node is None:
+            return np.zeros(0, dtype=np.int64)
+
+        return self._pmid_array[indices[indptr[node]: indptr[node + 1]]]
+
+    def _resolve_links(self, pmids: list[int], link_name: str) -> dict[int, list[int]]:
+        """
+        Resolves the links of a list of articles, using the cache and bulk elink requests for the rest.
+        The PMIDs of failed requests are added to the dead-letter queue and left out of the result.
+        :param pmids: The PMIDs to resolve.
+        :param link_name: The elink link name, e.g. LINK_NAME_REFERENCES.
+        :return: Dictionary with the resolved PMIDs as keys and the lists of linked PMIDs as values.
+        """
+        missing = [pmid for pmid in pmids if (link_name, pmid) not in self._link_cache]
+
+        for start_index in range(0, len(missing), NUMBER_OF_IDS_IN_LINK_REQUEST):
+            portion = missing[start_index: start_index + NUMBER_OF_IDS_IN_LINK_REQUEST]
+
+            try:
+                links = self._download_links(portion, link_name)
+            except ValueError as exception:
+                print(f"elink failed for {len(portion)} articles: {exception}")
+                for pmid in portion:
+                    self.fetcher.dead_letter_queue.add(pmid, STAGE_LINK, f"{link_name}: {exception}")
+                continue
+
+            for pmid in portion:
+                self._link_cache[(link_name, pmid)] = links.get(pmid, [])
+
+        return {pmid: self._link_cache[(link_name, pmid)] for pmid in pmids if (link_name, pmid) in self._link_cache}
+
+    def _download_links(self, pmids: list[int], link_name: str) -> dict[int, list[int]]:
+        """
+        Sends one elink request for a list of articles, retried by the fetcher on failures.
+        Every ID is passed as a separate 'id' parameter, so that elink answers with one link set per article.
+        :param pmids: The PMIDs to resolve.
+        :param link_name: The elink link name.
+        :return: Dictionary with the PMIDs as keys and the lists of linked PMIDs as values.
+        :raises ValueError: If all attempts failed.
+        """
+        result = {}
+        data = [("dbfrom", "pubmed"), ("db", "pubmed"), ("linkname", link_name)]
+        data += [("id", str(pmid)) for pmid in pmids]
+
+        tree = self.fetcher._send_with_retries("post", NCBI_LINK_URL, ET.fromstring, data=data)
+
+        for x_link_set in tree.findall("LinkSet"):
+            pmid = self._to_pmid(x_link_set.findtext("IdList/Id"))
+            linked_pmids = [self._to_pmid(x_id.text) for x_id in x_link_set.findall("LinkSetDb/Link/Id")]
+            result[pmid] = [linked_pmid for linked_pmid in linked_pmids if linked_pmid > 0]
+
+        return result
+    # endregion
+
+
+if __name__ == '__main__':
+    graph = PubMedCitationGraph()
+    graph.expand([271968], depth=1, cited_by=True)
+
+    print(f"{graph.number_of_nodes} articles, {graph.number_of_edges} citations")
+    print(graph.co_cited(271968))
@@ -0,0 +1,455 @@
+"""
+Command line interface of PubMedium.
+
+    python pubmed_cli.py fetch --topics dicom,mri --output dicom_mri.xml
+    python pubmed_cli.py fetch --query "(dicom OR pacs) AND mri[tiab]" --output results.xml
+    python pubmed_cli.py corpus --size 100 --topics dicom,pacs --output-folder C:/Temp --abstracts --bibtex
+    python pubmed_cli.py chunks C:/Temp/dicom_pacs --chunk-size 256
+    python pubmed_cli.py abstracts --files pubmed24n0001.xml.gz --output-folder C:/Temp/abstracts
+    python pubmed_cli.py ingest pubmed24n0001.xml.gz pubmed24n0002.xml.gz --output baseline.xml
+    python pubmed_cli.py export --topics dicom,pacs --format bibtex --output dicom_pacs.bib
+    python pubmed_cli.py fetch --retry dead_letters.jsonl --output retried.xml
+    python pubmed_cli.py fetch --topics dicom,mri --shard 2/4 --output results.xml    (writes results.shard-2-of-4.xml)
+    python pubmed_cli.py ingest pubmed24n*.xml.gz --work-queue queue.db --output baseline.xml
+    python pubmed_cli.py merge results.shard-*.xml --format xml --output results.xml
+
+Only argparse is imported at start-up; the modules of the commands (and their dependencies) are imported
+when a command runs. See benchmark_import_time.py.
+"""
+import argparse
+import sys
+from typing import Callable, Iterable, Iterator, Optional
+
+# Number of PMIDs a worker leases from the work queue at a time.
+WORK_QUEUE_BATCH_SIZE = 1000
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Runs the command line interface.
+    :param argv: The arguments (without the program name). If None, sys.argv is used.
+    :return: The exit code.
+    """
+    parser = _create_parser()
+    arguments = parser.parse_args(argv)
+
+    if arguments.command is None:
+        parser.print_help()
+        return 2
+
+    return arguments.function(arguments)
+
+
+# region Commands
+def _fetch(arguments: argparse.Namespace) -> int:
+    """
+    Fetches publications by topics or boolean queries and writes them as XML.
+    """
+    from pubmed_writers import PubMedXmlWriter
+
+    output = _output_name(arguments, arguments.output)
+
+    with PubMedXmlWriter(output) as writer:
+        for publication in _fetch_publications(arguments, writer.flush):
+            writer.write(publication)
+
+        print(f"Wrote {writer.count} publications to {output}", file=sys.stderr)
+
+    return 0
+
+
+def _corpus(arguments: argparse.Namespace) -> int:
+    """
+    Creates a full text corpus.
+    """
+    from pubmed_corpus_creator import PubMedCorpusCreator
+
+    PubMedCorpusCreator.chunk_size = arguments.chunk_size
+    PubMedCorpusCreator.chunk_overlap = arguments.chunk_overlap
+    PubMedCorpusCreator.number_of_processes = arguments.processes
+    creator = PubMedCorpusCreator()
+    partition = _create_partition(arguments)
+
+    if arguments.state is None:
+        creator.create_corpus(arguments.size, _split(arguments.topics), arguments.output_folder, arguments.name,
+                              arguments.abstracts, arguments.bibtex, arguments.format,
+                              post_process_texts=arguments.post_process, partition=partition)
+        return 0
+
+    from pubmed_change_tracker import PubMedChangeTracker
+
+    with PubMedChangeTracker(arguments.state) as tracker:
+        creator.create_corpus(arguments.size, _split(arguments.topics), arguments.output_folder, arguments.name,
+                              arguments.abstracts, arguments.bibtex, arguments.format, tracker,
+                              arguments.post_process, partition)
+
+    return 0
+
+
+def _chunks(arguments: argparse.Namespace) -> int:
+    """
+    Cleans and chunks the text files of an existing corpus folder.
+    """
+    from pubmed_text_processor import PubMedTextProcessor
+
+    processor = PubMedTextProcessor(arguments.chunk_size, arguments.chunk_overlap, arguments.processes)
+    print(f"Processed {processor.process_folder(arguments.folder)} text files.", file=sys.stderr)
+
+    return 0
+
+
+def _abstracts(arguments: argparse.Namespace) -> int:
+    """
+    Creates a deduplicated abstract corpus in compressed shards.
+    """
+    from pubmed_abstract_corpus_creator import PubMedAbstractCorpusCreator
+
+    creator = _create_fetcher(PubMedAbstractCorpusCreator, arguments)
+    creator.create_abstract_corpus(arguments.output_folder, _split(arguments.topics) if arguments.topics else None,
+                                   arguments.files, arguments.processes, compression=arguments.compression,
+                                   remove_near_duplicates=not arguments.keep_near_duplicates)
+
+    return 0
+
+
+def _ingest(arguments: argparse.Namespace) -> int:
+    """
+    Converts local PubMed XML files (baseline, updates) to PubMedium XML.
+    """
+    from pubmed_writers import PubMedXmlWriter
+
+    output = _output_name(arguments, arguments.output)
+
+    with PubMedXmlWriter(output) as writer:
+        for publication in _fetch_publications(arguments, writer.flush):
+            writer.write(publication)
+
+        print(f"Wrote {writer.count} publications to {output}", file=sys.stderr)
+
+    return 0
+
+
+def _export(arguments: argparse.Namespace) -> int:
+    """
+    Exports publications fetched by topics or queries, or read from PubMed XML files, to BibTeX or CSV.
+    """
+    from pubmed_writers import PubMedBibTeXWriter, PubMedInfoWriter, to_info_entry
+
+    output = _output_name(arguments, arguments.output)
+
+    if arguments.format == "bibtex":
+        with PubMedBibTeXWriter(output) as writer:
+            writer.write_all(_fetch_publications(arguments, writer.flush))
+            count = writer.count
+    else:
+        with PubMedInfoWriter(output) as writer:
+            for publication in _fetch_publications(arguments, writer.flush):
+                writer.write(to_info_entry(publication))
+            count = writer.count
+
+    print(f"Exported {count} publications to {output}", file=sys.stderr)
+
+    return 0
+
+
+def _merge(arguments: argparse.Namespace) -> int:
+    """
+    Merges the outputs of shards or workers: XML, CSV (info.csv) and BibTeX files, shard folders or corpus folders.
+    """
+    import pubmed_partitioning
+    import pubmed_shards
+
+    merge = {"xml": pubmed_partitioning.merge_xml_files,
+             "csv": pubmed_partitioning.merge_info_files,
+             "bibtex": pubmed_partitioning.merge_bibtex_files,
+             "shards": pubmed_shards.merge_shard_folders,
+             "corpus": pubmed_partitioning.merge_corpus_folders}[arguments.format]
+
+    count = merge(arguments.inputs, arguments.output)
+    unit = "shards" if arguments.format == "shards" else "entries"
+    print(f"Merged {len(arguments.inputs)} inputs into {arguments.output} ({count} {unit})", file=sys.stderr)
+
+    return 0
+# endregion
+
+
+# region Auxiliary
+def _create_parser() -> argparse.ArgumentParser:
+    """
+    :return: The argument parser with all subcommands.
+    """
+    parser = argparse.ArgumentParser(prog="pubmedium", description="PubMedium: fetch PubMed publications, "
+                                                                   "create corpora, ingest and export.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    fetch_parser = subparsers.add_parser("fetch", help="Fetch publications by topics or queries and write them as XML.")
+    _add_source_arguments(fetch_parser, files=False)
+    fetch_parser.add_argument("--output", required=True, help="The XML file to write.")
+    fetch_parser.set_defaults(function=_fetch)
+
+    corpus_parser = subparsers.add_parser("corpus", help="Create a full text corpus from PMC PDFs.")
+    corpus_parser.add_argument("--size", type=int, required=True, help="The maximum size of the corpus.")
+    corpus_parser.add_argument("--topics", required=True, help="Comma separated topics (combined by AND).")
+    corpus_parser.add_argument("--output-folder", required=True, help="The folder to create the corpus in.")
+    corpus_parser.add_argument("--name", default="", help="The corpus name. Default: the topics joined by '_'.")
+    corpus_parser.add_argument("--abstracts", action="store_true", help="Write the abstracts into a subfolder.")
+    corpus_parser.add_argument("--bibtex", action="store_true", help="Write a BibTeX file of the articles.")
+    corpus_parser.add_argument("--format", choices=["files", "shards"], default="files",
+                               help="One .txt file per article, or compressed shards with an index.")
+    corpus_parser.add_argument("--state", help="SQLite file of content hashes: the PDFs of unchanged articles are "
+                                               "not downloaded again.")
+    corpus_parser.add_argument("--post-process", action="store_true",
+                               help="Clean the texts and write token-bounded chunks (<PMC ID>.chunks.jsonl).")
+    _add_chunk_arguments(corpus_parser)
+    _add_partition_arguments(corpus_parser, work_queue=False)
+    corpus_parser.set_defaults(function=_corpus)
+
+    chunks_parser = subparsers.add_parser("chunks", help="Clean and chunk the text files of a corpus folder.")
+    chunks_parser.add_argument("folder", help="The corpus folder.")
+    _add_chunk_arguments(chunks_parser)
+    chunks_parser.set_defaults(function=_chunks)
+
+    abstracts_parser = subparsers.add_parser("abstracts", help="Create a deduplicated abstract corpus in shards.")
+    abstracts_source_group = abstracts_parser.add_mutually_exclusive_group(required=True)
+    abstracts_source_group.add_argument("--topics", help="Comma separated topics (combined by AND).")
+    abstracts_source_group.add_argument("--files", nargs="+", help="PubMed XML files (.xml, .xml.gz).")
+    abstracts_parser.add_argument("--output-folder", required=True, help="The folder to write the shards into.")
+    abstracts_parser.add_argument("--processes", type=int, default=None, help="Worker processes. Default: CPUs.")
+    abstracts_parser.add_argument("--compression", choices=["gzip", "zstd", "none"], default="gzip",
+                                  help="The compression of the shards.")
+    abstracts_parser.add_argument("--keep-near-duplicates", action="store_true",
+                                  help="Only skip exact duplicates.")
+    abstracts_parser.add_argument("--no-references", action="store_true", help="Do not extract references.")
+    abstracts_parser.add_argument("--deduplicate-authors", action="store_true",
+                                  help="Deduplicate the authors in an author registry (slower on large inputs).")
+    abstracts_parser.add_argument("--dead-letters", help="JSON lines file the records which cannot be fetched or "
+                                                         "extracted are appended to.")
+    abstracts_parser.set_defaults(function=_abstracts)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Convert PubMed XML files (.xml, .xml.gz) to PubMedium XML.")
+    ingest_parser.add_argument("files", nargs="+", help="The PubMed XML files.")
+    ingest_parser.add_argument("--output", required=True, help="The XML file to write.")
+    ingest_parser.add_argument("--no-references", action="store_true", help="Do not extract references.")
+    ingest_parser.add_argument("--deduplicate-authors", action="store_true",
+                               help="Deduplicate the authors in an author registry (slower on large inputs).")
+    ingest_parser.add_argument("--dead-letters", help="JSON lines file the records which cannot be extracted "
+                                                      "are appended to.")
+    ingest_parser.add_argument("--state", help="SQLite file of content hashes: only added or modified publications "
+                                               "are written.")
+    ingest_parser.add_argument("--changes", help="JSON lines file the added, modified and deleted PMIDs are "
+                                                 "appended to (requires --state).")
+    _add_partition_arguments(ingest_parser, work_queue=True)
+    ingest_parser.set_defaults(function=_ingest)
+
+    export_parser = subparsers.add_parser("export", help="Export publications to BibTeX or CSV.")
+    _add_source_arguments(export_parser, files=True)
+    export_parser.add_argument("--format", choices=["bibtex", "csv"], default="bibtex", help="The output format.")
+    export_parser.add_argument("--deduplicate-authors", action="store_true",
+                               help="Deduplicate the authors in an author registry (slower on large inputs).")
+    export_parser.add_argument("--output", required=True, help="The file to write.")
+    export_parser.set_defaults(function=_export)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the outputs of shards or workers.")
+    merge_parser.add_argument("inputs", nargs="+", help="The partial outputs (files, or folders for shards and corpus).")
+    merge_parser.add_argument("--format", choices=["xml", "csv", "bibtex", "shards", "corpus"], default="xml",
+                              help="The kind of the outputs.")
+    merge_parser.add_argument("--output", required=True, help="The merged file or folder.")
+    merge_parser.set_defaults(function=_merge)
+
+    return parser
+
+
+def _add_source_arguments(parser: argparse.ArgumentParser, files: bool):
+    """
+    Adds the arguments selecting the publications: topics, queries and, optionally, PubMed XML files.
+    """
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--topics", help="Comma separated topics (combined by AND).")
+    source_group.add_argument("--query", action="append", help="Boolean query; may be repeated.")
+    source_group.add_argument("--retry", help="Dead-letter file: fetch its PMIDs again.")
+    if files:
+        source_group.add_argument("--files", nargs="+", help="PubMed XML files (.xml, .xml.gz).")
+
+    parser.add_argument("--no-references", action="store_true", help="Do not extract references.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print intermediate results.")
+    parser.add_argument("--dead-letters", help="JSON lines file the records which cannot be fetched or extracted "
+                                               "are appended to.")
+    parser.add_argument("--state", help="SQLite file of content hashes: only added or modified publications are "
+                                        "written (see PubMedChangeTracker).")
+    parser.add_argument("--changes", help="JSON lines file the added, modified and deleted PMIDs are appended to "
+                                          "(requires --state).")
+    _add_partition_arguments(parser, work_queue=True)
+
+
+def _add_partition_arguments(parser: argparse.ArgumentParser, work_queue: bool):
+    """
+    Adds the arguments splitting a job between nodes or processes: a deterministic shard or a shared work queue.
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--shard", help="Process shard i of N only, e.g. '2/4'; the output gets the suffix "
+                                       "'.shard-2-of-4' (see the merge command).")
+    parser.add_argument("--partition-method", choices=["hash", "range"], default="hash",
+                        help="Partition the PMIDs by hash (default) or in ranges of the sorted PMIDs.")
+    if work_queue:
+        group.add_argument("--work-queue", help="SQLite file shared by the workers: PMIDs (or files) are leased in "
+                                                "batches; the output gets the suffix '.worker-<name>'.")
+        parser.add_argument("--worker", help="The name of the worker. Default: <host>-<process ID>.")
+        parser.add_argument("--lease-seconds", type=float, default=600,
+                            help="Time after which the unfinished batch of a worker is handed out again.")
+
+
+def _add_chunk_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the arguments of the text post-processing.
+    """
+    parser.add_argument("--chunk-size", type=int, default=512, help="Maximum number of tokens of a chunk.")
+    parser.add_argument("--chunk-overlap", type=int, default=64, help="Tokens shared by consecutive chunks.")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes. Default: CPUs.")
+
+
+def _create_fetcher(fetcher_class, arguments: argparse.Namespace):
+    """
+    Creates a fetcher, applying the output, reference, dead-letter and author registry options.
+    The options are set on PubMedFetcher, whose class variables the subclasses read, too.
+    """
+    from pubmed_fetcher import PubMedFetcher
+
+    PubMedFetcher.extract_references = not arguments.no_references
+    PubMedFetcher.print_intermediate_results = not getattr(arguments, "quiet", True)
+    PubMedFetcher.dead_letter_file = getattr(arguments, "dead_letters", None)
+    # Bulk commands (ingest, abstracts, export) register authors only on request.
+    PubMedFetcher.deduplicate_authors = getattr(arguments, "deduplicate_authors", True)
+
+    return fetcher_class()
+
+
+def _fetch_publications(arguments: argparse.Namespace, flush: Optional[Callable[[], None]] = None) -> Iterator:
+    """
+    Yields the publications selected by the source arguments; publications found by several queries only once.
+    With --state, only the added and modified publications are yielded.
+    flush (of the output writer) is called before a batch of the work queue is marked as done and before
+    the hashes of the change tracker are committed.
+    """
+    from pubmed_fetcher import PubMedFetcher
+
+    fetcher = _create_fetcher(PubMedFetcher, arguments)
+    partition = _create_partition(arguments)
+
+    if arguments.work_queue:
+        publications = _iterate_work_queue(fetcher, arguments, flush)
+    elif getattr(arguments, "files", None):
+        publications = fetcher.iterate_from_files(arguments.files, partition)
+    elif getattr(arguments, "topics", None):
+        publications = fetcher.iterate_by_topics(_split(arguments.topics), partition=partition)
+    elif getattr(arguments, "retry", None):
+        from pubmed_dead_letter_queue import PubMedDeadLetterQueue
+        pmids = PubMedDeadLetterQueue.read_pmids(arguments.retry)
+        publications = fetcher.iterate_by_ids(pmids if partition is None else partition.select(pmids))
+    else:
+        publications = _unique(fetcher.fetch_by_queries(arguments.query, partition=partition).values())
+
+    if not arguments.state:
+        yield from publications
+        return
+
+    from pubmed_change_tracker import PubMedChangeTracker
+
+    with PubMedChangeTracker(arguments.state, arguments.changes, flush) as tracker:
+        yield from tracker.filter_changed(publications)
+        tracker.record_deleted(fetcher.deleted_publication_ids)
+
+        print(", ".join(f"{count} {change}" for change, count in tracker.counts.items()), file=sys.stderr)
+
+
+def _iterate_work_queue(fetcher, arguments: argparse.Namespace, flush: Optional[Callable[[], None]]) -> Iterator:
+    """
+    Adds the job (PMIDs or files) to the work queue and yields the publications of the batches leased by this worker,
+    until the queue is exhausted. A batch is marked as done once its publications were consumed and flush was called.
+    """
+    from pubmed_partitioning import PubMedWorkQueue
+
+    if getattr(arguments, "files", None):
+        keys, batch_size = arguments.files, 1
+    elif getattr(arguments, "topics", None):
+        keys, batch_size = fetcher.search_by_topics(_split(arguments.topics)), WORK_QUEUE_BATCH_SIZE
+    elif getattr(arguments, "retry", None):
+        from pubmed_dead_letter_queue import PubMedDeadLetterQueue
+        keys, batch_size = PubMedDeadLetterQueue.read_pmids(arguments.retry), WORK_QUEUE_BATCH_SIZE
+    else:
+        raise SystemExit("error: --work-queue requires --topics, --retry or --files")
+
+    worker = _worker_name(arguments)
+
+    with PubMedWorkQueue(arguments.work_queue, arguments.lease_seconds) as queue:
+        queue.add(keys)
+
+        for batch in queue.iterate(worker, batch_size, flush):
+            if getattr(arguments, "files", None):
+                yield from fetcher.iterate_from_files(batch)
+            else:
+                yield from fetcher.iterate_by_ids(batch)
+
+        print(f"Worker {worker} finished; queue: "
+              + ", ".join(f"{count} {state}" for state, count in queue.counts().items()), file=sys.stderr)
+
+
+def _create_partition(arguments: argparse.Namespace):
+    """
+    :return: The PubMedPartition of --shard, None without it.
+    """
+    if not getattr(arguments, "shard", None):
+        return None
+
+    from pubmed_partitioning import PubMedPartition
+
+    return PubMedPartition.parse(arguments.shard, arguments.partition_method)
+
+
+def _output_name(arguments: argparse.Namespace, output: str) -> str:
+    """
+    :return: The name of the output, with the label of the shard or the worker, if the job is split.
+    """
+    if getattr(arguments, "shard", None):
+        from pubmed_partitioning import partition_file_name
+        return partition_file_name(output, _create_partition(arguments).label)
+
+    if getattr(arguments, "work_queue", None):
+        from pubmed_partitioning import partition_file_name
+        return partition_file_name(output, f"worker-{_worker_name(arguments)}")
+
+    return output
+
+
+def _worker_name(arguments: argparse.Namespace) -> str:
+    """
+    :return: The name of the worker (--worker, by default <host>-<process ID>).
+    """
+    if not arguments.worker:
+        from pubmed_partitioning import default_worker_name
+        arguments.worker = default_worker_name()
+
+    return arguments.worker
+
+
+def _unique(publication_lists: Iterable[list]) -> Iterator:
+    """
+    Yields the publications of several lists, every PMID only once.
+    """
+    seen = set()
+    for publications in publication_lists:
+        for publication in publications:
+            if publication.publication_id not in seen:
+                seen.add(publication.publication_id)
+                yield publication
+
+
+def _split(topics: str) -> list[str]:
+    """
+    Splits a comma separated list of topics.
+    """
+    return [topic.strip() for topic in topics.split(",") if len(topic.strip()) > 0]
+# endregion
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,21 @@
 import os.path
+import random
 import shutil
 import subprocess
-
-import requests
-from bs4 import BeautifulSoup
-from numpy.random import shuffle
-from pandas import DataFrame
-
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from pubmed_change_tracker import PubMedChangeTracker
+from pubmed_dead_letter_queue import STAGE_PROCESS
 from pubmed_fetcher import PubMedFetcher
+from pubmed_partitioning import PubMedPartition
+from pubmed_publication import PubMedPublication
+from pubmed_shards import PubMedShardWriter
+from pubmed_text_processor import PubMedTextProcessor, CHUNKS_EXTENSION, process_document, write_document
+from pubmed_writers import PubMedBibTeXWriter, PubMedInfoWriter, to_info_entry
 
 # Base URL to fetch PDFs from:
 NCBI_BASE_URL = "https://www.ncbi.nlm.nih.gov"
@@ -30,26 +38,37 @@ HEADERS_PDF = {
     "Accept": "application/pdf",
 }
 
-# Name for the temporary PDF file (presumed you are on Windows and C:\Temp exists).
-TEMP_PDF = r"C:\Temp\temp_pubmed.pdf"
-TEMP_TXT = r"C:\Temp\temp_pubmed.txt"
+# Names of the temporary PDF and text files, in a temporary folder of their own per create_corpus() call,
+# so that several processes (or nodes sharing a folder) can create corpora at the same time.
+TEMP_PDF_NAME = "temp_pubmed.pdf"
+TEMP_TXT_NAME = "temp_pubmed.txt"
 
 
 class PubMedCorpusCreator(PubMedFetcher):
     """
     Holds functionality for the creation of corpora based on full article texts.
     """
+    # region Class variables
+    chunk_size = 512                            # Maximum number of tokens of a chunk (post-processing only).
+    chunk_overlap = 64                          # Number of tokens shared by consecutive chunks (post-processing only).
+    number_of_processes: Optional[int] = None   # Worker processes of the post-processing; None: the number of CPUs.
+    # endregion
+
     def __init__(self):
         """
-        Initialization of the info list.
+        Initialization of the fetcher.
         """
-        self._infos = []
+        super().__init__()
+        self._temp_pdf = ""     # Temporary files of the running create_corpus() call.
+        self._temp_txt = ""
 
     """
     Creator of topic text corpora from PubMed publications.
     """
     def create_corpus(self, size: int, topics: list[str], output_folder: str, corpus_name: str = "",
-                      create_abstracts: bool = False, create_bibtex: bool = False):
+                      create_abstracts: bool = False, create_bibtex: bool = False, output_format: str = "files",
+                      change_tracker: Optional[PubMedChangeTracker] = None, post_process_texts: bool = False,
+                      partition: Optional[PubMedPartition] = None):
         """
         Creates a text file corpus for a list of topics.
         :param size: The maximum size of the corpus to create.
@@ -62,15 +81,27 @@ class PubMedCorpusCreator(PubMedFetcher):
                                  with the abstracts of the articles stored under their PMC IDs as file names.
         :param create_bibtex: If set to True, a file named "<corpus_name>.bib" will be created in the corpus folder
                               with the BibTeX references to the articles.
-
+        :param output_format: "files" (default): one .txt file per article (and per abstract).
+                              "shards": the texts are packed into compressed shards with an offset index
+                              in the subfolder "texts" (and "abstracts"), see PubMedShardReader.
+        :param change_tracker: If given, the PDFs of publications whose content hash did not change since the last run
+                               are not downloaded and converted again, provided their text file exists
+                               (output format "files" only). The hashes are stored once an article is processed.
+        :param post_process_texts: If set to True, the texts are cleaned (running headers and footers, references,
+                                   hyphenation) and chunked in worker processes (see PubMedTextProcessor):
+                                   "<PMC ID>.chunks.jsonl" is written next to each text file;
+                                   shard records get the key "chunks".
+        :param partition: If given, only the publications of this shard of the PMIDs found are processed,
+                          into the folder "<corpus_name>.shard-i-of-N", so that several nodes can create parts
+                          of a corpus (see merge_corpus_folders()).
         """
         if len(topics) == 0:
             print("No topics defined. Canceling.")
             return
 
         PubMedFetcher.print_intermediate_results = False
-        ids = self._extract_ids_by_topics(topics)
-        shuffle(ids)
+        ids = self.search_by_topics(topics, partition=partition)
+        random.shuffle(ids)
 
         print(f"Found {len(ids)} publications for the topics.")
         publications = self._extract_publications(ids)
@@ -82,6 +113,8 @@ class PubMedCorpusCreator(PubMedFetcher):
             os.mkdir(output_folder)
 
         corpus_folder = f"{output_folder}/{corpus_name}"
+        if partition is not None:
+            corpus_folder = f"{corpus_folder}.{partition.label}"
 
         if not os.path.exists(corpus_folder):
             os.mkdir(corpus_folder)
@@ -91,56 +124,132 @@ class PubMedCorpusCreator(PubMedFetcher):
             if not os.path.exists(abstracts_folder):
                 os.mkdir(abstracts_folder)
 
-        bibtex = ""
-
-        count = 0
-        for publication in publications:
-            if "PMC" in publication.article_ids:
-                pmc_id = publication.article_ids["PMC"]
-                pmc_url = self._get_pmc_url(pmc_id)
-                pdf_link = self._get_pdf_link(pmc_url)
-
-                if len(pdf_link) == 0:
-                    print("PDF link not found. Skipping.")
-                    continue
-
-                if not self._download_pdf(pdf_link):
-                    print("PDF link not found. Skipping.")
-                    continue
-
-                if not self._convert_to_text():
-                    print("Conversion from PDF to text failed. Skipping.")
-                    continue
+        text_shards = None
+        abstract_shards = None
+        if output_format == "shards":
+            text_shards = PubMedShardWriter(f"{corpus_folder}/texts")
+            if create_abstracts:
+                abstract_shards = PubMedShardWriter(abstracts_folder)
+
+        # info.csv and the BibTeX file are written as each article completes, so that a crash keeps them.
+        info_writer = PubMedInfoWriter(f"{corpus_folder}/info.csv")
+        bibtex_writer = PubMedBibTeXWriter(f"{corpus_folder}/{corpus_name}.bib") if create_bibtex else None
+
+        def flush_outputs():
+            info_writer.flush()
+            if bibtex_writer is not None:
+                bibtex_writer.flush()
+
+        def complete_article(pmc_id: str, publication: PubMedPublication, keys: list[str]):
+            # The entries of an article are written once its text is written, so that they never list a missing text.
+            info_writer.write(to_info_entry(publication))
+
+            if abstract_shards is not None:
+                abstract_shards.write(self._to_record(pmc_id, publication, publication.abstract), keys)
+            elif create_abstracts:
+                self._add_abstract(pmc_id, publication.abstract, abstracts_folder)
+
+            if bibtex_writer is not None:
+                bibtex_writer.write(publication)
+
+            if change_tracker is not None:
+                change_tracker.classify(publication)
+
+        # The hashes of the tracker are committed only once the entries of their articles are on disk.
+        if change_tracker is not None:
+            change_tracker.before_commit = flush_outputs
+
+        # Post-processing runs in worker processes while the next PDFs are downloaded.
+        processor = None
+        executor = None
+        pending_texts = deque()
+        if post_process_texts:
+            processor = PubMedTextProcessor(self.chunk_size, self.chunk_overlap, self.number_of_processes)
+            executor = processor.create_executor()
+
+        temp_folder = tempfile.mkdtemp(prefix="pubmedium-")
+        self._temp_pdf = os.path.join(temp_folder, TEMP_PDF_NAME)
+        self._temp_txt = os.path.join(temp_folder, TEMP_TXT_NAME)
 
-                file_name = f"{corpus_folder}/{pmc_id}.txt"
-                shutil.copyfile(TEMP_TXT, file_name)
-
-                # Entry for the infos:
-                doi = publication.article_ids["DOI"] if "DOI" in publication.article_ids else ""
-                info_entry = {"PMCID": pmc_id, "PMID": publication.publication_id, "DOI": doi, "Title": publication.article_title}
-                self._infos.append(info_entry)
-
-                if create_abstracts:
-                    self._add_abstract(pmc_id, publication.abstract, abstracts_folder)
-
-                if create_bibtex:
-                    bibtex += f"{publication.to_bibtex_entry()}\n\n"
-
-                count += 1
-                print(f"Copied {file_name} ({count} of {min(len(publications), size)})")
-
-                if count >= size:
-                    print(f"*** All publications processed. Created {count} text files.")
-                    break
-
-        df = DataFrame(self._infos)
-        df.to_csv(f"{corpus_folder}/info.csv")
-
-        if create_bibtex:
-            bibtex_file = f"{corpus_folder}/{corpus_name}.bib"
-
-            with open(bibtex_file, "w", encoding="utf-8") as file:
-                file.write(bibtex)
+        try:
+            count = 0
+            for publication in publications:
+                if "PMC" in publication.article_ids:
+                    pmc_id = publication.article_ids["PMC"]
+                    keys = [pmc_id, str(publication.publication_id)]
+                    file_name = f"{corpus_folder}/{pmc_id}.txt"
+
+                    # Unchanged publications whose text file exists need no download and conversion.
+                    unchanged = change_tracker is not None and text_shards is None and os.path.exists(file_name) \
+                        and (not post_process_texts or os.path.exists(f"{corpus_folder}/{pmc_id}{CHUNKS_EXTENSION}")) \
+                        and change_tracker.is_unchanged(publication)
+
+                    if unchanged:
+                        print(f"{pmc_id} unchanged. Keeping {file_name}.")
+                        complete_article(pmc_id, publication, keys)
+                    else:
+                        pmc_url = self._get_pmc_url(pmc_id)
+                        pdf_link = self._get_pdf_link(pmc_url)
+
+                        if len(pdf_link) == 0:
+                            print("PDF link not found. Skipping.")
+                            continue
+
+                        if not self._download_pdf(pdf_link):
+                            print("PDF link not found. Skipping.")
+                            continue
+
+                        if not self._convert_to_text():
+                            print("Conversion from PDF to text failed. Skipping.")
+                            continue
+
+                        if executor is not None:
+                            # The entries of the article are written by complete_article() once its text is.
+                            executor, future = self._submit_text(executor, processor, self._read_text(self._temp_txt))
+                            pending_texts.append((future, pmc_id, publication, keys, file_name))
+                            self._write_processed_texts(pending_texts, text_shards, 2 * processor.processes,
+                                                        complete_article)
+                        else:
+                            if text_shards is None:
+                                shutil.copyfile(self._temp_txt, file_name)
+                            else:
+                                text = self._read_text(self._temp_txt)
+                                text_shards.write(self._to_record(pmc_id, publication, text), keys)
+
+                            complete_article(pmc_id, publication, keys)
+
+                        if text_shards is not None:
+                            file_name = f"{pmc_id} into {text_shards.folder}"
+
+                    count += 1
+                    print(f"Copied {file_name} ({count} of {min(len(publications), size)})")
+
+                    if count >= size:
+                        print(f"*** All publications processed. Created {count} text files.")
+                        break
+        finally:
+            try:
+                if executor is not None:
+                    try:
+                        self._write_processed_texts(pending_texts, text_shards, 0, complete_article)
+                    finally:
+                        executor.shutdown(cancel_futures=True)
+            finally:
+                if change_tracker is not None:
+                    change_tracker.before_commit = None
+
+                info_writer.close()
+
+                if bibtex_writer is not None:
+                    bibtex_writer.close()
+
+                if text_shards is not None:
+                    text_shards.close()
+
+                if abstract_shards is not None:
+                    abstract_shards.close()
+
+                shutil.rmtree(temp_folder, ignore_errors=True)
 
     # region Protected auxiliary
     def _get_pmc_url(self, pmc_id: str) -> str:
@@ -157,6 +266,9 @@ class PubMedCorpusCreator(PubMedFetcher):
         :param pmc_url: The PMC ID.
         :return: The URL of the PDF article.
         """
+        import requests
+        from bs4 import BeautifulSoup
+
         request = requests.get(pmc_url, allow_redirects=True, headers=HEADERS_PDF_LINK)
         response = request.text
 
@@ -179,11 +291,13 @@ class PubMedCorpusCreator(PubMedFetcher):
         :param pdf_link: The URL of the PDF file.
         :return: True, if the download succeeded.
         """
+        import requests
+
         response = requests.get(pdf_link, headers=HEADERS_PDF)
 
         try:
             # Write the downloaded PDF content to a file
-            with open(TEMP_PDF, "wb") as file:
+            with open(self._temp_pdf, "wb") as file:
                 file.write(response.content)
 
             return True
@@ -198,7 +312,7 @@ class PubMedCorpusCreator(PubMedFetcher):
         try:
             # Added stderr=subprocess.DEVNULL to supress annoying warnings from MikTeX (ChatGPT).
             # no options used for pdftotext (except for -q). TODO: make the options as parameters.
-            subprocess.run(["pdftotext", "-q", TEMP_PDF], stderr=subprocess.DEVNULL)
+            subprocess.run(["pdftotext", "-q", self._temp_pdf, self._temp_txt], stderr=subprocess.DEVNULL)
             return True
         except:
             return False
@@ -215,6 +329,75 @@ class PubMedCorpusCreator(PubMedFetcher):
 
         with open(file_name, "w", encoding="utf-8") as file:
             file.write(abstract)
+
+    def _read_text(self, file_name: str) -> str:
+        """
+        Reads a text file written by pdftotext.
+        :param file_name: The name of the file.
+        :return: The text.
+        """
+        with open(file_name, encoding="utf-8", errors="replace") as file:
+            return file.read()
+
+    def _submit_text(self, executor: ProcessPoolExecutor, processor: PubMedTextProcessor,
+                     text: str) -> tuple[ProcessPoolExecutor, Future]:
+        """
+        Submits the post-processing of a text, replacing the executor if its worker processes died.
+        :param executor: The executor.
+        :param processor: The text processor, creating the executors.
+        :param text: The text.
+        :return: Tuple of the (possibly new) executor and the future of the processing.
+        """
+        try:
+            return executor, executor.submit(process_document, text, processor.chunk_size, processor.chunk_overlap)
+        except BrokenProcessPool:
+            print("The post-processing workers stopped. Restarting them.")
+            executor.shutdown(wait=False)
+            executor = processor.create_executor()
+
+            return executor, executor.submit(process_document, text, processor.chunk_size, processor.chunk_overlap)
+
+    def _write_processed_texts(self, pending_texts: deque, text_shards: Optional[PubMedShardWriter],
+                               maximum_pending: int, complete_article: Callable[[str, PubMedPublication, list], None]):
+        """
+        Writes the texts whose post-processing has finished, in submission order, waiting for the oldest ones
+        while more than maximum_pending are pending. A text whose post-processing failed is skipped
+        and added to the dead-letter queue.
+        :param pending_texts: Queue of tuples (future, PMC ID, publication, shard keys, file name).
+        :param text_shards: The shard writer, or None for output format "files".
+        :param maximum_pending: The number of texts which may stay pending; 0 to wait for all.
+        :param complete_article: Called with the PMC ID, the publication and the keys once the text is written.
+        :return: None.
+        """
+        while len(pending_texts) > 0 and (pending_texts[0][0].done() or len(pending_texts) > maximum_pending):
+            future, pmc_id, publication, keys, file_name = pending_texts.popleft()
+
+            try:
+                cleaned_text, chunks = future.result()
+            except Exception as exception:
+                error = f"{type(exception).__name__}: {exception}"
+                print(f"Post-processing of {pmc_id} failed ({error}). Skipping.")
+                self.dead_letter_queue.add(publication.publication_id, STAGE_PROCESS, f"{pmc_id}: {error}")
+                continue
+
+            if text_shards is None:
+                write_document(file_name, cleaned_text, chunks)
+            else:
+                record = self._to_record(pmc_id, publication, cleaned_text)
+                record["chunks"] = chunks
+                text_shards.write(record, keys)
+
+            complete_article(pmc_id, publication, keys)
+
+    def _to_record(self, pmc_id: str, publication: PubMedPublication, text: str) -> dict:
+        """
+        Creates the shard record of a text.
+        :param pmc_id: The PMC ID of the article.
+        :param publication: The publication.
+        :param text: The text (full text or abstract).
+        :return: The record.
+        """
+        return {"PMCID": pmc_id, "PMID": publication.publication_id, "text": text}
     # endregion
 
 if __name__ == '__main__':
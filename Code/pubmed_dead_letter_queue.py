@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from typing import Iterator, Optional
+
+# Stages at which a record can fail.
+STAGE_FETCH = "fetch"           # efetch failed for the PMID, even alone.
+STAGE_MISSING = "missing"       # efetch answered, but without the requested PMID.
+STAGE_PARSE = "parse"           # The PubmedArticle could not be extracted.
+STAGE_LINK = "link"             # elink failed for the portion of the PMID (see PubMedCitationGraph).
+STAGE_PROCESS = "process"       # The post-processing of the full text failed (see PubMedCorpusCreator).
+
+
+class PubMedDeadLetterQueue:
+    """
+    Collects the records which could not be fetched or extracted, so that a run keeps going and the failures
+    can be inspected and retried later (see PubMedFetcher.iterate_by_ids()).
+    If a file is given, every entry is appended to it as a JSON line:
+    {"PMID": ..., "stage": "fetch" | "missing" | "parse" | "link" | "process", "error": ..., "time": ..., "xml": ...}.
+    The file is opened for each entry only, so that it is complete even after a crash.
+    """
+    def __init__(self, file_name: Optional[str] = None):
+        """
+        Creates a queue.
+        :param file_name: The JSON lines file to append the entries to. If None, the entries are kept in memory only.
+        """
+        self.file_name = file_name
+        self.entries: list[dict] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, pmid: int, stage: str, error: str, xml: str = ""):
+        """
+        Adds an entry.
+        :param pmid: The PMID of the record (0 if unknown).
+        :param stage: The stage at which the record failed (STAGE_FETCH, STAGE_MISSING, STAGE_PARSE, STAGE_LINK,
+                      STAGE_PROCESS).
+        :param error: The description of the error.
+        :param xml: The XML of the record, if it was received.
+        :return: None.
+        """
+        entry = {"PMID": pmid, "stage": stage, "error": error, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if len(xml) > 0:
+            entry["xml"] = xml
+
+        with self._lock:
+            self.entries.append(entry)
+
+            if self.file_name is not None:
+                with open(self.file_name, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def read(cls, file_name: str) -> Iterator[dict]:
+        """
+        Reads the entries of a dead-letter file.
+        :param file_name: The file.
+        :return: Iterator over the entries.
+        """
+        with open(file_name, encoding="utf-8") as file:
+            for line in file:
+                if len(line.strip()) > 0:
+                    yield json.loads(line)
+
+    @classmethod
+    def read_pmids(cls, file_name: str) -> list[int]:
+        """
+        Reads the distinct PMIDs of a dead-letter file, e.g. to retry them.
+        :param file_name: The file.
+        :return: The PMIDs, in the order of their first entries.
+        """
+        return list(dict.fromkeys(entry["PMID"] for entry in cls.read(file_name) if entry["PMID"] > 0))
@@ -1,21 +1,74 @@
-from typing import Optional
+import hashlib
+import threading
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Union
 
-import requests
 import xml.etree.ElementTree as ET
 
+from pubmed_batch_sizer import PubMedBatchSizer
+from pubmed_dead_letter_queue import PubMedDeadLetterQueue, STAGE_FETCH, STAGE_MISSING, STAGE_PARSE
+from pubmed_partitioning import PubMedPartition
 from pubmed_publication import PubMedPublication
+from pubmed_publication_date import PubMedPublicationDate
+from pubmed_query import PubMedQuery
 from pubmed_author import PubMedAuthor
+from pubmed_author_registry import PubMedAuthorRegistry
 from pubmed_reference import PubMedReference
 
 import xml_tools
 
 # region Constants
-NCBI_SEARCH_REQUEST_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pubmed"   # default URL base to query for publication IDs.
-NCBI_FETCH_REQUEST_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed"     # default URL base to fetch the publication infos.
-NUMBER_OF_IDS_IN_PARTIAL_REQUEST = 1000                                                             # Number of IDs in a partial request for IDs.
-DEFAULT_SIZE_OF_EXTRACTION_PORTION = 200                                                            # Default number of entries in an extraction portion.
+NCBI_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"                      # esearch endpoint.
+NCBI_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"                        # efetch endpoint.
+MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS = 9999                                                            # esearch returns the IDs of a search up to retstart 9998 only.
+DEFAULT_SIZE_OF_EXTRACTION_PORTION = 200                                                            # Initial number of entries in an extraction portion.
+MAXIMUM_SIZE_OF_EXTRACTION_PORTION = 10000                                                          # Maximum number of entries efetch accepts per request.
+MAXIMUM_IDS_IN_GET_REQUEST = 200                                                                    # Above this number of IDs, efetch is called by POST (NCBI recommendation).
+MAXIMUM_NUMBER_OF_FAILED_REQUESTS = 5                                                               # Failed requests in a row before giving up on a portion.
+MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES = 8                                                            # Transient failures (no connection, 429, 5xx) in a row before giving up.
+RETRY_BACKOFF_SECONDS = 1.0                                                                         # Wait before the first retry of a failed request; doubled for every further one.
+MAXIMUM_BACKOFF_SECONDS = 60.0                                                                      # Maximum wait before a retry.
+PUBMED_HISTORY_STATUS_ORDER = {"pubmed": 0, "entrez": 1, "medline": 2}                              # Preferred history dates, if PubDate holds no year.
 # endregion
 
+class RateLimiter:
+    """
+    Spaces requests evenly so that no more than a given number of requests per second is sent,
+    also by several threads (see AsyncRateLimiter for asyncio). Usage: 'with limiter: ...'.
+    """
+    def __init__(self, requests_per_second: float):
+        """
+        Creates an instance of RateLimiter.
+        :param requests_per_second: The maximum number of requests per second.
+        """
+        self._interval = 1.0 / requests_per_second
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Waits until the next request may be sent.
+        :return: None.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
 class PubMedFetcher:
     """
     Holds functionality to fetch PubMed publications by topics.
@@ -23,91 +76,333 @@ class PubMedFetcher:
     # region Class variables
     print_intermediate_results = True           # If set to True (default), all intermediate results will be printed.
     extract_references = True                   # If set to True (default, references will be extracted):
+    number_of_concurrent_searches = 3           # Number of esearch requests run in parallel by fetch_by_queries()
+                                                # (NCBI allows 3 requests per second without an API key).
+    deduplicate_authors = True                  # If set to True (default), authors get local IDs from the author
+                                                # registry, and the same author instance is shared by publications.
+    dead_letter_file: Optional[str] = None      # If set, the records which cannot be fetched or extracted are
+                                                # appended to this JSON lines file (see PubMedDeadLetterQueue).
+    requests_per_second = 3                     # Maximum rate of the requests of a fetcher (NCBI allows 3 requests
+                                                # per second without an API key, 10 with one).
     # endregion
 
+    def __init__(self):
+        """
+        Initialization of the adaptive batch sizer for efetch requests, of the author registry,
+        of the list of deleted PMIDs, of the list of truncated searches, of the dead-letter queue and of the rate limiter.
+        """
+        self.batch_sizer = PubMedBatchSizer(DEFAULT_SIZE_OF_EXTRACTION_PORTION,
+                                            maximum_size=MAXIMUM_SIZE_OF_EXTRACTION_PORTION)
+        self.author_registry = PubMedAuthorRegistry()
+        self.deleted_publication_ids: list[int] = []    # PMIDs of DeleteCitation elements read by iterate_from_files().
+        self.truncated_searches: list[tuple[str, date, int]] = []   # (term, day, count), see _split_date_range().
+        self.dead_letter_queue = PubMedDeadLetterQueue(PubMedFetcher.dead_letter_file)
+        self._rate_limiter = RateLimiter(PubMedFetcher.requests_per_second)
+
     # region Public features
-    def fetch_by_topics(self, topics: list[str], from_year: int = 1800) -> list[PubMedPublication]:
+    def fetch_by_topics(self, topics: list[str], from_year: int = 1800,
+                        partition: Optional[PubMedPartition] = None) -> list[PubMedPublication]:
         """
-        Fetches publications by topic list. At the moment, only the 'AND' combination of topics is supported.
-        TODO: support the 'OR' combination of topics.
+        Fetches publications by topic list. The topics are combined by 'AND';
+        for 'OR', 'NOT' and field tags, use fetch_by_queries().
+        esearch returns at most MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS IDs of a single publication day; if a day holds more,
+        the others are skipped and (term, day, count) is appended to truncated_searches.
         :param topics: List of topics.
         :param from_year: Minimum year from which to start. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched.
         :return: List of publications found.
         """
-        ids = self._extract_ids_by_topics(topics)
+        ids = self.search_by_topics(topics, from_year, partition)
+
+        return self._extract_publications(ids)
+
+    def iterate_by_topics(self, topics: list[str], from_year: int = 1800,
+                          partition: Optional[PubMedPartition] = None) -> Iterator[PubMedPublication]:
+        """
+        Iterates over the publications of a topic list (combined by 'AND'), fetching them portion by portion,
+        so that large result sets can be processed without holding them in memory.
+        See fetch_by_topics() for days holding more IDs than esearch returns.
+        :param topics: List of topics.
+        :param from_year: Minimum year from which to start. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched.
+        :return: Iterator over the publications found.
+        """
+        ids = self.search_by_topics(topics, from_year, partition)
+
+        return self._iterate_publications(ids)
+
+    def search_by_topics(self, topics: list[str], from_year: int = 1800,
+                         partition: Optional[PubMedPartition] = None) -> list[int]:
+        """
+        Searches the PMIDs of a topic list (combined by 'AND') without fetching the publications,
+        e.g. to fill a PubMedWorkQueue. See fetch_by_topics() for days holding more IDs than esearch returns.
+        :param topics: List of topics.
+        :param from_year: Minimum year of publication. Default: 1800, that is, hopefully, all stuff.
+        :param partition: If given, only the PMIDs of this shard are returned.
+        :return: List of PMIDs found.
+        """
+        ids = [int(id) for id in self._extract_ids_by_topics(topics, from_year)]
+
+        return ids if partition is None else partition.select(ids)
+
+    def iterate_by_ids(self, pubmed_ids: Iterable[int]) -> Iterator[PubMedPublication]:
+        """
+        Iterates over the publications of a list of PMIDs, e.g. to retry the entries of a dead-letter file
+        (PubMedDeadLetterQueue.read_pmids()).
+        :param pubmed_ids: The PMIDs.
+        :return: Iterator over the publications fetched.
+        """
+        return self._iterate_publications([int(id) for id in pubmed_ids])
+
+    def iterate_from_files(self, file_names: Iterable[str],
+                           partition: Optional[PubMedPartition] = None) -> Iterator[PubMedPublication]:
+        """
+        Iterates over the publications of local PubMed XML files, e.g. the annual baseline and the daily updates
+        (pubmed24n0001.xml.gz). The files are parsed incrementally, so that their size does not matter.
+        The PMIDs of deleted records (DeleteCitation of update files) are added to deleted_publication_ids.
+        :param file_names: The names of the files (.xml, or .xml.gz for gzip compressed ones).
+        :param partition: If given, only the files of this shard are read (whole files are partitioned by name).
+        :return: Iterator over the publications of the files.
+        """
+        import gzip
+
+        if partition is not None:
+            file_names = partition.select_files(file_names)
+
+        for file_name in file_names:
+            opener = gzip.open if file_name.endswith(".gz") else open
 
-        return self._extract_publications_by_id_list(ids)
+            with opener(file_name, "rb") as file:
+                x_root = None
+
+                for event, x_element in ET.iterparse(file, events=("start", "end")):
+                    if x_root is None:
+                        x_root = x_element
+                    elif event == "end" and x_element.tag == "PubmedArticle":
+                        publication = self._extract_publication_isolated(x_element)
+
+                        # Release the parsed article to keep the memory constant.
+                        x_root.clear()
+
+                        if publication is not None and publication.publication_id > 0:
+                            yield publication
+                    elif event == "end" and x_element.tag == "DeleteCitation":
+                        # Update files list the PMIDs of withdrawn records.
+                        for x_pmid in x_element.findall("PMID"):
+                            self.deleted_publication_ids.append(int(x_pmid.text))
+
+    def fetch_by_queries(self, queries: list[Union[str, PubMedQuery]], evaluate_locally: bool = False,
+                         partition: Optional[PubMedPartition] = None) -> dict[str, list[PubMedPublication]]:
+        """
+        Fetches publications for a batch of boolean queries, e.g. ['dicom AND mri[tiab]', '(pacs OR ris) NOT review[pt]'].
+        The searches run concurrently, and every publication found by several queries is fetched only once:
+        the lists of the result share the same PubMedPublication instances.
+        :param queries: List of query expressions (strings or instances of PubMedQuery).
+        :param evaluate_locally: If set to False (default), every distinct query is evaluated by esearch.
+                                 If set to True, every distinct term is searched once and the queries are evaluated
+                                 locally with set algebra, which saves requests for overlapping queries.
+        :param partition: If given, only the publications of this shard of the PMIDs found are fetched,
+                          and the lists of the result hold them only.
+        :return: Dictionary with the query expressions as keys and the lists of the publications found as values.
+        """
+        parsed_queries, terms = self._plan_queries(queries, evaluate_locally)
+
+        with ThreadPoolExecutor(max_workers=PubMedFetcher.number_of_concurrent_searches) as executor:
+            id_lists = list(executor.map(self._extract_ids_by_term, terms))
+
+        ids_by_query, unique_ids = self._combine_query_ids(parsed_queries, terms, id_lists, evaluate_locally, partition)
+        publications = {publication.publication_id: publication
+                        for publication in self._extract_publications(unique_ids)}
+
+        return {expression: [publications[id] for id in ids if id in publications]
+                for expression, ids in ids_by_query.items()}
     # endregion
 
     # region Protected Auxiliary
-    def _extract_ids_by_topics(self, topics: list[str]) -> list[int]:
+    def _plan_queries(self, queries: list[Union[str, PubMedQuery]],
+                      evaluate_locally: bool) -> tuple[list[PubMedQuery], list[str]]:
+        """
+        Parses a batch of queries and determines the esearch terms to run.
+        :param queries: List of query expressions (strings or instances of PubMedQuery).
+        :param evaluate_locally: If set to True, the distinct terms of the queries are searched,
+                                 otherwise the distinct canonical queries.
+        :return: Tuple of the parsed queries and the sorted terms.
+        """
+        parsed_queries = [query if isinstance(query, PubMedQuery) else PubMedQuery(query) for query in queries]
+
+        if evaluate_locally:
+            terms = set().union(*[query.terms() for query in parsed_queries])
+        else:
+            terms = {query.canonical() for query in parsed_queries}
+
+        return parsed_queries, sorted(terms)
+
+    def _combine_query_ids(self, parsed_queries: list[PubMedQuery], terms: list[str], id_lists: list[list],
+                           evaluate_locally: bool,
+                           partition: Optional[PubMedPartition]) -> tuple[dict[str, list[int]], list[int]]:
+        """
+        Computes the IDs of every query from the IDs found for the terms.
+        :param parsed_queries: The parsed queries.
+        :param terms: The terms searched.
+        :param id_lists: The IDs found for the terms, in the order of the terms.
+        :param evaluate_locally: If set to True, the queries are evaluated with set algebra over the term IDs.
+        :param partition: If given, only the IDs of this shard are to be fetched.
+        :return: Tuple of the IDs by query expression and the distinct IDs to fetch.
+        """
+        ids_by_term = {term: [int(id) for id in ids] for term, ids in zip(terms, id_lists)}
+
+        id_sets_by_term = {term: set(ids) for term, ids in ids_by_term.items()} if evaluate_locally else {}
+
+        ids_by_query = {}
+        for query in parsed_queries:
+            if evaluate_locally:
+                ids = query.evaluate(id_sets_by_term)
+                ids_by_query[query.expression] = sorted(ids, reverse=True)
+            else:
+                ids_by_query[query.expression] = ids_by_term[query.canonical()]
+
+        unique_ids = sorted(set().union(*ids_by_query.values()), reverse=True)
+        if partition is not None:
+            unique_ids = partition.select(unique_ids)
+
+        return ids_by_query, unique_ids
+
+    def _extract_ids_by_topics(self, topics: list[str], from_year: int = 1800) -> list[str]:
         """
-        Retrieves PubMed IDs for a list of search topics.
+        Retrieves PubMed IDs for a list of search topics, combined by 'AND' (see PubMedQuery.from_topics()).
         :param topics: A list of topics to find IDs for.
+        :param from_year: Minimum year of publication.
         :return: List of PubMed IDs found.
         """
-        result = []
-        total_number_of_ids = self._get_count_of_topic_findings(topics)
+        return self._extract_ids_by_term(PubMedQuery.from_topics(topics).canonical(), from_year)
 
-        if total_number_of_ids <= 0:
-            return result
+    def _extract_ids_by_term(self, term: str, from_year: int = 1800) -> list[str]:
+        """
+        Retrieves PubMed IDs for an esearch term. esearch returns at most MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS IDs
+        of a search (it rejects a retstart beyond), so larger results are split into publication date ranges,
+        halved until the IDs of every range can be retrieved by a single request. The IDs of a single day beyond
+        the maximum are skipped and recorded in truncated_searches.
+        :param term: The search term, e.g. 'dicom mri' or '(dicom OR pacs) NOT review[pt]'.
+        :param from_year: Minimum year of publication.
+        :return: List of PubMed IDs found, the latest date ranges first.
+        """
+        result = []
+        date_ranges = [self._get_date_range(from_year)]
 
-        count_ids_downloaded = 0
-        start_index = 0
+        while len(date_ranges) > 0:
+            date_range = date_ranges.pop()
+            params = self._get_search_parameters(term, date_range)
+            count, ids_portion = self._search_with_retries(params, self._parse_search)
 
-        while count_ids_downloaded < total_number_of_ids:
-            ids_portion = self._download_portion_of_topic_ids \
-                    (
-                        topics,
-                        start_index,
-                        NUMBER_OF_IDS_IN_PARTIAL_REQUEST
-                    )
-            if PubMedFetcher.print_intermediate_results:
-                print(f"Extracted {len(ids_portion)} topic IDs out of {total_number_of_ids}")
+            halves = self._split_date_range(term, date_range, count)
+            if halves is not None:
+                date_ranges += halves
+                continue
 
             result += ids_portion
-            count_ids_downloaded += len(ids_portion)
-            start_index = len(result)
+            if PubMedFetcher.print_intermediate_results:
+                print(f"Extracted {len(ids_portion)} topic IDs up to {date_range[1]} ({len(result)} in total)")
 
         return result
 
-    def _get_count_of_topic_findings(self, topics: list[str]) -> int:
+    def _get_date_range(self, from_year: int) -> tuple[date, date]:
         """
-        Gets the count of findings for a list of search topics.
-        :param topics: The search topics.
-        :return: The number of IDs corresponding to the pattern.
+        :param from_year: Minimum year of publication.
+        :return: The range of publication dates searched: from the year on until the end of the next year.
         """
-        request_url = f"{NCBI_SEARCH_REQUEST_BASE}&rettype=count&term={'+'.join(topics)}"
+        return date(from_year, 1, 1), date(date.today().year + 1, 12, 31)
 
-        # TODO: can be changed?
-        try:
-            request = requests.request("get", request_url)
-            response = request.text
-            tree = ET.fromstring(response)
-            x_count = tree.find('Count')
-            return int(x_count.text)
-        except:
-            return 0
-
-    def _download_portion_of_topic_ids(self, topics: list[str], start_index: int, number_of_entries: int) -> list[str]:
-        """
-        Downloads a portion of size number_of_entries from a PubMed IDs from an ID list, starting from the index start_index.
-        The REST API does not allow to download all IDs at once, but is rather limited to a maximum number od IDs per step (100000).
-        :param topics: The list of search topics.
-        :param start_index: The index to start from.
-        :param number_of_entries: The number of indices to download.
-        :return: The list of Pubmed IDs for the portion.
-        """
-        result = list[str]()
-        search_url = f"{NCBI_SEARCH_REQUEST_BASE}&retmax={number_of_entries}&retstart={start_index}&term={'+'.join(topics)}"
-        request = requests.request("get", search_url)
-        response = request.text
+    def _get_search_parameters(self, term: str, date_range: tuple[date, date]) -> dict:
+        """
+        :param term: The search term.
+        :param date_range: The first and the last publication date to search.
+        :return: The parameters of the esearch request for all IDs of the term in the date range.
+        """
+        return {"db": "pubmed", "retmax": MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS, "term": term, "datetype": "pdat",
+                "mindate": date_range[0].strftime("%Y/%m/%d"), "maxdate": date_range[1].strftime("%Y/%m/%d")}
+
+    def _split_date_range(self, term: str, date_range: tuple[date, date],
+                          count: int) -> Optional[list[tuple[date, date]]]:
+        """
+        Splits a date range whose IDs cannot be retrieved by a single request. A single day cannot be split:
+        its IDs beyond MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS are skipped, and (term, day, count) is appended
+        to truncated_searches.
+        :param term: The search term.
+        :param date_range: The first and the last publication date searched.
+        :param count: The number of IDs found in the date range.
+        :return: The earlier and the later half of the range, or None if the IDs are to be taken as they are.
+        """
+        if count <= MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS:
+            return None
+
+        first, last = date_range
+        if first == last:
+            print(f"{count} IDs found for '{term}' on {first}, but esearch returns {MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS} "
+                  f"of a search only; the others are skipped.")
+            self.truncated_searches.append((term, first, count))
+            return None
+
+        middle = first + (last - first) // 2
+
+        return [(first, middle), (middle + timedelta(days=1), last)]
+
+    def _search_with_retries(self, params: dict, parse):
+        """
+        Sends an esearch request and parses the response, see _send_with_retries().
+        :param params: The parameters of the request.
+        :param parse: The function parsing the text of the response.
+        :return: The result of the parse function.
+        :raises ValueError: If all MAXIMUM_NUMBER_OF_FAILED_REQUESTS attempts failed.
+        """
+        return self._send_with_retries("get", NCBI_SEARCH_URL, parse, params=params)
+
+    def _send_with_retries(self, method: str, url: str, parse, **kwargs):
+        """
+        Sends a (small) E-utilities request and parses the response. Network errors, error statuses and unparseable
+        responses (e.g. HTML error pages) are retried, waiting RETRY_BACKOFF_SECONDS, doubled for every further retry.
+        :param method: "get" or "post".
+        :param url: The URL of the E-utility, e.g. NCBI_SEARCH_URL.
+        :param parse: The function parsing the text of the response.
+        :param kwargs: Further arguments of requests.request(), e.g. params or data.
+        :return: The result of the parse function.
+        :raises ValueError: If all MAXIMUM_NUMBER_OF_FAILED_REQUESTS attempts failed.
+        """
+        import requests
+
+        utility = url.rsplit("/", 1)[-1].split(".")[0]
+        error = ""
+        for attempt in range(MAXIMUM_NUMBER_OF_FAILED_REQUESTS):
+            if attempt > 0:
+                if PubMedFetcher.print_intermediate_results:
+                    print(f"{utility} failed ({error}); retrying")
+                time.sleep(self._backoff_seconds(attempt))
+
+            try:
+                request = self._send(method, url, **kwargs)
+                if request.status_code != 200:
+                    error = f"STATUS_{request.status_code}"
+                    continue
+
+                return parse(request.text)
+            except (requests.RequestException, ET.ParseError, ValueError) as exception:
+                error = f"{type(exception).__name__}: {exception}"
+
+        raise ValueError(f"{utility} failed {MAXIMUM_NUMBER_OF_FAILED_REQUESTS} times: {error}")
+
+    def _parse_search(self, response: str) -> tuple[int, list[str]]:
+        """
+        Parses the count of findings and the list of IDs from an esearch response.
+        :param response: The text of the esearch response.
+        :return: Tuple of the number of IDs found and the list of the PubMed IDs returned.
+        """
         tree = ET.fromstring(response)
+        x_count = tree.find('Count')
         x_id_list = tree.find('IdList')
-        for xId in x_id_list.findall('Id'):
-            result.append(xId.text)
 
-        return result
+        if x_count is None or x_id_list is None:
+            raise ValueError(f"No ID list in esearch response: {xml_tools.XValues.element_string(tree, 'ERROR')}")
+
+        return int(x_count.text), [x_id.text for x_id in x_id_list.findall('Id')]
 
     def _extract_publications(self, pubmed_ids: list[int]) -> list[PubMedPublication]:
         """
@@ -115,52 +410,274 @@ class PubMedFetcher:
         :param pubmed_ids: List of PubMed IDs to extract.
         :return: Resulting list of successfully extracted publications.
         """
+        return list(self._iterate_publications(pubmed_ids))
+
+    def _iterate_publications(self, pubmed_ids: list[int]) -> Iterator[PubMedPublication]:
+        """
+        Extracts publications by their PubMed IDs, yielding them portion by portion.
+        The IDs are fetched in portions whose size is adapted to the latency and the size of the responses.
+        Transient errors (no connection, 429, 5xx) are retried after an exponential backoff (see _fetch_with_backoff()).
+        Other failures (4xx, unparseable responses) are retried smaller; a portion failing
+        MAXIMUM_NUMBER_OF_FAILED_REQUESTS times in a row is bisected down to single IDs, and the IDs which still fail
+        go to the dead-letter queue, while the run goes on.
+        :param pubmed_ids: List of PubMed IDs to extract.
+        :return: Iterator over the successfully extracted publications.
+        :raises ValueError: If transient errors persist.
+        """
+        start_index = 0
+        number_of_failed_requests = 0
+
+        while start_index < len(pubmed_ids):
+            ids_to_process = pubmed_ids[start_index: start_index + self.batch_sizer.size]
+
+            publications, error, latency, response_size = self._fetch_with_backoff(ids_to_process)
+
+            if publications is None:
+                number_of_failed_requests += 1
+                self.batch_sizer.record_failure()
+
+                if number_of_failed_requests < MAXIMUM_NUMBER_OF_FAILED_REQUESTS:
+                    if PubMedFetcher.print_intermediate_results:
+                        print(f"Request failed ({error}); retrying with {self.batch_sizer.size} IDs per portion")
+                    continue
+
+                publications = self._isolate_failures(ids_to_process, error)
+            else:
+                self.batch_sizer.record_success(len(ids_to_process), latency, response_size)
+
+            number_of_failed_requests = 0
+            start_index += len(ids_to_process)
+
+            yield from publications
+
+    def _fetch_with_backoff(self, pubmed_ids: list[int]) -> tuple[Optional[list[PubMedPublication]], str, float, int]:
+        """
+        Fetches and parses a portion of publications; transient errors are retried with the same portion after
+        waiting RETRY_BACKOFF_SECONDS, doubled for every further retry (at most MAXIMUM_BACKOFF_SECONDS).
+        Transient errors are never bisected, which would only send more requests to an overloaded server.
+        :param pubmed_ids: The PubMed IDs.
+        :return: Tuple of the publications (None after a non-transient failure), the error, the latency and
+                 the size of the response of the last attempt.
+        :raises ValueError: If MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES attempts in a row failed transiently.
+        """
+        error = ""
+
+        for attempt in range(1, MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES + 1):
+            started = time.perf_counter()
+            publications, error, status_code, response_size = self._try_to_fetch(pubmed_ids)
+            latency = time.perf_counter() - started
+
+            if publications is not None or not self._is_transient(status_code):
+                return publications, error, latency, response_size
+
+            if attempt < MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES:
+                if PubMedFetcher.print_intermediate_results:
+                    print(f"Request failed ({error}); waiting {self._backoff_seconds(attempt)} s")
+                time.sleep(self._backoff_seconds(attempt))
+
+        raise ValueError(f"efetch failed {MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES} times in a row: {error}")
+
+    def _try_to_fetch(self, pubmed_ids: list[int]) -> tuple[Optional[list[PubMedPublication]], str, int, int]:
+        """
+        Fetches and parses a portion of publications once.
+        :param pubmed_ids: The PubMed IDs.
+        :return: Tuple of the publications (None if the request failed), the error, the status code
+                 (0 if the server could not be reached) and the size of the response.
+        """
+        import requests
+
+        try:
+            request = self._download_publications(pubmed_ids)
+        except requests.RequestException as exception:
+            return None, f"{type(exception).__name__}: {exception}", 0, 0
+
+        if request.status_code != 200:
+            return None, f"STATUS_{request.status_code}", request.status_code, len(request.content)
+
+        try:
+            return self._parse_publications(request.text, pubmed_ids), "", 200, len(request.content)
+        except ET.ParseError as exception:
+            return None, f"Unparseable response: {exception}", 200, len(request.content)
+
+    def _isolate_failures(self, pubmed_ids: list[int], error: str) -> list[PubMedPublication]:
+        """
+        Isolates the IDs of a failing portion by bisection: both halves are fetched on their own,
+        failing halves are bisected further, and single IDs which fail go to the dead-letter queue.
+        Only non-transient failures are bisected; transient ones are retried by _fetch_with_backoff().
+        :param pubmed_ids: The PubMed IDs of the failing portion.
+        :param error: The error of the portion.
+        :return: The publications which could be fetched.
+        :raises ValueError: If transient errors persist.
+        """
+        if len(pubmed_ids) == 1:
+            self.dead_letter_queue.add(int(pubmed_ids[0]), STAGE_FETCH, error)
+            return []
+
         result = []
+        middle = len(pubmed_ids) // 2
+
+        for half in (pubmed_ids[:middle], pubmed_ids[middle:]):
+            publications, error, _, _ = self._fetch_with_backoff(half)
 
-        for start_index in range(0, len(pubmed_ids), DEFAULT_SIZE_OF_EXTRACTION_PORTION):
-            ids_to_process = pubmed_ids[start_index: start_index + DEFAULT_SIZE_OF_EXTRACTION_PORTION]
-            portion = self._extract_publications_by_id_list(ids_to_process)
-            result += portion
+            if publications is None:
+                publications = self._isolate_failures(half, error)
+
+            result += publications
 
         return result
 
-    def _extract_publications_by_id_list(self, pubmed_ids: list[int]) -> list[PubMedPublication]:
+    def _backoff_seconds(self, attempt: int) -> float:
         """
-        Extracts a number of publications for a list of PubMed IDs.
-        :param pubmed_ids: The list of PubMed IDs to extract.
-        :return: The resulting list of publications extracted.
+        :param attempt: The number of the failed attempt (1 for the first).
+        :return: The time to wait before the next attempt.
         """
-        result = []
+        return min(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1), MAXIMUM_BACKOFF_SECONDS)
 
-        id_strings = [str(id) for id in pubmed_ids]
-        fetch_url = f"{NCBI_FETCH_REQUEST_BASE}&retmode=xml&id={','.join(id_strings)}"
+    def _is_transient(self, status_code: int) -> bool:
+        """
+        :param status_code: The status code of a failed request (0 if the server could not be reached).
+        :return: True for errors which may go away by waiting: no connection, 429 (too many requests) and 5xx.
+        """
+        return status_code == 0 or status_code == 429 or status_code >= 500
 
-        request = requests.request("get", fetch_url)
+    def _download_publications(self, pubmed_ids: list[int]) -> "requests.Response":
+        """
+        Sends the efetch request for a list of PubMed IDs.
+        Large ID lists are sent by POST, since they would not fit into a URL.
+        :param pubmed_ids: The list of PubMed IDs to fetch.
+        :return: The response of the server.
+        """
+        data = {"db": "pubmed", "retmode": "xml", "id": ",".join(str(id) for id in pubmed_ids)}
 
-        if request.status_code == 414:
-            raise ValueError("STATUS_URI_TOO_LONG")
+        if len(pubmed_ids) > MAXIMUM_IDS_IN_GET_REQUEST:
+            return self._send("post", NCBI_FETCH_URL, data=data)
 
-        response = request.text
+        return self._send("get", NCBI_FETCH_URL, params=data)
 
-        tree = ET.fromstring(response)
+    def _send(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """
+        Sends a request to the E-utilities, waiting for the rate limiter first.
+        :param method: "get" or "post".
+        :param url: The URL.
+        :param kwargs: Further arguments of requests.request(), e.g. params or data.
+        :return: The response of the server.
+        """
+        import requests
+
+        with self._rate_limiter:
+            return requests.request(method, url, **kwargs)
+
+    def _parse_publications(self, response: str, pubmed_ids: list[int]) -> list[PubMedPublication]:
+        """
+        Parses the publications from an efetch response. Articles which cannot be extracted, and requested IDs
+        missing in the response, go to the dead-letter queue.
+        :param response: The text of the efetch response (PubmedArticleSet XML).
+        :param pubmed_ids: The IDs requested.
+        :return: The resulting list of publications extracted.
+        :raises ET.ParseError: If the response is no XML.
+        """
+        publications, failures = self._parse_articles(ET.fromstring(response), pubmed_ids,
+                                                      PubMedFetcher.extract_references)
+
+        return self._register_parsed(publications, failures, len(pubmed_ids))
+
+    def _parse_articles(self, tree: ET.Element, pubmed_ids: list[int],
+                        extract_references: bool) -> tuple[list[PubMedPublication], list[tuple[int, str, str, str]]]:
+        """
+        Extracts the publications of a parsed efetch response without changing the state of the fetcher:
+        the authors are not registered, and the failures are returned instead of going to the dead-letter queue.
+        :param tree: The PubmedArticleSet element.
+        :param pubmed_ids: The IDs requested.
+        :param extract_references: If set to True, the article IDs and the references are extracted.
+        :return: Tuple of the publications and the failures: tuples of PMID, stage, error and XML.
+        """
+        publications = []
+        failures = []
 
-        count = 1
         for x_pubmed_article in tree.findall('PubmedArticle'):
-            publication = self._extract_publication(x_pubmed_article)
+            publication, failure = self._try_to_extract(x_pubmed_article, extract_references)
 
-            if publication is not None:
-                result.append(publication)
+            if failure is not None:
+                failures.append(failure)
+            elif publication is not None:
+                publications.append(publication)
 
-                if PubMedFetcher.print_intermediate_results:
-                    print(f"Extracted {count} publications out of {len(pubmed_ids)}")
-                    count += 1
+        # PMIDs of PubmedArticle/MedlineCitation and PubmedBookArticle/BookDocument.
+        received_ids = {int(x_pmid.text) for x_pmid in tree.iterfind("*/*/PMID") if (x_pmid.text or "").isdigit()}
+        for id in pubmed_ids:
+            if int(id) not in received_ids:
+                failures.append((int(id), STAGE_MISSING, "Not in the efetch response", ""))
 
-        return result
+        return publications, failures
+
+    def _register_parsed(self, publications: list[PubMedPublication], failures: list[tuple[int, str, str, str]],
+                         number_of_ids: int) -> list[PubMedPublication]:
+        """
+        Registers the authors of parsed publications and adds the failures to the dead-letter queue.
+        :param publications: The publications, as returned by _parse_articles().
+        :param failures: The failures, as returned by _parse_articles().
+        :param number_of_ids: The number of IDs requested.
+        :return: The publications.
+        """
+        for failure in failures:
+            self.dead_letter_queue.add(*failure)
+
+        for count, publication in enumerate(publications, 1):
+            self._register_authors(publication)
+
+            if PubMedFetcher.print_intermediate_results:
+                print(f"Extracted {count} publications out of {number_of_ids}")
+
+        return publications
 
-    def _extract_publication(self, x_pubmed_article: ET.Element) -> Optional[PubMedPublication]:
+    def _register_authors(self, publication: PubMedPublication) -> PubMedPublication:
+        """
+        Replaces the authors of a publication by the registered ones, if deduplicate_authors is set.
+        :param publication: The publication.
+        :return: The publication.
+        """
+        if PubMedFetcher.deduplicate_authors:
+            publication.authors = [self.author_registry.register(author) for author in publication.authors]
+
+        return publication
+
+    def _extract_publication_isolated(self, x_pubmed_article: ET.Element) -> Optional[PubMedPublication]:
+        """
+        Extracts a publication and registers its authors; if the extraction fails, the article goes to
+        the dead-letter queue instead of interrupting the run.
+        :param x_pubmed_article: The PubmedArticle element.
+        :return: The publication, or None if the extraction failed.
+        """
+        publication, failure = self._try_to_extract(x_pubmed_article, PubMedFetcher.extract_references)
+
+        if failure is not None:
+            self.dead_letter_queue.add(*failure)
+            return None
+
+        return self._register_authors(publication)
+
+    def _try_to_extract(self, x_pubmed_article: ET.Element,
+                        extract_references: bool) -> tuple[Optional[PubMedPublication], Optional[tuple]]:
+        """
+        Extracts a publication, catching any error.
+        :param x_pubmed_article: The PubmedArticle element.
+        :param extract_references: If set to True, the article IDs and the references are extracted.
+        :return: Tuple of the publication (None on failure) and the failure (PMID, stage, error, XML) or None.
+        """
+        try:
+            return self._extract_publication(x_pubmed_article, extract_references), None
+        except Exception as exception:
+            pmid = xml_tools.XValues.element_int(x_pubmed_article, "MedlineCitation/PMID")
+            return None, (pmid, STAGE_PARSE, f"{type(exception).__name__}: {exception}",
+                          ET.tostring(x_pubmed_article, encoding="unicode"))
+
+    def _extract_publication(self, x_pubmed_article: ET.Element,
+                             extract_references: bool = True) -> Optional[PubMedPublication]:
         """
         Extracts a publication using an xml.etree.ElementTree.Element as the input.
+        The authors are not registered (see _register_authors()).
         :param x_pubmed_article: The instance of xml.etree.ElementTree.Element to extract from.
+        :param extract_references: If set to True, the article IDs and the references are extracted.
         :return: Resulting instance of Publication, if succeeded, otherwise None.
         """
         publication = PubMedPublication()
@@ -172,6 +689,8 @@ class PubMedFetcher:
         if publication.publication_id <= 0:     # extraction of PMID did not work; return invalid publication
             return publication
 
+        publication.content_hash = self._compute_content_hash(x_pubmed_article)
+
         x_article = x_medline_citation.find("Article")
         x_journal = x_article.find("Journal")
 
@@ -183,10 +702,8 @@ class PubMedFetcher:
         publication.volume = xml_tools.XValues.element_string(x_journal_issue, "Volume")
         publication.issue = xml_tools.XValues.element_string(x_journal_issue, "Issue")
 
-        x_pubdate = x_journal_issue.find("PubDate")
-        publication.publication_date.year = xml_tools.XValues.element_int(x_pubdate, "Year")
-        publication.publication_date.month = xml_tools.XValues.element_int(x_pubdate, "Month")
-        publication.publication_date.day = xml_tools.XValues.element_int(x_pubdate, "Day")
+        publication.publication_date = self._extract_publication_date(x_pubmed_article, x_article,
+                                                                      x_journal_issue.find("PubDate"))
 
         publication.journal_title = xml_tools.XValues.element_string(x_journal, "Title")
         publication.journal_title_abbreviation = xml_tools.XValues.element_string(x_journal, "ISOAbbreviation")
@@ -205,23 +722,25 @@ class PubMedFetcher:
 
         if x_abstract is not None:
             for x_abstract_text in x_abstract.findall("AbstractText"):
-                publication.abstract += f"{x_abstract_text.text}\n"
+                # itertext() keeps the text of inline markup such as <i> or <sup>.
+                label = x_abstract_text.get("Label", "")
+                text = "".join(x_abstract_text.itertext()).strip()
+                publication.abstract_sections.append((label, text))
+                publication.abstract += f"{label}: {text}\n" if len(label) > 0 else f"{text}\n"
 
         # extract authors
         x_authors = x_article.find("AuthorList")
         if x_authors is not None:
             for x_author in x_authors.findall("Author"):
                 author = PubMedAuthor()
-                # TODO: assign local author ID
-                #  author.id = ...
                 author.last_name = xml_tools.XValues.element_string(x_author, "LastName")
                 author.fore_name = xml_tools.XValues.element_string(x_author, "ForeName")
                 author.initials = xml_tools.XValues.element_string(x_author, "Initials")
 
                 for x_author_identifier in x_author.findall("Identifier"):
                     source = xml_tools.XValues.attribute_string(x_author_identifier, "Source")
-                    identifier = x_author_identifier.text
-                    author.identification[source] = identifier
+                    if len(source) > 0:
+                        author.identification[source] = x_author_identifier.text
 
                 for x_affiliation_info in x_author.findall("AffiliationInfo"):
                     affiliation = xml_tools.XValues.element_string(x_affiliation_info, "Affiliation")
@@ -240,14 +759,17 @@ class PubMedFetcher:
                 publication.keywords.append(x_keyword.text)
 
         # extract references
-        if PubMedFetcher.extract_references:
+        if extract_references:
             x_pubmed_data = x_pubmed_article.find("PubmedData")
 
             # extract article IDs (DOI, PMC, etc.)
+            # IDs without IdType are skipped (attribute_string() returns "" for a missing attribute).
             x_articel_id_list = x_pubmed_data.find("ArticleIdList")
-            for x_article_id in x_articel_id_list.findall("ArticleId"):
-                publication_id_type = xml_tools.XValues.attribute_string(x_article_id, "IdType").upper()
-                publication.article_ids[publication_id_type] = x_article_id.text
+            if x_articel_id_list is not None:
+                for x_article_id in x_articel_id_list.findall("ArticleId"):
+                    publication_id_type = xml_tools.XValues.attribute_string(x_article_id, "IdType")
+                    if len(publication_id_type) > 0:
+                        publication.article_ids[publication_id_type.upper()] = x_article_id.text
 
             x_references = x_pubmed_data.find("ReferenceList")
             if x_references is not None:
@@ -259,15 +781,89 @@ class PubMedFetcher:
 
                     if x_reference_ids is not None:
                         for x_reference_id in x_reference_ids.findall("ArticleId"):
-                            id_type = xml_tools.XValues.attribute_string(x_reference_id, "IdType").upper()
-                            reference.article_ids[id_type] = x_reference_id.text
+                            id_type = xml_tools.XValues.attribute_string(x_reference_id, "IdType")
+                            if len(id_type) > 0:
+                                reference.article_ids[id_type.upper()] = x_reference_id.text
 
                     publication.references.append(reference)
 
         return publication
+
+    def _extract_publication_date(self, x_pubmed_article: ET.Element, x_article: ET.Element,
+                                  x_pubdate: Optional[ET.Element]) -> PubMedPublicationDate:
+        """
+        Extracts the publication date: the PubDate of the journal issue (Year/Month/Day, Season or MedlineDate);
+        if it holds no year, the electronic ArticleDate, then the history dates (pubmed, entrez, first one).
+        :param x_pubmed_article: The PubmedArticle element.
+        :param x_article: The Article element.
+        :param x_pubdate: The PubDate element; may be None.
+        :return: The date; year 0 if none was found.
+        """
+        date = PubMedPublicationDate.from_xml_element(x_pubdate)
+        if date.year > 0:
+            return date
+
+        date = PubMedPublicationDate.from_xml_element(x_article.find("ArticleDate"))
+        if date.year > 0:
+            return date
+
+        x_history = x_pubmed_article.find("PubmedData/History")
+        if x_history is not None:
+            x_dates = x_history.findall("PubMedPubDate")
+            x_dates.sort(key=lambda x_date: PUBMED_HISTORY_STATUS_ORDER.get(x_date.get("PubStatus", ""),
+                                                                            len(PUBMED_HISTORY_STATUS_ORDER)))
+
+            for x_date in x_dates:
+                date = PubMedPublicationDate.from_xml_element(x_date)
+                if date.year > 0:
+                    return date
+
+        return date
+
+    def _compute_content_hash(self, x_pubmed_article: ET.Element) -> str:
+        """
+        Computes the content hash of a PubmedArticle element over its tags, attributes and texts
+        (stripped of the surrounding whitespace, so that indentation does not matter).
+        The hash changes whenever NCBI revises the record.
+        :param x_pubmed_article: The PubmedArticle element.
+        :return: The hash as a hex string.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+
+        for x_element in x_pubmed_article.iter():
+            attributes = "\x1f".join(f"{key}={value}" for key, value in sorted(x_element.attrib.items()))
+            digest.update(f"<{x_element.tag}\x1f{attributes}>{(x_element.text or '').strip()}"
+                          f"</>{(x_element.tail or '').strip()}\x1e".encode("utf-8"))
+
+        return digest.hexdigest()
     # endregion
 
 
+# region Worker functions
+def parse_publications(response: bytes, pubmed_ids: list[int], extract_references: bool = True) \
+        -> tuple[list[PubMedPublication], list[tuple[int, str, str, str]]]:
+    """
+    Parses an efetch response without any fetcher state, so that it can run in a worker thread or process
+    (see AsyncPubMedFetcher): the authors are not registered, and the failures are returned instead of going to
+    a dead-letter queue. Both are left to the calling process (PubMedFetcher._register_parsed()).
+    :param response: The body of the efetch response (PubmedArticleSet XML).
+    :param pubmed_ids: The IDs requested.
+    :param extract_references: If set to True, the article IDs and the references are extracted.
+    :return: Tuple of the publications and the failures: tuples of PMID, stage, error and XML.
+    :raises ET.ParseError: If the response is no XML.
+    """
+    return _get_parser()._parse_articles(ET.fromstring(response), pubmed_ids, extract_references)
+
+
+@lru_cache(maxsize=1)
+def _get_parser() -> PubMedFetcher:
+    """
+    :return: The fetcher of the process whose extraction methods parse_publications() uses.
+    """
+    return PubMedFetcher()
+# endregion
+
+
 if __name__ == '__main__':
     topics = ['dicom', 'prostate', 'mri']
 
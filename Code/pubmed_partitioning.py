@@ -0,0 +1,429 @@
+import csv
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import time
+import zlib
+import xml.etree.ElementTree as ET
+from typing import Callable, Iterable, Iterator, Optional
+
+from pubmed_shards import INDEX_FILE_NAME, merge_shard_folders
+from pubmed_writers import PubMedInfoWriter, PubMedXmlWriter
+
+# Methods of partitioning the PMIDs.
+PARTITION_METHODS = ["hash", "range"]
+
+# Default duration of a lease of the work queue in seconds; unfinished items of expired leases are handed out again.
+DEFAULT_LEASE_SECONDS = 600
+
+_SHARD_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+_FIBONACCI_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = (1 << 64) - 1
+
+
+class PubMedPartition:
+    """
+    Deterministic shard i of N of a job ("--shard i/N", 1 <= i <= N), so that N nodes can split a job
+    without any coordination: every node computes the same partitions.
+    * "hash" (default): a PMID belongs to the shard of its (Fibonacci) hash; independent of the ID list,
+      so it suits nodes whose searches ran at different times.
+    * "range": the sorted, distinct PMIDs of the list are split into N contiguous ranges of equal size;
+      requires the same ID list on every node.
+    Files (e.g. baseline files for bulk ingest) are partitioned by a hash of their names.
+    """
+    def __init__(self, shard: int, number_of_shards: int, method: str = "hash"):
+        """
+        Creates a partition.
+        :param shard: The number of the shard, 1 to number_of_shards.
+        :param number_of_shards: The number of shards.
+        :param method: "hash" (default) or "range".
+        """
+        if number_of_shards < 1 or not 1 <= shard <= number_of_shards:
+            raise ValueError(f"Invalid shard {shard}/{number_of_shards}")
+        if method not in PARTITION_METHODS:
+            raise ValueError(f"Unknown partition method '{method}'; use one of {PARTITION_METHODS}")
+
+        self.shard = shard
+        self.number_of_shards = number_of_shards
+        self.method = method
+
+    @classmethod
+    def parse(cls, specification: str, method: str = "hash") -> "PubMedPartition":
+        """
+        :param specification: The shard as "i/N", e.g. "2/4".
+        :param method: "hash" (default) or "range".
+        :return: The partition.
+        """
+        match = _SHARD_PATTERN.match(specification)
+        if match is None:
+            raise ValueError(f"Invalid shard '{specification}'; expected 'i/N', e.g. '2/4'")
+
+        return cls(int(match.group(1)), int(match.group(2)), method)
+
+    @property
+    def label(self) -> str:
+        """
+        The label of the shard for file names, e.g. "shard-2-of-4".
+        """
+        return f"shard-{self.shard}-of-{self.number_of_shards}"
+
+    def contains(self, pmid: int) -> bool:
+        """
+        :param pmid: The PMID.
+        :return: True if the PMID belongs to the shard (method "hash" only).
+        """
+        if self.method != "hash":
+            raise ValueError("contains() requires the partition method 'hash'; use select()")
+
+        return (((int(pmid) * _FIBONACCI_MULTIPLIER) & _MASK_64) >> 32) % self.number_of_shards == self.shard - 1
+
+    def select(self, pmids: Iterable) -> list[int]:
+        """
+        Selects the PMIDs of the shard.
+        :param pmids: The PMIDs of the whole job (int or str).
+        :return: The PMIDs of the shard, in their order (method "hash") or ascending (method "range").
+        """
+        if self.method == "hash":
+            return [int(pmid) for pmid in pmids if self.contains(pmid)]
+
+        sorted_pmids = sorted({int(pmid) for pmid in pmids})
+        start = (self.shard - 1) * len(sorted_pmids) // self.number_of_shards
+        end = self.shard * len(sorted_pmids) // self.number_of_shards
+
+        return sorted_pmids[start: end]
+
+    def select_files(self, file_names: Iterable[str]) -> list[str]:
+        """
+        Selects the files of the shard, by a hash of their base names.
+        :param file_names: The file names of the whole job.
+        :return: The file names of the shard.
+        """
+        return [file_name for file_name in file_names
+                if zlib.crc32(os.path.basename(file_name).encode("utf-8")) % self.number_of_shards == self.shard - 1]
+
+
+class PubMedWorkQueue:
+    """
+    Work queue in an SQLite database for work stealing between processes (and nodes sharing the file):
+    workers lease batches of items (PMIDs, file names), and items of expired leases, e.g. of crashed workers,
+    are handed out again. Items added twice are kept once, so every worker may add the whole job.
+    Usable as a context manager.
+    """
+    def __init__(self, database_file: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        Opens (or creates) the queue.
+        :param database_file: The SQLite database file.
+        :param lease_seconds: The duration of a lease.
+        """
+        self.lease_seconds = lease_seconds
+        self._connection = sqlite3.connect(database_file, timeout=60, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, done INTEGER NOT NULL, "
+                                 "worker TEXT, lease_until REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS items_open ON items (done, lease_until)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add(self, keys: Iterable[str]) -> int:
+        """
+        Adds items; known items are ignored.
+        :param keys: The items.
+        :return: The number of new items.
+        """
+        with self._transaction():
+            before = self._connection.total_changes
+            self._connection.executemany("INSERT OR IGNORE INTO items (key, done, worker, lease_until) "
+                                         "VALUES (?, 0, NULL, 0)", ((str(key),) for key in keys))
+            return self._connection.total_changes - before
+
+    def acquire(self, worker: str, count: int = 1) -> list[str]:
+        """
+        Leases open items: items not done, whose lease (if any) has expired.
+        :param worker: The name of the worker.
+        :param count: The maximum number of items.
+        :return: The items; empty if there are none left.
+        """
+        now = time.time()
+
+        with self._transaction():
+            keys = [row[0] for row in self._connection.execute(
+                "SELECT key FROM items WHERE done = 0 AND lease_until < ? LIMIT ?", (now, count))]
+            self._connection.executemany("UPDATE items SET worker = ?, lease_until = ? WHERE key = ?",
+                                         ((worker, now + self.lease_seconds, key) for key in keys))
+
+        return keys
+
+    def complete(self, keys: Iterable[str]):
+        """
+        Marks items as done.
+        :param keys: The items.
+        :return: None.
+        """
+        with self._transaction():
+            self._connection.executemany("UPDATE items SET done = 1 WHERE key = ?", ((str(key),) for key in keys))
+
+    def release(self, keys: Iterable[str]):
+        """
+        Ends the lease of items which were not done, so that other workers get them at once.
+        :param keys: The items.
+        :return: None.
+        """
+        with self._transaction():
+            self._connection.executemany("UPDATE items SET worker = NULL, lease_until = 0 WHERE key = ? AND done = 0",
+                                         ((str(key),) for key in keys))
+
+    def iterate(self, worker: str, batch_size: int = 1,
+                before_complete: Optional[Callable[[], None]] = None) -> Iterator[list[str]]:
+        """
+        Leases batches until no open items are left. A batch is marked as done when the next one is requested,
+        after before_complete was called; if the iteration is interrupted, the current batch is released.
+        :param worker: The name of the worker.
+        :param batch_size: The maximum number of items of a batch.
+        :param before_complete: Called before a batch is marked as done, e.g. PubMedStreamWriter.flush(),
+                                so that no item is done before its output is on disk.
+        :return: Iterator over the batches.
+        """
+        while True:
+            keys = self.acquire(worker, batch_size)
+            if len(keys) == 0:
+                return
+
+            try:
+                yield keys
+            except GeneratorExit:
+                self.release(keys)
+                raise
+
+            if before_complete is not None:
+                before_complete()
+
+            self.complete(keys)
+
+    def counts(self) -> dict[str, int]:
+        """
+        :return: The numbers of the items: {"open": ..., "leased": ..., "done": ...}.
+        """
+        open_count, leased_count, done_count = self._connection.execute(
+            "SELECT SUM(done = 0 AND lease_until < ?), SUM(done = 0 AND lease_until >= ?), SUM(done) FROM items",
+            (time.time(), time.time())).fetchone()
+
+        return {"open": open_count or 0, "leased": leased_count or 0, "done": done_count or 0}
+
+    def close(self):
+        """
+        Closes the database.
+        :return: None.
+        """
+        self._connection.close()
+
+    # region Protected auxiliary
+    def _transaction(self):
+        """
+        :return: Context manager of a transaction which locks the database for writing at once,
+                 so that two workers never lease the same items.
+        """
+        queue = self
+
+        class Transaction:
+            def __enter__(self):
+                queue._connection.execute("BEGIN IMMEDIATE")
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                queue._connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+                return False
+
+        return Transaction()
+    # endregion
+
+
+# region Naming
+def default_worker_name() -> str:
+    """
+    :return: A worker name unique among the processes of the nodes, "<host>-<process ID>".
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def partition_file_name(file_name: str, label: str) -> str:
+    """
+    Inserts the label of a partition or a worker before the extension of a file name,
+    e.g. "results.xml" -> "results.shard-2-of-4.xml"; folders get it as suffix.
+    :param file_name: The file or folder name.
+    :param label: The label.
+    :return: The name of the partial output.
+    """
+    root, extension = os.path.splitext(file_name)
+    if extension == "" or os.path.isdir(file_name):
+        return f"{file_name}.{label}"
+
+    return f"{root}.{label}{extension}"
+# endregion
+
+
+# region Merging
+def merge_xml_files(file_names: Iterable[str], output_file_name: str) -> int:
+    """
+    Merges XML files written by PubMedXmlWriter, keeping every publication ID once.
+    The files of interrupted workers lack the closing tag, or end within an element; the publications
+    before the truncation are kept (the items of the unfinished batch are processed by another worker).
+    :param file_names: The partial outputs.
+    :param output_file_name: The merged file.
+    :return: The number of publications written.
+    """
+    seen = set()
+
+    with PubMedXmlWriter(output_file_name) as writer:
+        for file_name in file_names:
+            x_root = None
+
+            try:
+                for event, x_element in ET.iterparse(file_name, events=("start", "end")):
+                    if x_root is None:
+                        x_root = x_element
+                    elif event == "end" and x_element.tag == "PubMedPublication":
+                        publication_id = x_element.get("id", "")
+
+                        if publication_id not in seen:
+                            seen.add(publication_id)
+                            writer.write_element(x_element)
+
+                        x_root.clear()
+            except ET.ParseError as exception:
+                print(f"Skipping the truncated end of {file_name}: {exception}")
+
+        return writer.count
+
+
+def merge_info_files(file_names: Iterable[str], output_file_name: str) -> int:
+    """
+    Merges info.csv files written by PubMedInfoWriter, keeping every PMID once and renumbering the rows.
+    An incomplete last row (of an interrupted worker) is skipped.
+    :param file_names: The partial outputs.
+    :param output_file_name: The merged file.
+    :return: The number of rows written.
+    """
+    seen = set()
+
+    with PubMedInfoWriter(output_file_name) as writer:
+        for file_name in file_names:
+            complete = _ends_with_newline(file_name)
+
+            with open(file_name, encoding="utf-8", newline="") as file:
+                rows = csv.DictReader(file)
+                row = next(rows, None)
+
+                while row is not None:
+                    next_row = next(rows, None)
+                    if next_row is None and not complete:
+                        print(f"Skipping the truncated last row of {file_name}")
+                        break
+
+                    if row["PMID"] not in seen:
+                        seen.add(row["PMID"])
+                        writer.write(row)
+
+                    row = next_row
+
+        return writer.count
+
+
+def merge_bibtex_files(file_names: Iterable[str], output_file_name: str) -> int:
+    """
+    Merges BibTeX files, keeping every entry (by its first line, "@article{key,") once.
+    An incomplete last entry (of an interrupted worker) is skipped.
+    :param file_names: The partial outputs.
+    :param output_file_name: The merged file.
+    :return: The number of entries written.
+    """
+    seen = set()
+
+    with open(output_file_name, "w", encoding="utf-8") as output_file:
+        for file_name in file_names:
+            for entry in _read_bibtex_entries(file_name):
+                if entry[0] not in seen:
+                    seen.add(entry[0])
+                    output_file.write("".join(entry))
+
+    return len(seen)
+
+
+def merge_corpus_folders(folders: Iterable[str], output_folder: str) -> int:
+    """
+    Merges corpus folders written by PubMedCorpusCreator.create_corpus() for different shards:
+    text, chunk and abstract files are copied, info.csv, the BibTeX files and shard folders are merged.
+    :param folders: The partial corpus folders.
+    :param output_folder: The merged corpus folder.
+    :return: The number of rows of the merged info.csv.
+    """
+    folders = list(folders)
+    os.makedirs(output_folder, exist_ok=True)
+
+    names = sorted({name for folder in folders for name in os.listdir(folder)})
+
+    for name in names:
+        sources = [os.path.join(folder, name) for folder in folders if os.path.exists(os.path.join(folder, name))]
+        target = os.path.join(output_folder, name)
+
+        if os.path.isdir(sources[0]):
+            if os.path.exists(os.path.join(sources[0], INDEX_FILE_NAME)):
+                merge_shard_folders(sources, target)
+            else:
+                merge_corpus_folders(sources, target)
+        elif name == "info.csv":
+            merge_info_files(sources, target)
+        elif name.endswith(".bib"):
+            merge_bibtex_files(sources, target)
+        elif not os.path.exists(target):
+            shutil.copyfile(sources[0], target)
+
+    info_file_name = os.path.join(output_folder, "info.csv")
+    if not os.path.exists(info_file_name):
+        return 0
+
+    with open(info_file_name, encoding="utf-8", newline="") as file:
+        return sum(1 for _ in csv.reader(file)) - 1
+# endregion
+
+
+# region Protected auxiliary
+def _ends_with_newline(file_name: str) -> bool:
+    """
+    :param file_name: The file.
+    :return: True if the file is empty or ends with a line break, that is, its last line was written completely.
+    """
+    with open(file_name, "rb") as file:
+        if file.seek(0, os.SEEK_END) == 0:
+            return True
+
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def _read_bibtex_entries(file_name: str) -> Iterator[list[str]]:
+    """
+    Reads the entries of a BibTeX file written by PubMedBibTeXWriter line by line.
+    :param file_name: The file.
+    :return: Iterator over the entries as lists of lines; an entry not closed by a "}" line is skipped.
+    """
+    entry = []
+
+    with open(file_name, encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("@") and len(entry) > 0:
+                yield entry
+                entry = []
+
+            entry.append(line)
+
+    closing_lines = [line.strip() for line in entry if len(line.strip()) > 0]
+    if len(closing_lines) > 0 and closing_lines[-1] == "}":
+        yield entry
+    elif len(closing_lines) > 0:
+        print(f"Skipping the truncated last entry of {file_name}")
+# endregion
@@ -20,6 +20,8 @@ class PubMedPublication:
     article_title: str = ""                     # The title of the article.
     abstract: str = ""                          # The abstract.
     language: str = ""                          # Language code in ISO 639 Alpha3.
+    content_hash: str = ""                      # Hash of the PubmedArticle XML the publication was extracted from
+                                                # (hex string); changes whenever NCBI revises the record.
 
 
     def __init__(self):
@@ -32,6 +34,9 @@ class PubMedPublication:
                                                                                 # Value: the Id in that system,
                                                                                 # e.g. "doi": "2345.4567.234".
         self.keywords: list[str] = []                                           # List of keywords.
+        self.abstract_sections: list[tuple[str, str]] = []                      # Sections of a structured abstract:
+                                                                                # (label, text), e.g. ("METHODS", "...");
+                                                                                # the label is empty if there is none.
         self.publication_date: PubMedPublicationDate = PubMedPublicationDate()  # Date of publication.
         self.authors: list[PubMedAuthor] = []                                   # List of the authors.
         self.references: list[PubMedReference] = []                             # List of references.
@@ -44,6 +49,7 @@ class PubMedPublication:
         x.attrib['issue'] = self.issue
         x.attrib['pagination'] = self.pagination
         x.attrib['language'] = self.language
+        x.attrib['content_hash'] = self.content_hash
 
         x_journal_title = ET.SubElement(x, 'journal_title')
         x_journal_title.text = self.journal_title
@@ -1,4 +1,6 @@
-from typing import Union
+import re
+from functools import lru_cache
+from typing import Optional, Union
 from xml.etree.ElementTree import Element as XElement
 import xml.etree.ElementTree as ET
 
@@ -19,18 +21,36 @@ _MONTH_DICTIONARY_EN = \
         'DEC': 12
     }
 
+# Seasons, mapped to their first month (northern hemisphere; "Winter 2019" is taken as the beginning of 2019).
+_SEASON_DICTIONARY_EN = \
+    {
+        'WINTER': 1,
+        'SPRING': 3,
+        'SUMMER': 6,
+        'FALL': 9,
+        'AUTUMN': 9
+    }
+
+# Year, optionally followed by month (name, season or number) and day, e.g. "2019 Nov-Dec", "1975 Aug 15-21".
+_MEDLINE_DATE_PATTERN = re.compile(r"\b(1[89]\d\d|2\d\d\d)\b(?:[ \-/]+([A-Za-z]+|\d{1,2})\b(?:[ \-/]+(\d{1,2})\b)?)?")
+
+# Season or month name before the year, e.g. "Summer 2001".
+_LEADING_MONTH_PATTERN = re.compile(r"^([A-Za-z]+)[ ,]+(1[89]\d\d|2\d\d\d)\b")
+
+
 class PubMedPublicationDate:
     """
     Abstraction of a publication date.
-    All components are integer; no validation is carried out.
+    All components are integer; 0 stands for an unknown component.
     """
     def __init__(self, year: int = 0, month: Union[int, str] = 0, day: int = 0):
         """
         Creates an instance of PublicationDate.
         :param year: The year of publication
-        :param month: The month of publication, either the number (1..12) or a string (case-insensitive).
-                      If the input is a string, only the first three characters are taken into consideration.
-                      No validation is carried out: if the string is not recognizable, the value of month will be 0 (invalid).
+        :param month: The month of publication, either the number (1..12) or a string (case-insensitive):
+                      a month name (only the first three characters are taken into consideration), a season
+                      ("Spring": 3, "Summer": 6, "Fall"/"Autumn": 9, "Winter": 1) or a number.
+                      If the string is not recognizable, the value of month will be 0 (invalid).
         :param day:
         """
         self.year = year
@@ -38,11 +58,7 @@ class PubMedPublicationDate:
         if type(month) is int:
             self.month = month
         else:
-            month_string = month.upper()[:3]
-            if month_string in _MONTH_DICTIONARY_EN.keys():
-                self.month = _MONTH_DICTIONARY_EN[month_string]
-            else:
-                self.month = 0
+            self.month = parse_month(month)
 
         self.day = day
 
@@ -62,6 +78,45 @@ class PubMedPublicationDate:
         else:
             return f"{self.year}"
 
+    @property
+    def ordinal(self) -> int:
+        """
+        Sortable integer of the date, YYYYMMDD, with 0 for unknown components (e.g. 20191100 for "2019 Nov").
+        ordinal // 10000 is the year, ordinal // 100 the year and month.
+        """
+        return self.year * 10000 + self.month * 100 + self.day
+
+    @classmethod
+    def from_ordinal(cls, ordinal: int) -> "PubMedPublicationDate":
+        """
+        :param ordinal: The value of PubMedPublicationDate.ordinal.
+        :return: The date.
+        """
+        return cls(ordinal // 10000, ordinal // 100 % 100, ordinal % 100)
+
+    @classmethod
+    def from_xml_element(cls, x_date: Optional[XElement]) -> "PubMedPublicationDate":
+        """
+        Creates a date from a PubMed date element: PubDate (Year, Month, Day, Season or MedlineDate),
+        ArticleDate, PubMedPubDate, DateCompleted, ...
+        :param x_date: The date element; may be None.
+        :return: The date; year 0 if the element holds no recognizable date.
+        """
+        if x_date is None:
+            return cls()
+
+        year_text = x_date.findtext("Year")
+
+        if year_text is None:
+            medline_date = x_date.findtext("MedlineDate")
+            return cls(*parse_medline_date(medline_date)) if medline_date is not None else cls()
+
+        month_text = x_date.findtext("Month")
+        if month_text is None:
+            month_text = x_date.findtext("Season")
+
+        return cls(*_parse_date_parts(year_text, month_text, x_date.findtext("Day")))
+
     def to_xml(self) -> XElement:
         x = XElement("PublicationDate")
         x.attrib['year'] = str(self.year)
@@ -69,3 +124,67 @@ class PubMedPublicationDate:
         x.attrib['day'] = str(self.day)
 
         return x
+
+
+# region Parsing
+@lru_cache(maxsize=None)
+def parse_month(text: str) -> int:
+    """
+    Parses a month: a month name or abbreviation, a season or a number.
+    :param text: The text, e.g. "Jan", "January", "01", "Spring".
+    :return: The month (1..12), 0 if not recognizable.
+    """
+    text = text.strip().upper()
+
+    if text.isdigit():
+        month = int(text)
+        return month if 1 <= month <= 12 else 0
+
+    if text in _SEASON_DICTIONARY_EN:
+        return _SEASON_DICTIONARY_EN[text]
+
+    return _MONTH_DICTIONARY_EN.get(text[:3], 0)
+
+
+@lru_cache(maxsize=65536)
+def parse_medline_date(text: str) -> tuple[int, int, int]:
+    """
+    Parses a free-form MedlineDate, taking the beginning of ranges.
+    Examples: "2019 Nov-Dec" -> (2019, 11, 0), "1998 Dec-1999 Jan" -> (1998, 12, 0), "2000 Spring" -> (2000, 3, 0),
+    "1975 Aug 15-21" -> (1975, 8, 15), "2000-2001" -> (2000, 0, 0), "Summer 2001" -> (2001, 6, 0).
+    :param text: The MedlineDate.
+    :return: Tuple of year, month and day; 0 for unknown components.
+    """
+    match = _LEADING_MONTH_PATTERN.match(text.strip())
+    if match is not None and parse_month(match.group(1)) > 0:
+        return int(match.group(2)), parse_month(match.group(1)), 0
+
+    match = _MEDLINE_DATE_PATTERN.search(text)
+    if match is None:
+        return 0, 0, 0
+
+    year = int(match.group(1))
+    month = parse_month(match.group(2)) if match.group(2) is not None else 0
+    day = int(match.group(3)) if month > 0 and match.group(3) is not None else 0
+
+    return year, month, day if day <= 31 else 0
+
+
+@lru_cache(maxsize=65536)
+def _parse_date_parts(year_text: str, month_text: Optional[str], day_text: Optional[str]) -> tuple[int, int, int]:
+    """
+    Parses the Year, Month (or Season) and Day texts of a date element.
+    :return: Tuple of year, month and day; 0 for unknown components.
+    """
+    year_text = year_text.strip()
+    if not year_text.isdigit():
+        return parse_medline_date(year_text)
+
+    month = parse_month(month_text) if month_text is not None else 0
+
+    day = 0
+    if month > 0 and day_text is not None and day_text.strip().isdigit():
+        day = int(day_text)
+
+    return int(year_text), month, day if day <= 31 else 0
+# endregion
@@ -0,0 +1,197 @@
+import re
+from typing import Union
+
+# Tokens of a PubMed boolean expression: parentheses, quoted phrases and words, both with an optional field tag,
+# e.g. "prostate cancer"[mh], mri[Title/Abstract].
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|("[^"]*"(?:\[[^\]]*\])?)|([^\s()"]+(?:\[[^\]]*\])?))')
+
+# Boolean operators; PubMed only recognizes them in upper case.
+_OPERATORS = ("AND", "OR", "NOT")
+
+# Operators for which the order of the operands does not matter.
+_COMMUTATIVE_OPERATORS = ("AND", "OR")
+
+
+class PubMedQuery:
+    """
+    A boolean PubMed search expression with AND, OR, NOT, parentheses and field tags.
+    As in PubMed, operators are evaluated from left to right unless parentheses are used;
+    consecutive words without an operator form a single search term.
+    The canonical form sorts the operands of AND and OR, so that equivalent queries are searched only once.
+    """
+    def __init__(self, expression: str):
+        """
+        Parses a boolean expression.
+        :param expression: The expression, e.g. '(dicom OR pacs) AND mri[tiab] NOT review[pt]'.
+        """
+        self.expression = expression
+        self._tokens = self._tokenize(expression)
+        self._position = 0
+        self.tree = self._parse_expression()
+
+        if self._position < len(self._tokens):
+            raise ValueError(f"Unexpected '{self._tokens[self._position]}' in query '{expression}'")
+
+    @classmethod
+    def from_topics(cls, topics: list[str]) -> "PubMedQuery":
+        """
+        Creates the AND combination of a list of topics, as used by PubMedFetcher.fetch_by_topics().
+        :param topics: List of topics.
+        :return: The resulting query.
+        """
+        return cls(" AND ".join(f"({topic})" for topic in topics))
+
+    def canonical(self) -> str:
+        """
+        :return: The canonical string of the expression, suitable as an esearch term.
+        """
+        return self._to_string(self.tree)
+
+    def terms(self) -> set[str]:
+        """
+        :return: The set of search terms (leaves) of the expression.
+        """
+        result = set()
+        self._collect_terms(self.tree, result)
+        return result
+
+    def evaluate(self, ids_by_term: dict[str, set[int]]) -> set[int]:
+        """
+        Evaluates the expression locally with set algebra.
+        :param ids_by_term: Dictionary of the IDs found for every term of the expression.
+        :return: The resulting set of IDs.
+        """
+        return self._evaluate(self.tree, ids_by_term)
+
+    def __repr__(self):
+        return self.canonical()
+
+    # region Protected auxiliary
+    def _tokenize(self, expression: str) -> list[str]:
+        """
+        Splits an expression into tokens.
+        :param expression: The expression to split.
+        :return: The list of tokens.
+        """
+        result = []
+        position = 0
+        expression = expression.rstrip()
+
+        while position < len(expression):
+            match = _TOKEN_PATTERN.match(expression, position)
+
+            if match is None or match.end() == position:
+                raise ValueError(f"Cannot parse query '{expression}' at position {position}")
+
+            result.append(next(group for group in match.groups() if group is not None))
+            position = match.end()
+
+        return result
+
+    def _parse_expression(self) -> Union[str, tuple]:
+        """
+        Parses operands combined by operators from left to right.
+        :return: The resulting tree: either a term string or a tuple (operator, left, right).
+        """
+        tree = self._parse_operand()
+
+        while self._position < len(self._tokens) and self._tokens[self._position] in _OPERATORS:
+            operator = self._tokens[self._position]
+            self._position += 1
+            tree = (operator, tree, self._parse_operand())
+
+        return tree
+
+    def _parse_operand(self) -> Union[str, tuple]:
+        """
+        Parses a parenthesized expression or a term.
+        :return: The resulting tree.
+        """
+        if self._position >= len(self._tokens):
+            raise ValueError(f"Unexpected end of query '{self.expression}'")
+
+        token = self._tokens[self._position]
+
+        if token == "(":
+            self._position += 1
+            tree = self._parse_expression()
+
+            if self._position >= len(self._tokens) or self._tokens[self._position] != ")":
+                raise ValueError(f"Missing ')' in query '{self.expression}'")
+
+            self._position += 1
+            return tree
+
+        words = []
+        while self._position < len(self._tokens) and self._tokens[self._position] not in _OPERATORS + ("(", ")"):
+            words.append(self._tokens[self._position])
+            self._position += 1
+
+        if len(words) == 0:
+            raise ValueError(f"Unexpected '{token}' in query '{self.expression}'")
+
+        return " ".join(words)
+
+    def _to_string(self, tree: Union[str, tuple]) -> str:
+        """
+        Creates the canonical string of a (sub)tree.
+        :param tree: The tree.
+        :return: The canonical string.
+        """
+        if isinstance(tree, str):
+            return tree
+
+        operator, left, right = tree
+
+        if operator in _COMMUTATIVE_OPERATORS:
+            operands = sorted(self._flatten(tree, operator))
+            return f"({f' {operator} '.join(operands)})"
+
+        return f"({self._to_string(left)} {operator} {self._to_string(right)})"
+
+    def _flatten(self, tree: Union[str, tuple], operator: str) -> list[str]:
+        """
+        Collects the canonical operands of a chain of the same commutative operator, e.g. a AND (b AND c).
+        :param tree: The tree.
+        :param operator: The operator of the chain.
+        :return: The list of canonical operand strings.
+        """
+        if isinstance(tree, tuple) and tree[0] == operator:
+            return self._flatten(tree[1], operator) + self._flatten(tree[2], operator)
+
+        return [self._to_string(tree)]
+
+    def _collect_terms(self, tree: Union[str, tuple], result: set[str]):
+        """
+        Collects the terms of a (sub)tree.
+        :param tree: The tree.
+        :param result: The set to add the terms to.
+        :return: None.
+        """
+        if isinstance(tree, str):
+            result.add(tree)
+        else:
+            self._collect_terms(tree[1], result)
+            self._collect_terms(tree[2], result)
+
+    def _evaluate(self, tree: Union[str, tuple], ids_by_term: dict[str, set[int]]) -> set[int]:
+        """
+        Evaluates a (sub)tree with set algebra.
+        :param tree: The tree.
+        :param ids_by_term: Dictionary of the IDs found for every term.
+        :return: The resulting set of IDs.
+        """
+        if isinstance(tree, str):
+            return ids_by_term.get(tree, set())
+
+        operator, left, right = tree
+        left_ids = self._evaluate(left, ids_by_term)
+        right_ids = self._evaluate(right, ids_by_term)
+
+        if operator == "AND":
+            return left_ids & right_ids
+        elif operator == "OR":
+            return left_ids | right_ids
+        else:
+            return left_ids - right_ids
+    # endregion
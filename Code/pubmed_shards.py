@@ -0,0 +1,350 @@
+import gzip
+import json
+import mmap
+import os
+import random
+import shutil
+from typing import Iterable, Iterator, Optional
+
+# Default maximum size of a shard in bytes.
+DEFAULT_MAXIMUM_SHARD_SIZE = 256 * 1024 * 1024
+
+# Name of the index file of a shard folder. Every line: key, shard number, offset and length, separated by tabs.
+INDEX_FILE_NAME = "index.tsv"
+
+# File extensions of the shards by compression.
+SHARD_EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+
+
+class PubMedShardCodec:
+    """
+    Encodes and decodes single records. Every record is a JSON line compressed on its own
+    (a gzip member or a zstd frame), so that a shard is a valid .jsonl.gz/.jsonl.zst file
+    and, at the same time, every record can be read without decompressing the rest of the shard.
+    zstd requires the 'zstandard' package.
+    """
+    def __init__(self, compression: str = "gzip", compression_level: int = 6):
+        """
+        Creates a codec.
+        :param compression: "gzip" (default), "zstd" or "none".
+        :param compression_level: The compression level.
+        """
+        if compression not in SHARD_EXTENSIONS:
+            raise ValueError(f"Unknown compression '{compression}'; use one of {list(SHARD_EXTENSIONS)}")
+
+        self.compression = compression
+        self.compression_level = compression_level
+        self._compressor = None
+        self._decompressor = None
+
+        if compression == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=compression_level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, record: dict) -> bytes:
+        """
+        :param record: The record.
+        :return: The encoded (compressed) JSON line.
+        """
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        if self.compression == "gzip":
+            return gzip.compress(line, compresslevel=self.compression_level, mtime=0)
+        elif self.compression == "zstd":
+            return self._compressor.compress(line)
+        else:
+            return line
+
+    def decode(self, payload: bytes) -> dict:
+        """
+        :param payload: An encoded record.
+        :return: The record.
+        """
+        if self.compression == "gzip":
+            payload = gzip.decompress(payload)
+        elif self.compression == "zstd":
+            payload = self._decompressor.decompress(payload)
+
+        return json.loads(payload)
+
+
+class PubMedShardWriter:
+    """
+    Packs documents into size-bounded shards ("shard-00000.jsonl.gz", ...) with an offset index, instead of
+    writing one file per document. Records are dictionaries, e.g. {"PMCID": ..., "PMID": ..., "text": ...},
+    and may be found by several keys (e.g. PMC ID and PMID).
+    Usable as a context manager.
+    """
+    def __init__(self, folder: str, maximum_shard_size: int = DEFAULT_MAXIMUM_SHARD_SIZE, compression: str = "gzip",
+                 compression_level: int = 6):
+        """
+        Creates the folder, if necessary, and opens the first shard.
+        :param folder: The folder to write the shards and the index into.
+        :param maximum_shard_size: The size in bytes after which a new shard is started.
+        :param compression: "gzip" (default), "zstd" or "none".
+        :param compression_level: The compression level.
+        """
+        self.folder = folder
+        self.maximum_shard_size = maximum_shard_size
+        self.codec = PubMedShardCodec(compression, compression_level)
+        self.count = 0
+
+        os.makedirs(folder, exist_ok=True)
+
+        self._shard_number = -1
+        self._shard_file = None
+        self._shard_size = 0
+        self._index_file = open(os.path.join(folder, INDEX_FILE_NAME), "w", encoding="utf-8")
+        self._open_next_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, record: dict, keys: Iterable[str]):
+        """
+        Writes a record.
+        :param record: The record.
+        :param keys: The keys to find the record by.
+        :return: None.
+        """
+        self.write_encoded(self.codec.encode(record), keys)
+
+    def write_encoded(self, payload: bytes, keys: Iterable[str]):
+        """
+        Writes a record encoded by a PubMedShardCodec of the same compression, e.g. in a worker process.
+        :param payload: The encoded record.
+        :param keys: The keys to find the record by.
+        :return: None.
+        """
+        if self._shard_size > 0 and self._shard_size + len(payload) > self.maximum_shard_size:
+            self._open_next_shard()
+
+        offset = self._shard_size
+        self._shard_file.write(payload)
+        self._shard_size += len(payload)
+
+        for key in keys:
+            if key:
+                self._index_file.write(f"{key}\t{self._shard_number}\t{offset}\t{len(payload)}\n")
+
+        self.count += 1
+
+    def close(self):
+        """
+        Closes the current shard and the index.
+        :return: None.
+        """
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+            self._index_file.close()
+
+    # region Protected auxiliary
+    def _open_next_shard(self):
+        """
+        Closes the current shard and starts the next one.
+        :return: None.
+        """
+        if self._shard_file is not None:
+            self._shard_file.close()
+
+        self._shard_number += 1
+        self._shard_size = 0
+        self._shard_file = open(os.path.join(self.folder, shard_file_name(self._shard_number, self.codec.compression)),
+                                "wb")
+    # endregion
+
+
+class PubMedShardReader:
+    """
+    Reads a shard folder written by PubMedShardWriter. The shards are memory-mapped:
+    a record is found by key in O(1) and decoded alone; iteration is sequential or shuffled.
+    Usable as a context manager.
+    """
+    def __init__(self, folder: str):
+        """
+        Loads the index.
+        :param folder: The shard folder.
+        """
+        self.folder = folder
+        self.codec = PubMedShardCodec(self._detect_compression(folder))
+
+        self._locations: dict[str, tuple[int, int, int]] = {}       # key -> (shard number, offset, length).
+        self._records: list[tuple[int, int, int]] = []              # Distinct records in writing order.
+        self._files = {}
+        self._maps: dict[int, mmap.mmap] = {}
+
+        with open(os.path.join(folder, INDEX_FILE_NAME), encoding="utf-8") as file:
+            for line in file:
+                key, shard_number, offset, length = line.rstrip("\n").split("\t")
+                location = (int(shard_number), int(offset), int(length))
+
+                if len(self._records) == 0 or self._records[-1] != location:
+                    self._records.append(location)
+
+                self._locations[key] = location
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._locations
+
+    def __getitem__(self, key: str) -> dict:
+        return self._read(self._locations[key])
+
+    def __iter__(self) -> Iterator[dict]:
+        """
+        Iterates over the records sequentially, shard by shard.
+        """
+        for location in self._records:
+            yield self._read(location)
+
+    def get(self, key: str, default: Optional[dict] = None) -> Optional[dict]:
+        """
+        :param key: The key, e.g. a PMC ID or a PMID.
+        :param default: The value to return if the key is unknown.
+        :return: The record.
+        """
+        location = self._locations.get(key)
+        return default if location is None else self._read(location)
+
+    def iterate_shuffled(self, seed: Optional[int] = None) -> Iterator[dict]:
+        """
+        Iterates over the records in a random order, e.g. for training. The shards are visited in random order,
+        and the records of a shard in random order, so that only one shard is read at a time.
+        :param seed: The seed of the random generator, for a reproducible order.
+        :return: Iterator over the records.
+        """
+        generator = random.Random(seed)
+
+        records_by_shard: dict[int, list[tuple[int, int, int]]] = {}
+        for location in self._records:
+            records_by_shard.setdefault(location[0], []).append(location)
+
+        shard_numbers = list(records_by_shard)
+        generator.shuffle(shard_numbers)
+
+        for shard_number in shard_numbers:
+            locations = records_by_shard[shard_number]
+            generator.shuffle(locations)
+
+            for location in locations:
+                yield self._read(location)
+
+    def close(self):
+        """
+        Unmaps and closes the shards.
+        :return: None.
+        """
+        for shard_map in self._maps.values():
+            shard_map.close()
+
+        for file in self._files.values():
+            file.close()
+
+        self._maps = {}
+        self._files = {}
+
+    # region Protected auxiliary
+    def _read(self, location: tuple[int, int, int]) -> dict:
+        """
+        Reads and decodes a record.
+        :param location: Tuple of shard number, offset and length.
+        :return: The record.
+        """
+        shard_number, offset, length = location
+        return self.codec.decode(self._get_map(shard_number)[offset: offset + length])
+
+    def _get_map(self, shard_number: int) -> mmap.mmap:
+        """
+        Gets the memory map of a shard, mapping it on first use.
+        :param shard_number: The number of the shard.
+        :return: The memory map.
+        """
+        shard_map = self._maps.get(shard_number)
+
+        if shard_map is None:
+            file = open(os.path.join(self.folder, shard_file_name(shard_number, self.codec.compression)), "rb")
+            shard_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._files[shard_number] = file
+            self._maps[shard_number] = shard_map
+
+        return shard_map
+
+    def _detect_compression(self, folder: str) -> str:
+        """
+        Detects the compression from the extension of the first shard.
+        :param folder: The shard folder.
+        :return: The compression.
+        """
+        for compression in ("gzip", "zstd", "none"):
+            if os.path.exists(os.path.join(folder, shard_file_name(0, compression))):
+                return compression
+
+        raise FileNotFoundError(f"No shards found in {folder}")
+    # endregion
+
+
+def shard_file_name(shard_number: int, compression: str) -> str:
+    """
+    :param shard_number: The number of the shard.
+    :param compression: The compression.
+    :return: The file name of the shard, e.g. "shard-00000.jsonl.gz".
+    """
+    return f"shard-{shard_number:05d}{SHARD_EXTENSIONS[compression]}"
+
+
+def merge_shard_folders(folders: Iterable[str], output_folder: str) -> int:
+    """
+    Merges shard folders of the same compression, e.g. written by different nodes, without decoding the records:
+    the shards are copied with new numbers and the indices are concatenated. Keys already merged from an earlier
+    folder are skipped.
+    :param folders: The shard folders.
+    :param output_folder: The merged shard folder.
+    :return: The number of shards of the merged folder.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    compression = None
+    shard_count = 0
+    seen = set()
+
+    with open(os.path.join(output_folder, INDEX_FILE_NAME), "w", encoding="utf-8") as index_file:
+        for folder in folders:
+            reader = PubMedShardReader(folder)
+            if compression is None:
+                compression = reader.codec.compression
+            elif reader.codec.compression != compression:
+                raise ValueError(f"{folder} is compressed with {reader.codec.compression}, not {compression}")
+
+            shard_numbers = sorted({location[0] for location in reader._records})
+            new_numbers = {shard_number: shard_count + index for index, shard_number in enumerate(shard_numbers)}
+
+            for shard_number, new_number in new_numbers.items():
+                shutil.copyfile(os.path.join(folder, shard_file_name(shard_number, compression)),
+                                os.path.join(output_folder, shard_file_name(new_number, compression)))
+
+            with open(os.path.join(folder, INDEX_FILE_NAME), encoding="utf-8") as file:
+                for line in file:
+                    key, shard_number, offset, length = line.rstrip("\n").split("\t")
+                    if key not in seen:
+                        seen.add(key)
+                        index_file.write(f"{key}\t{new_numbers[int(shard_number)]}\t{offset}\t{length}\n")
+
+            shard_count += len(shard_numbers)
+            reader.close()
+
+    return shard_count
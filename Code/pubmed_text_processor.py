@@ -0,0 +1,289 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Default maximum number of tokens (whitespace separated words) of a chunk.
+DEFAULT_CHUNK_SIZE = 512
+
+# Default number of tokens shared by consecutive chunks of a section.
+DEFAULT_CHUNK_OVERLAP = 64
+
+# Extension of the chunk files written next to the text files: "<PMC ID>.chunks.jsonl".
+CHUNKS_EXTENSION = ".chunks.jsonl"
+
+# Number of lines at the top and the bottom of a page checked for running headers and footers.
+RUNNING_LINE_DEPTH = 3
+
+# Share of the pages a line has to repeat on (at least 3) to count as a running header or footer.
+RUNNING_LINE_SHARE = 0.3
+
+_HEADING_PATTERN = re.compile(
+    r"^(?:[0-9IVX]+(?:\.\d+)*\.?\s+)?"
+    r"(abstract|introduction|background|(?:materials?|patients|subjects) and methods|methods?|methodology|"
+    r"results and discussion|results?|findings|discussion|conclusions?|limitations|"
+    r"acknowledge?ments?|funding|conflicts? of interest|references|bibliography|literature cited|"
+    r"supplementary (?:material|information)|appendix)\s*:?$", re.IGNORECASE)
+_REFERENCE_SECTIONS = {"references", "bibliography", "literature cited"}
+_PAGE_NUMBER_PATTERN = re.compile(r"^(?:page\s+)?\d+(?:\s*(?:of|/)\s*\d+)?$", re.IGNORECASE)
+_DIGITS_PATTERN = re.compile(r"\d+")
+_HYPHENATION_PATTERN = re.compile(r"(\w)[-\u00ad]\n[ \t]*([a-z])")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_TOKEN_PATTERN = re.compile(r"\S+")
+_SENTENCE_END_PATTERN = re.compile(r"[.!?][\"')\]]*$")
+
+
+class PubMedTextProcessor:
+    """
+    Post-processes the full texts written by pdftotext for downstream NLP: normalizes the text, drops running
+    headers, footers, page numbers and the reference section, fixes hyphenation, detects the sections
+    (Introduction, Methods, ...) and splits them into token-bounded, overlapping chunks with character offsets
+    into the cleaned text. The chunks of "<PMC ID>.txt" are written to "<PMC ID>.chunks.jsonl", one JSON line each:
+    {"PMCID", "chunk", "section", "start", "end", "tokens", "text"}.
+    Documents are processed in parallel worker processes.
+    """
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+                 processes: Optional[int] = None):
+        """
+        Creates a processor.
+        :param chunk_size: The maximum number of tokens of a chunk.
+        :param chunk_overlap: The number of tokens shared by consecutive chunks of a section.
+        :param processes: The number of worker processes. Default: the number of CPUs.
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"The chunk overlap ({chunk_overlap}) must be smaller than the chunk size ({chunk_size})")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.processes = processes or os.cpu_count() or 1
+
+    def process(self, text: str) -> tuple[str, list[dict]]:
+        """
+        Processes a text in the calling process.
+        :param text: The text written by pdftotext.
+        :return: Tuple of the cleaned text and its chunks.
+        """
+        return process_document(text, self.chunk_size, self.chunk_overlap)
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        """
+        :return: An executor to submit process_document() calls to, e.g. while a corpus is being downloaded.
+        """
+        return ProcessPoolExecutor(max_workers=self.processes)
+
+    def process_folder(self, folder: str) -> int:
+        """
+        Processes the text files of an existing corpus folder in parallel, replacing every "<PMC ID>.txt"
+        by its cleaned text and writing "<PMC ID>.chunks.jsonl" next to it.
+        Files which already have a chunk file are skipped.
+        :param folder: The corpus folder.
+        :return: The number of files processed.
+        """
+        file_names = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(".txt")]
+        file_names = [file_name for file_name in file_names if not os.path.exists(file_name[:-4] + CHUNKS_EXTENSION)]
+
+        with self.create_executor() as executor:
+            list(executor.map(process_file, file_names, [self.chunk_size] * len(file_names),
+                              [self.chunk_overlap] * len(file_names), chunksize=16))
+
+        return len(file_names)
+
+
+# region Worker functions
+def clean_text(text: str) -> tuple[str, list[tuple[str, int, int]]]:
+    """
+    Cleans a text written by pdftotext (pages separated by form feeds) and detects its sections.
+    :param text: The text.
+    :return: Tuple of the cleaned text (paragraphs and headings separated by empty lines) and the sections:
+             tuples of name (lower case, "" before the first heading), start and end offset.
+    """
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(_remove_running_lines(text.split("\f")))
+    text = _HYPHENATION_PATTERN.sub(r"\1\2", text)
+
+    # Blocks: (heading name or None, text).
+    blocks = []
+    paragraph = []
+    for line in text.split("\n"):
+        line = line.strip()
+        match = _HEADING_PATTERN.match(line) if 0 < len(line) <= 60 else None
+
+        if len(line) == 0 or match is not None:
+            if len(paragraph) > 0:
+                blocks.append((None, _WHITESPACE_PATTERN.sub(" ", " ".join(paragraph))))
+                paragraph = []
+            if match is not None:
+                blocks.append((match.group(1).lower(), line))
+        else:
+            paragraph.append(line)
+
+    if len(paragraph) > 0:
+        blocks.append((None, _WHITESPACE_PATTERN.sub(" ", " ".join(paragraph))))
+
+    blocks = _remove_reference_sections(blocks)
+
+    parts = []
+    sections = []
+    section_name = ""
+    section_start = 0
+    offset = 0
+
+    for name, block in blocks:
+        if name is not None and offset > 0:
+            sections.append((section_name, section_start, offset - 2))
+            section_start = offset
+        if name is not None:
+            section_name = name
+
+        parts.append(block)
+        offset += len(block) + 2
+
+    cleaned_text = "\n\n".join(parts)
+    if len(cleaned_text) > section_start:
+        sections.append((section_name, section_start, len(cleaned_text)))
+
+    return cleaned_text, sections
+
+
+def chunk_text(text: str, sections: list[tuple[str, int, int]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+               chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> list[dict]:
+    """
+    Splits the sections of a text into chunks of at most chunk_size tokens, which do not cross sections.
+    A chunk ends at the last sentence end of its final quarter, if there is one.
+    :param text: The (cleaned) text.
+    :param sections: The sections, as returned by clean_text().
+    :param chunk_size: The maximum number of tokens of a chunk.
+    :param chunk_overlap: The number of tokens shared by consecutive chunks of a section.
+    :return: The chunks: {"chunk", "section", "start", "end", "tokens", "text"}, with character offsets into the text.
+    """
+    chunks = []
+
+    for name, section_start, section_end in sections:
+        tokens = [match.span() for match in _TOKEN_PATTERN.finditer(text, section_start, section_end)]
+        start_index = 0
+
+        while start_index < len(tokens):
+            end_index = min(start_index + chunk_size, len(tokens))
+
+            if end_index < len(tokens):
+                for index in range(end_index - 1, start_index + chunk_size * 3 // 4 - 1, -1):
+                    if _SENTENCE_END_PATTERN.search(text, tokens[index][0], tokens[index][1]):
+                        end_index = index + 1
+                        break
+
+            start, end = tokens[start_index][0], tokens[end_index - 1][1]
+            chunks.append({"chunk": len(chunks), "section": name, "start": start, "end": end,
+                           "tokens": end_index - start_index, "text": text[start: end]})
+
+            if end_index >= len(tokens):
+                break
+
+            start_index = max(end_index - chunk_overlap, start_index + 1)
+
+    return chunks
+
+
+def process_document(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> tuple[str, list[dict]]:
+    """
+    Cleans and chunks a text (run in a worker process).
+    :param text: The text written by pdftotext.
+    :param chunk_size: The maximum number of tokens of a chunk.
+    :param chunk_overlap: The number of tokens shared by consecutive chunks of a section.
+    :return: Tuple of the cleaned text and its chunks.
+    """
+    cleaned_text, sections = clean_text(text)
+    return cleaned_text, chunk_text(cleaned_text, sections, chunk_size, chunk_overlap)
+
+
+def process_file(file_name: str, chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP):
+    """
+    Cleans a text file in place and writes its chunk file (run in a worker process).
+    :param file_name: The name of the text file, "<PMC ID>.txt".
+    :param chunk_size: The maximum number of tokens of a chunk.
+    :param chunk_overlap: The number of tokens shared by consecutive chunks of a section.
+    :return: None.
+    """
+    with open(file_name, encoding="utf-8", errors="replace") as file:
+        cleaned_text, chunks = process_document(file.read(), chunk_size, chunk_overlap)
+
+    write_document(file_name, cleaned_text, chunks)
+
+
+def write_document(file_name: str, cleaned_text: str, chunks: list[dict]):
+    """
+    Writes a cleaned text and its chunk file.
+    :param file_name: The name of the text file, "<PMC ID>.txt".
+    :param cleaned_text: The cleaned text.
+    :param chunks: The chunks.
+    :return: None.
+    """
+    pmc_id = os.path.basename(file_name)[:-4]
+
+    with open(file_name, "w", encoding="utf-8") as file:
+        file.write(cleaned_text)
+
+    with open(file_name[:-4] + CHUNKS_EXTENSION, "w", encoding="utf-8") as file:
+        for chunk in chunks:
+            file.write(json.dumps({"PMCID": pmc_id, **chunk}, ensure_ascii=False) + "\n")
+
+
+def _remove_running_lines(pages: list[str]) -> list[str]:
+    """
+    Removes running headers and footers (lines repeating at the top or the bottom of the pages, page numbers
+    ignored) and page numbers.
+    :param pages: The texts of the pages.
+    :return: The texts of the pages without them.
+    """
+    pages_lines = [page.split("\n") for page in pages]
+
+    def edge_indices(lines: list[str]) -> list[int]:
+        indices = [index for index, line in enumerate(lines) if len(line.strip()) > 0]
+        return indices[:RUNNING_LINE_DEPTH] + indices[-RUNNING_LINE_DEPTH:]
+
+    def key(line: str) -> str:
+        return _DIGITS_PATTERN.sub("#", _WHITESPACE_PATTERN.sub(" ", line.strip().lower()))
+
+    page_counts: dict[str, int] = {}
+    for lines in pages_lines:
+        for line_key in {key(lines[index]) for index in edge_indices(lines)}:
+            page_counts[line_key] = page_counts.get(line_key, 0) + 1
+
+    minimum_count = max(3, math.ceil(RUNNING_LINE_SHARE * len(pages)))
+    running_keys = {line_key for line_key, count in page_counts.items() if count >= minimum_count}
+
+    result = []
+    for lines in pages_lines:
+        removed = {index for index in edge_indices(lines)
+                   if key(lines[index]) in running_keys or _PAGE_NUMBER_PATTERN.match(lines[index].strip())}
+        result.append("\n".join(line for index, line in enumerate(lines) if index not in removed))
+
+    return result
+
+
+def _remove_reference_sections(blocks: list[tuple[Optional[str], str]]) -> list[tuple[Optional[str], str]]:
+    """
+    Removes the reference sections: from a reference heading to the next other heading, e.g. an appendix.
+    :param blocks: The blocks of the text: tuples of heading name (None for paragraphs) and text.
+    :return: The blocks without the reference sections.
+    """
+    result = []
+    in_references = False
+
+    for name, block in blocks:
+        if name is not None:
+            in_references = name in _REFERENCE_SECTIONS
+
+        if not in_references:
+            result.append((name, block))
+
+    return result
+# endregion
+
+
+if __name__ == '__main__':
+    processor = PubMedTextProcessor()
+    print(f"Processed {processor.process_folder('C:/Temp/dicom_pacs')} files.")
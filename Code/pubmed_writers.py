@@ -0,0 +1,203 @@
+import csv
+import os
+import xml.etree.ElementTree as ET
+from typing import Iterable
+
+from pubmed_publication import PubMedPublication
+
+# Default size of the write buffer of the files, in bytes.
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# Default number of entries after which the buffer is flushed to disk.
+DEFAULT_FLUSH_EVERY = 100
+
+# Columns of the info.csv file of a corpus.
+INFO_FIELDS = ["PMCID", "PMID", "DOI", "Title"]
+
+
+class PubMedStreamWriter:
+    """
+    Base class of the streaming writers: a buffered text file, flushed every flush_every entries,
+    so that an interrupted run keeps everything written up to the last flush.
+    Usable as a context manager.
+    """
+    def __init__(self, file_name: str, flush_every: int = DEFAULT_FLUSH_EVERY, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 append: bool = False):
+        """
+        Opens the file.
+        :param file_name: The name of the file to write.
+        :param flush_every: Number of entries after which the buffer is flushed.
+        :param buffer_size: Size of the write buffer in bytes.
+        :param append: If set to True, the entries are appended to an existing file.
+        """
+        self.file_name = file_name
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = open(file_name, "a" if append else "w", encoding="utf-8", newline="", buffering=buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def flush(self):
+        """
+        Writes the buffer to disk, e.g. before the entries written are marked as done in a PubMedWorkQueue.
+        :return: None.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        :return: None.
+        """
+        if not self._file.closed:
+            self._file.close()
+
+    # region Protected auxiliary
+    def _entry_written(self):
+        """
+        Counts a written entry and flushes the buffer periodically.
+        :return: None.
+        """
+        self.count += 1
+
+        if self.flush_every > 0 and self.count % self.flush_every == 0:
+            self._file.flush()
+    # endregion
+
+
+class PubMedBibTeXWriter(PubMedStreamWriter):
+    """
+    Writes BibTeX entries of publications to a .bib file as they come.
+    """
+    def write(self, publication: PubMedPublication):
+        """
+        Writes the BibTeX entry of a publication.
+        :param publication: The publication.
+        :return: None.
+        """
+        self._file.write(publication.to_bibtex_entry())
+        self._file.write("\n\n")
+        self._entry_written()
+
+    def write_all(self, publications: Iterable[PubMedPublication]) -> int:
+        """
+        Writes the BibTeX entries of a stream of publications, e.g. PubMedFetcher.iterate_by_topics().
+        :param publications: The publications.
+        :return: The number of entries written.
+        """
+        count = self.count
+        for publication in publications:
+            self.write(publication)
+
+        return self.count - count
+
+
+class PubMedInfoWriter(PubMedStreamWriter):
+    """
+    Writes the info.csv file of a corpus row by row.
+    The layout is the one formerly written by pandas: a leading unnamed index column followed by INFO_FIELDS.
+    """
+    def __init__(self, file_name: str, flush_every: int = DEFAULT_FLUSH_EVERY, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 append: bool = False):
+        """
+        Opens the file and writes the header (unless appending to a file which has one).
+        :param file_name: The name of the file to write.
+        :param flush_every: Number of rows after which the buffer is flushed.
+        :param buffer_size: Size of the write buffer in bytes.
+        :param append: If set to True, the rows are appended to an existing file.
+        """
+        super().__init__(file_name, flush_every, buffer_size, append)
+        self._writer = csv.writer(self._file, lineterminator="\n")
+
+        number_of_lines = 0
+        if append:
+            with open(file_name, encoding="utf-8", newline="") as file:
+                number_of_lines = sum(1 for _ in csv.reader(file))
+
+        if number_of_lines == 0:
+            self._writer.writerow([""] + INFO_FIELDS)
+        else:
+            self.count = number_of_lines - 1
+
+    def write(self, info_entry: dict):
+        """
+        Writes a row.
+        :param info_entry: Dictionary with the keys of INFO_FIELDS.
+        :return: None.
+        """
+        self._writer.writerow([self.count] + [info_entry.get(field, "") for field in INFO_FIELDS])
+        self._entry_written()
+
+
+class PubMedXmlWriter(PubMedStreamWriter):
+    """
+    Writes publications as PubMedPublication XML elements (see PubMedPublication.to_xml())
+    into a <PubMedPublications> root element.
+    """
+    def __init__(self, file_name: str, flush_every: int = DEFAULT_FLUSH_EVERY, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        Opens the file and writes the opening root tag.
+        :param file_name: The name of the file to write.
+        :param flush_every: Number of publications after which the buffer is flushed.
+        :param buffer_size: Size of the write buffer in bytes.
+        """
+        super().__init__(file_name, flush_every, buffer_size)
+        self._file.write('<?xml version="1.0" encoding="utf-8"?>\n<PubMedPublications>\n')
+
+    def write(self, publication: PubMedPublication):
+        """
+        Writes a publication.
+        :param publication: The publication.
+        :return: None.
+        """
+        self.write_element(publication.to_xml())
+
+    def write_element(self, x_publication: ET.Element):
+        """
+        Writes a PubMedPublication element, e.g. read from another file of this writer.
+        :param x_publication: The element.
+        :return: None.
+        """
+        x_publication.tail = None
+        self._file.write(ET.tostring(x_publication, encoding="unicode"))
+        self._file.write("\n")
+        self._entry_written()
+
+    def close(self):
+        """
+        Writes the closing root tag, flushes and closes the file.
+        :return: None.
+        """
+        if not self._file.closed:
+            self._file.write("</PubMedPublications>\n")
+
+        super().close()
+
+
+def to_info_entry(publication: PubMedPublication) -> dict:
+    """
+    Creates the info.csv row of a publication.
+    :param publication: The publication.
+    :return: Dictionary with the keys of INFO_FIELDS.
+    """
+    return {"PMCID": publication.article_ids.get("PMC", ""),
+            "PMID": publication.publication_id,
+            "DOI": publication.article_ids.get("DOI", ""),
+            "Title": publication.article_title}
+
+
+def export_bibtex(publications: Iterable[PubMedPublication], file_name: str) -> int:
+    """
+    Exports the BibTeX entries of a stream of publications to a file.
+    :param publications: The publications, e.g. PubMedFetcher.iterate_by_topics(['dicom', 'mri']).
+    :param file_name: The name of the .bib file.
+    :return: The number of entries written.
+    """
+    with PubMedBibTeXWriter(file_name) as writer:
+        return writer.write_all(publications)
@@ -20,6 +20,9 @@ class XValues:
             else:
                 return default_value
         else:
+            if element.text is None:
+                return str() if default_value is None else default_value
+
             return element.text
 
     @classmethod
@@ -50,7 +53,7 @@ class XValues:
             source = element.text
             try:
                 return int(source)
-            except ValueError:
+            except (TypeError, ValueError):     # TypeError: empty element.
                 if default_value is None:
                     return int()
                 else:
@@ -89,7 +92,7 @@ class XValues:
             source = element.text
             try:
                 return float(source)
-            except ValueError:
+            except (TypeError, ValueError):     # TypeError: empty element.
                 if default_value is None:
                     return float()
                 else:
@@ -178,5 +181,5 @@ class XValues:
         :return: The string value of the attribute, if found, otherwise None.
         """
 
-        return x.attrib[tag]
+        return x.attrib.get(tag)
     # endregion
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of PubMedium are flat scripts in Code/, imported by their names.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Code"))
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from pubmed_abstract_corpus_creator import SimHashIndex, normalize_text, prepare_abstracts, simhash
+from pubmed_shards import PubMedShardCodec
+
+TEXT = ("Purpose: To evaluate the use of DICOM structured reports for the exchange of prostate MRI findings "
+        "between radiology and urology departments in a multicenter setting with five hospitals.")
+
+
+def test_simhash_is_deterministic():
+    assert simhash(TEXT) == simhash(TEXT)
+
+
+def test_simhash_of_near_identical_texts_is_close():
+    distance = (simhash(TEXT.lower()) ^ simhash(TEXT.lower().replace("five", "six"))).bit_count()
+
+    assert distance < (simhash(TEXT.lower()) ^ simhash("an unrelated abstract about cardiac ultrasound")).bit_count()
+
+
+def test_simhash_index_finds_hashes_within_the_distance():
+    index = SimHashIndex(3)
+    index.add(0b1011 << 40)
+
+    assert index.contains_near((0b1011 << 40) ^ 0b111)
+    assert not index.contains_near((0b1011 << 40) ^ 0b1111)
+
+
+def test_normalize_text():
+    assert normalize_text("ﬁbrosis  in the \n\n  liver ") == "fibrosis in the\nliver"
+
+
+def test_prepare_abstracts_encodes_decodable_records():
+    result = prepare_abstracts([(7, "PMC9", "Title", [("PURPOSE", "  " + TEXT)]), (8, "", "Empty", [("", " ")])],
+                               "gzip")
+
+    assert len(result) == 1
+
+    pmid, pmc_id, exact_hash, _, payload = result[0]
+    record = PubMedShardCodec("gzip").decode(payload)
+
+    assert (pmid, pmc_id, len(exact_hash)) == (7, "PMC9", 16)
+    assert record["text"] == f"PURPOSE: {TEXT}"
+    assert record["sections"] == [["PURPOSE", TEXT]]
+
+
+def test_prepare_abstracts_hashes_equal_texts_alike():
+    first, second = prepare_abstracts([(1, "", "", [("", TEXT)]), (2, "", "", [("", TEXT.upper() + "  ")])], "none")
+
+    assert first[2] == second[2]
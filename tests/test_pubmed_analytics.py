@@ -0,0 +1,76 @@
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from pubmed_analytics import PubMedAnalytics
+from pubmed_author import PubMedAuthor
+from pubmed_publication import PubMedPublication
+from pubmed_publication_date import PubMedPublicationDate
+
+
+def _publication(pmid: int, keywords=(), authors=(), year: int = 2020) -> PubMedPublication:
+    publication = PubMedPublication()
+    publication.publication_id = pmid
+    publication.publication_date = PubMedPublicationDate(year, 1, 1)
+    publication.keywords = list(keywords)
+    publication.authors = list(authors)
+
+    return publication
+
+
+def _author(author_id: int, last_name: str, fore_name: str) -> PubMedAuthor:
+    author = PubMedAuthor()
+    author.id = author_id
+    author.last_name = last_name
+    author.fore_name = fore_name
+
+    return author
+
+
+def _co_occurrences(analytics: PubMedAnalytics, field: str) -> Counter:
+    rows, columns, counts = analytics.co_occurrence(field)
+    values = analytics.categories(field)
+
+    assert (rows < columns).all()
+    return Counter({(values[row], values[column]): count for row, column, count in zip(rows, columns, counts)})
+
+
+def test_keyword_co_occurrences_match_a_count_of_all_pairs():
+    generator = random.Random(3)
+    vocabulary = [f"keyword {index:02}" for index in range(12)]
+    keyword_lists = [generator.choices(vocabulary, k=generator.randint(0, 7)) for _ in range(300)]
+
+    analytics = PubMedAnalytics(_publication(pmid, keywords) for pmid, keywords in enumerate(keyword_lists, 1))
+
+    expected = Counter(pair for keywords in keyword_lists for pair in combinations(sorted(set(keywords)), 2))
+    assert _co_occurrences(analytics, "keyword") == expected
+
+
+def test_publications_with_one_or_no_keyword_add_no_pairs():
+    analytics = PubMedAnalytics([_publication(1, ["a"]), _publication(2), _publication(3, ["b", "b", " "])])
+
+    rows, columns, counts = analytics.co_occurrence("keyword")
+
+    assert len(rows) == len(columns) == len(counts) == 0
+
+
+def test_co_authorships_tell_authors_of_the_same_name_apart():
+    smith_1, smith_2, miller = _author(1, "Smith", "John"), _author(2, "Smith", "John"), _author(3, "Miller", "Ann")
+    analytics = PubMedAnalytics([_publication(1, authors=[smith_1, miller]),
+                                 _publication(2, authors=[smith_2, miller]),
+                                 _publication(3, authors=[smith_1, miller])])
+
+    rows, columns, counts = analytics.co_occurrence("author")
+
+    assert sorted(counts.tolist()) == [1, 2]
+    assert analytics.top_pairs("author", 1)[0][2] == 2
+    assert analytics.counts("author") == {"Miller, Ann": 3, "Smith, John": 3}
+
+
+def test_co_occurrence_rejects_single_valued_fields():
+    with pytest.raises(ValueError):
+        PubMedAnalytics([_publication(1)]).co_occurrence("year")
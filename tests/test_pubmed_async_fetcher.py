@@ -0,0 +1,119 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import pubmed_fetcher
+from pubmed_async_fetcher import AsyncPubMedFetcher
+from pubmed_fetcher import NCBI_SEARCH_URL, PubMedFetcher
+from pubmed_partitioning import PubMedPartition
+
+FIRST_DAY = date(2020, 1, 1)
+
+
+def _article(pmid: int) -> str:
+    return (f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article><Journal><JournalIssue><PubDate>"
+            f"<Year>2020</Year></PubDate></JournalIssue><Title>J</Title></Journal>"
+            f"<ArticleTitle>Title {pmid}</ArticleTitle></Article></MedlineCitation>"
+            f"<PubmedData><ArticleIdList><ArticleId IdType=\"pubmed\">{pmid}</ArticleId></ArticleIdList>"
+            f"</PubmedData></PubmedArticle>")
+
+
+class _FakeServerFetcher(AsyncPubMedFetcher):
+    """
+    Answers esearch and efetch requests from memory instead of sending them: every PMID has a publication day,
+    efetch portions containing a rejected PMID fail with 400, and the first transient_failures efetch requests
+    fail with 503.
+    """
+    def __init__(self, days: dict[int, date], rejected=(), transient_failures: int = 0):
+        super().__init__()
+        self.days = days
+        self.rejected = set(rejected)
+        self.transient_failures = transient_failures
+        self.searches: list[tuple[date, date]] = []
+        self.fetches: list[list[int]] = []
+
+    async def _request(self, method, url, **kwargs):
+        parameters = kwargs.get("params") or kwargs.get("data")
+
+        if url == NCBI_SEARCH_URL:
+            first, last = (datetime.strptime(parameters[key], "%Y/%m/%d").date() for key in ("mindate", "maxdate"))
+            self.searches.append((first, last))
+            pmids = sorted(pmid for pmid, day in self.days.items() if first <= day <= last)
+            ids = "".join(f"<Id>{pmid}</Id>" for pmid in pmids[:parameters["retmax"]])
+
+            return 200, f"<eSearchResult><Count>{len(pmids)}</Count><IdList>{ids}</IdList></eSearchResult>".encode()
+
+        pmids = [int(pmid) for pmid in parameters["id"].split(",")]
+        self.fetches.append(pmids)
+
+        if self.transient_failures > 0:
+            self.transient_failures -= 1
+            return 503, b""
+
+        if self.rejected.intersection(pmids):
+            return 400, b"Bad Request"
+
+        return 200, f"<PubmedArticleSet>{''.join(_article(pmid) for pmid in pmids)}</PubmedArticleSet>".encode()
+
+
+@pytest.fixture(autouse=True)
+def _offline(monkeypatch):
+    monkeypatch.setattr(AsyncPubMedFetcher, "requests_per_second", 1000)
+    monkeypatch.setattr(PubMedFetcher, "_backoff_seconds", lambda self, attempt: 0)
+    monkeypatch.setattr(PubMedFetcher, "print_intermediate_results", False)
+
+
+def _run(fetcher: AsyncPubMedFetcher, coroutine):
+    async def run():
+        async with fetcher:
+            return await coroutine
+
+    return asyncio.run(run())
+
+
+def test_search_splits_date_ranges_and_records_truncated_days(monkeypatch):
+    monkeypatch.setattr(pubmed_fetcher, "MAXIMUM_NUMBER_OF_RETRIEVABLE_IDS", 5)
+    days = {pmid: FIRST_DAY + timedelta(days=pmid * 3) for pmid in range(1, 21)}
+    days.update({pmid: FIRST_DAY for pmid in range(100, 107)})
+    fetcher = _FakeServerFetcher(days)
+
+    pmids = _run(fetcher, fetcher.search_by_topics(["dicom"], from_year=2020))
+
+    assert sorted(pmids) == list(range(1, 21)) + list(range(100, 105))
+    assert len(fetcher.searches) > 3
+    assert fetcher.fetcher.truncated_searches == [("dicom", FIRST_DAY, 7)]
+
+
+def test_search_selects_the_pmids_of_a_partition():
+    fetcher = _FakeServerFetcher({pmid: FIRST_DAY for pmid in range(1, 101)})
+    partition = PubMedPartition(1, 2)
+
+    pmids = _run(fetcher, fetcher.search_by_topics(["dicom"], partition=partition))
+
+    assert sorted(pmids) == sorted(partition.select(range(1, 101)))
+
+
+def test_iterate_by_ids_retries_transient_failures_and_bisects_rejected_portions():
+    fetcher = _FakeServerFetcher({}, rejected=[3], transient_failures=2)
+    fetcher.batch_sizer.size = 4
+
+    async def fetch():
+        return [publication.publication_id async for publication in fetcher.iterate_by_ids(range(1, 9))]
+
+    pmids = _run(fetcher, fetch())
+
+    assert sorted(pmids) == [1, 2, 4, 5, 6, 7, 8]
+    assert fetcher.fetches[:3] == [[1, 2, 3, 4]] * 3
+    assert [(entry["PMID"], entry["stage"]) for entry in fetcher.dead_letter_queue.entries] == [(3, "fetch")]
+
+
+def test_fetch_by_topics_returns_the_found_publications():
+    fetcher = _FakeServerFetcher({pmid: FIRST_DAY for pmid in range(1, 11)})
+
+    publications = _run(fetcher, fetcher.fetch_by_topics(["dicom", "mri"]))
+
+    assert sorted(publication.publication_id for publication in publications) == list(range(1, 11))
+    assert publications[0].article_title.startswith("Title")
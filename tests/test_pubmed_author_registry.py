@@ -0,0 +1,76 @@
+from pubmed_author import PubMedAuthor
+from pubmed_author_registry import PubMedAuthorRegistry, normalize_identifier, normalize_name
+
+
+def _author(last_name: str, fore_name: str, affiliations=(), **identification) -> PubMedAuthor:
+    author = PubMedAuthor()
+    author.last_name = last_name
+    author.fore_name = fore_name
+    author.affiliations = list(affiliations)
+    author.identification = identification
+
+    return author
+
+
+def test_normalize_name():
+    assert normalize_name("  Müller-Lüdenscheidt ") == "muller ludenscheidt"
+
+
+def test_normalize_identifier():
+    assert normalize_identifier("orcid", "https://orcid.org/0000-0002-1825-009x") == ("ORCID", "000000021825009X")
+
+
+def test_authors_with_the_same_orcid_are_merged():
+    registry = PubMedAuthorRegistry()
+
+    first = registry.register(_author("Smith", "John", ORCID="0000-0002-1825-0097"))
+    second = registry.register(_author("Smith", "J", ORCID="https://orcid.org/0000000218250097"))
+
+    assert first.id == second.id == 1
+    assert registry.find_by_identifier("0000-0002-1825-0097") is registry.get(1)
+
+
+def test_authors_of_the_same_name_are_merged_by_a_common_affiliation():
+    registry = PubMedAuthorRegistry()
+
+    first = registry.register(_author("Smith", "John", ["Dept. of Radiology, Uni A"]))
+    second = registry.register(_author("Smith", "John", ["Dept of Radiology; Uni A", "Clinic B"]))
+    third = registry.register(_author("Smith", "John", ["Clinic C"]))
+
+    assert first.id == second.id == 1
+    assert third.id == 2
+    assert len(registry) == 2
+
+
+def test_different_identifiers_of_the_same_source_keep_authors_apart():
+    registry = PubMedAuthorRegistry()
+
+    first = registry.register(_author("Smith", "John", ["Uni A"], ORCID="0000-0001-0000-0001"))
+    second = registry.register(_author("Smith", "John", ["Uni A"], ORCID="0000-0001-0000-0002"))
+
+    assert first.id != second.id
+
+
+def test_extensions_copy_the_author_and_keep_earlier_instances():
+    registry = PubMedAuthorRegistry()
+
+    first = registry.register(_author("Smith", "John", ["Uni A"]))
+    same = registry.register(_author("Smith", "John", ["Uni A"]))
+    extended = registry.register(_author("Smith", "John", ["Uni A", "Clinic B"], ORCID="0000-0001-0000-0001"))
+
+    assert same is first
+    assert extended is not first and extended.id == first.id
+    assert first.affiliations == ["Uni A"] and first.identification == {}
+    assert extended.affiliations == ["Uni A", "Clinic B"]
+    assert extended.identification == {"ORCID": "0000-0001-0000-0001"}
+    assert registry.get(first.id) is extended
+
+
+def test_find_by_name_prefix():
+    registry = PubMedAuthorRegistry()
+    for last_name, fore_name in [("Smith", "John"), ("Smythe", "Anna"), ("Smith", "Jane"), ("Miller", "Jo")]:
+        registry.register(_author(last_name, fore_name))
+
+    assert [author.fore_name for author in registry.find_by_name_prefix("smith j")] == ["Jane", "John"]
+    assert len(registry.find_by_name_prefix("sm", maximum_count=2)) == 2
+    assert registry.find_by_name_prefix("x") == []
@@ -0,0 +1,60 @@
+from pubmed_batch_sizer import PubMedBatchSizer
+
+
+def test_initial_size_is_clamped():
+    assert PubMedBatchSizer(0).size == 1
+    assert PubMedBatchSizer(20000).size == 10000
+
+
+def test_fast_full_batches_grow_the_size_up_to_the_maximum():
+    sizer = PubMedBatchSizer(200, maximum_size=400)
+
+    sizer.record_success(200, 0.5, 200 * 1000)
+    assert sizer.size == 301
+
+    sizer.record_success(301, 0.5, 301 * 1000)
+    assert sizer.size == 400
+
+
+def test_short_last_portions_do_not_grow_the_size():
+    sizer = PubMedBatchSizer(200)
+
+    sizer.record_success(17, 0.1, 17 * 1000)
+
+    assert sizer.size == 200
+
+
+def test_slow_responses_halve_the_size():
+    sizer = PubMedBatchSizer(200, target_latency=5.0)
+
+    sizer.record_success(200, 6.0, 200 * 1000)
+    assert sizer.size == 100
+
+    sizer.record_success(100, 3.0, 100 * 1000)
+    assert sizer.size == 100
+
+
+def test_big_responses_keep_the_next_one_inside_the_memory_budget():
+    sizer = PubMedBatchSizer(200, maximum_response_bytes=1000 * 1000)
+
+    sizer.record_success(200, 0.5, 200 * 10 * 1000)
+
+    assert sizer.size == 100
+
+
+def test_failures_halve_the_size_down_to_the_minimum():
+    sizer = PubMedBatchSizer(5, minimum_size=2)
+
+    sizer.record_failure()
+    assert sizer.size == 2
+
+    sizer.record_failure()
+    assert sizer.size == 2
+
+
+def test_requests_without_ids_are_ignored():
+    sizer = PubMedBatchSizer(200)
+
+    sizer.record_success(0, 100.0, 0)
+
+    assert sizer.size == 200
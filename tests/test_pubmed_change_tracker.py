@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from pubmed_change_tracker import ADDED, DELETED, MODIFIED, UNCHANGED, PubMedChangeTracker
+from pubmed_publication import PubMedPublication
+
+
+def _publication(pmid: int, content_hash: str = "a") -> PubMedPublication:
+    publication = PubMedPublication()
+    publication.publication_id = pmid
+    publication.content_hash = f"{content_hash}{pmid}"
+
+    return publication
+
+
+def _read_feed(file_name) -> list[tuple[int, str]]:
+    with open(file_name, encoding="utf-8") as file:
+        return [(change["PMID"], change["change"]) for change in map(json.loads, file)]
+
+
+def test_classify_detects_additions_and_modifications(tmp_path):
+    with PubMedChangeTracker(str(tmp_path / "state.db"), str(tmp_path / "feed.jsonl")) as tracker:
+        assert tracker.classify(_publication(1)) == ADDED
+        assert tracker.classify(_publication(1)) == UNCHANGED
+        assert tracker.classify(_publication(1, "b")) == MODIFIED
+        assert tracker.is_unchanged(_publication(1, "b"))
+
+    assert _read_feed(tmp_path / "feed.jsonl") == [(1, ADDED), (1, MODIFIED)]
+
+
+def test_filter_changed_yields_added_and_modified_publications(tmp_path):
+    with PubMedChangeTracker(str(tmp_path / "state.db")) as tracker:
+        list(tracker.filter_changed([_publication(1), _publication(2)]))
+
+    with PubMedChangeTracker(str(tmp_path / "state.db")) as tracker:
+        changed = tracker.filter_changed([_publication(1), _publication(2, "b"), _publication(3)])
+
+        assert [publication.publication_id for publication in changed] == [2, 3]
+        assert tracker.counts == {ADDED: 1, MODIFIED: 1, UNCHANGED: 1, DELETED: 0}
+
+
+def test_a_crashed_run_processes_the_failed_publication_again(tmp_path):
+    processed = []
+
+    def process(publications):
+        for publication in publications:
+            if publication.publication_id == 2:
+                raise RuntimeError("crash")
+            processed.append(publication.publication_id)
+
+    with pytest.raises(RuntimeError):
+        with PubMedChangeTracker(str(tmp_path / "state.db"), str(tmp_path / "feed.jsonl")) as tracker:
+            process(tracker.filter_changed([_publication(1), _publication(2), _publication(3)]))
+
+    with PubMedChangeTracker(str(tmp_path / "state.db"), str(tmp_path / "feed.jsonl")) as tracker:
+        changed = [publication.publication_id
+                   for publication in tracker.filter_changed([_publication(1), _publication(2), _publication(3)])]
+
+    # The crashed run committed nothing, so the re-run yields all publications again, and the feed lists each once.
+    assert processed == [1]
+    assert changed == [1, 2, 3]
+    assert _read_feed(tmp_path / "feed.jsonl") == [(1, ADDED), (2, ADDED), (3, ADDED)]
+
+
+def test_before_commit_is_called_before_the_hashes_are_committed(tmp_path):
+    events = []
+
+    with PubMedChangeTracker(str(tmp_path / "state.db"), before_commit=lambda: events.append("flush")) as tracker:
+        tracker.classify(_publication(1))
+        assert events == []
+
+    assert events == ["flush"]
+
+
+def test_record_deleted_and_refresh(tmp_path):
+    with PubMedChangeTracker(str(tmp_path / "state.db"), str(tmp_path / "feed.jsonl")) as tracker:
+        for pmid in (1, 2, 3):
+            tracker.classify(_publication(pmid))
+
+        tracker.record_deleted([3, 4])
+
+        tracker.begin_refresh()
+        tracker.classify(_publication(1))
+
+        assert tracker.end_refresh() == [2]
+
+    assert _read_feed(tmp_path / "feed.jsonl")[3:] == [(3, DELETED), (2, DELETED)]
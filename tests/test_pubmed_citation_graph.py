@@ -0,0 +1,89 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import pubmed_citation_graph
+from pubmed_citation_graph import PubMedCitationGraph
+from pubmed_fetcher import PubMedFetcher
+
+
+def _create_graph() -> PubMedCitationGraph:
+    graph = PubMedCitationGraph()
+
+    for citing, cited in [(1, 10), (1, 11), (2, 10), (2, 11), (3, 10), (3, 12), (1, 10)]:
+        graph.add_citation(citing, cited)
+
+    return graph
+
+
+def test_csr_arrays_hold_both_directions_without_duplicates():
+    graph = _create_graph()
+
+    assert graph.number_of_nodes == 6
+    assert graph.number_of_edges == 6
+    assert sorted(graph.references(1)) == [10, 11]
+    assert sorted(graph.cited_by(10)) == [1, 2, 3]
+    assert graph.out_degree(12) == 0 and graph.in_degree(12) == 1
+    assert len(graph.references(99)) == 0
+
+
+def test_degrees_are_aligned_with_the_pmids():
+    pmids, in_degrees = _create_graph().in_degrees()
+
+    assert dict(zip(pmids.tolist(), in_degrees.tolist())) == {1: 0, 10: 3, 11: 2, 2: 0, 3: 0, 12: 1}
+
+
+def test_arrays_are_rebuilt_after_additions():
+    graph = _create_graph()
+    assert graph.in_degree(12) == 1
+
+    graph.add_citation(4, 12)
+
+    assert sorted(graph.cited_by(12)) == [3, 4]
+    assert graph.number_of_edges == 7
+
+
+def test_co_citations():
+    graph = _create_graph()
+
+    assert graph.co_citation_count(10, 11) == 2
+    assert graph.co_cited(10) == [(11, 2), (12, 1)]
+    assert graph.co_cited(99) == []
+
+
+class _LinkFetcher(PubMedFetcher):
+    """
+    Answers elink requests from a dictionary of links; requests containing a failing PMID raise.
+    """
+    def __init__(self, links: dict[int, list[int]], failing_pmid: int):
+        super().__init__()
+        self.links = links
+        self.failing_pmid = failing_pmid
+
+    def _send_with_retries(self, method, url, parse, **kwargs):
+        pmids = [int(value) for name, value in kwargs["data"] if name == "id"]
+        if self.failing_pmid in pmids:
+            raise ValueError("elink failed 5 times: STATUS_429")
+
+        link_sets = "".join(f"<LinkSet><IdList><Id>{pmid}</Id></IdList><LinkSetDb>"
+                            + "".join(f"<Link><Id>{linked}</Id></Link>" for linked in self.links.get(pmid, []))
+                            + "</LinkSetDb></LinkSet>" for pmid in pmids)
+
+        return parse(f"<eLinkResult>{link_sets}</eLinkResult>")
+
+
+def test_expand_skips_and_dead_letters_failed_portions(monkeypatch):
+    monkeypatch.setattr(pubmed_citation_graph, "NUMBER_OF_IDS_IN_LINK_REQUEST", 1)
+    fetcher = _LinkFetcher({1: [10, 11], 2: [20], 10: [100]}, failing_pmid=2)
+    graph = PubMedCitationGraph(fetcher)
+
+    graph.expand([1, 2], depth=2)
+
+    assert sorted(graph.references(1)) == [10, 11]
+    assert list(graph.references(10)) == [100]
+    assert [(entry["PMID"], entry["stage"]) for entry in fetcher.dead_letter_queue.entries] == [(2, "link")]
+
+    fetcher.failing_pmid = 0
+    graph.expand([2])
+
+    assert list(graph.references(2)) == [20]
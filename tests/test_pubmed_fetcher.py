@@ -0,0 +1,128 @@
+import sys
+import types
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import pubmed_fetcher
+from pubmed_fetcher import PubMedFetcher
+
+
+def _article(pmid: int, journal: bool = True) -> str:
+    x_journal = "<Journal><JournalIssue><PubDate><Year>2020</Year></PubDate></JournalIssue><Title>J</Title></Journal>"
+
+    return (f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>{x_journal if journal else ''}"
+            f"<ArticleTitle>Title {pmid}</ArticleTitle></Article></MedlineCitation>"
+            f"<PubmedData><ArticleIdList><ArticleId IdType=\"pubmed\">{pmid}</ArticleId></ArticleIdList>"
+            f"</PubmedData></PubmedArticle>")
+
+
+class _Response:
+    def __init__(self, status_code: int, text: str = ""):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+
+
+class _EFetchFetcher(PubMedFetcher):
+    """
+    Answers efetch requests from memory: portions containing a rejected PMID fail with 400,
+    the first transient_failures requests fail with 503, missing PMIDs are left out of the response
+    and unparseable PMIDs are answered by an article without a journal.
+    """
+    def __init__(self, rejected=(), missing=(), unparseable=(), transient_failures: int = 0):
+        super().__init__()
+        self.rejected = set(rejected)
+        self.missing = set(missing)
+        self.unparseable = set(unparseable)
+        self.transient_failures = transient_failures
+        self.requests: list[list[int]] = []
+
+    def _send(self, method, url, **kwargs):
+        pmids = [int(pmid) for pmid in (kwargs.get("params") or kwargs.get("data"))["id"].split(",")]
+        self.requests.append(pmids)
+
+        if self.transient_failures > 0:
+            self.transient_failures -= 1
+            return _Response(503)
+
+        if self.rejected.intersection(pmids):
+            return _Response(400, "Bad Request")
+
+        articles = "".join(_article(pmid, pmid not in self.unparseable) for pmid in pmids if pmid not in self.missing)
+
+        return _Response(200, f"<PubmedArticleSet>{articles}</PubmedArticleSet>")
+
+
+@pytest.fixture(autouse=True)
+def _offline(monkeypatch):
+    requests = types.ModuleType("requests")
+    requests.RequestException = type("RequestException", (IOError,), {})
+    monkeypatch.setitem(sys.modules, "requests", requests)
+    monkeypatch.setattr(pubmed_fetcher.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(PubMedFetcher, "print_intermediate_results", False)
+
+
+def _dead_letters(fetcher: PubMedFetcher) -> list[tuple[int, str]]:
+    return sorted((entry["PMID"], entry["stage"]) for entry in fetcher.dead_letter_queue.entries)
+
+
+def test_portions_follow_the_batch_sizer():
+    fetcher = _EFetchFetcher()
+    fetcher.batch_sizer.size = 4
+
+    publications = fetcher._extract_publications(list(range(1, 11)))
+
+    assert [publication.publication_id for publication in publications] == list(range(1, 11))
+    assert fetcher.requests[0] == [1, 2, 3, 4]
+    assert len(fetcher.dead_letter_queue) == 0
+
+
+def test_transient_failures_retry_the_same_portion():
+    fetcher = _EFetchFetcher(transient_failures=3)
+    fetcher.batch_sizer.size = 10
+
+    publications = fetcher._extract_publications([1, 2, 3])
+
+    assert len(publications) == 3
+    assert fetcher.requests == [[1, 2, 3]] * 4
+    assert fetcher.batch_sizer.size == 10
+
+
+def test_persistent_transient_failures_stop_the_run():
+    fetcher = _EFetchFetcher(transient_failures=1000)
+
+    with pytest.raises(ValueError):
+        fetcher._extract_publications([1, 2, 3])
+
+    assert len(fetcher.requests) == pubmed_fetcher.MAXIMUM_NUMBER_OF_TRANSIENT_FAILURES
+
+
+def test_rejected_portions_are_bisected_down_to_the_failing_pmids():
+    fetcher = _EFetchFetcher(rejected=[3, 6])
+    fetcher.batch_sizer.size = 8
+
+    publications = fetcher._extract_publications(list(range(1, 9)))
+
+    assert sorted(publication.publication_id for publication in publications) == [1, 2, 4, 5, 7, 8]
+    assert _dead_letters(fetcher) == [(3, "fetch"), (6, "fetch")]
+    assert all(entry["error"] == "STATUS_400" for entry in fetcher.dead_letter_queue.entries)
+
+
+def test_missing_and_unparseable_articles_go_to_the_dead_letter_queue():
+    fetcher = _EFetchFetcher(missing=[2], unparseable=[3])
+
+    publications = fetcher._extract_publications([1, 2, 3, 4])
+
+    assert [publication.publication_id for publication in publications] == [1, 4]
+    assert _dead_letters(fetcher) == [(2, "missing"), (3, "parse")]
+    assert all(("<PMID>3</PMID>" in entry.get("xml", "")) == (entry["stage"] == "parse")
+               for entry in fetcher.dead_letter_queue.entries)
+
+
+def test_ids_without_type_are_skipped():
+    x_article = ET.fromstring(_article(5).replace("<ArticleIdList>", "<ArticleIdList><ArticleId>x</ArticleId>"))
+
+    publication = PubMedFetcher()._extract_publication(x_article)
+
+    assert publication.article_ids == {"PUBMED": "5"}
@@ -0,0 +1,108 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import pubmed_partitioning
+from pubmed_partitioning import PubMedPartition, PubMedWorkQueue, merge_bibtex_files, merge_xml_files, \
+    partition_file_name
+
+PMIDS = list(range(1000, 3000))
+
+
+@pytest.mark.parametrize("method", ["hash", "range"])
+def test_partitions_split_the_pmids_without_overlap(method):
+    shards = [PubMedPartition(shard, 4, method).select(PMIDS) for shard in range(1, 5)]
+
+    assert sorted(pmid for shard in shards for pmid in shard) == PMIDS
+    assert all(300 < len(shard) < 700 for shard in shards)
+
+
+def test_hash_partition_is_independent_of_the_id_list():
+    partition = PubMedPartition(2, 3)
+
+    assert partition.select(PMIDS[:500]) == [pmid for pmid in partition.select(PMIDS) if pmid < PMIDS[500]]
+    assert partition.select(str(pmid) for pmid in PMIDS[:10]) == partition.select(PMIDS[:10])
+
+
+def test_range_partition_selects_contiguous_ranges():
+    partition = PubMedPartition.parse("1/2", "range")
+
+    assert partition.select(reversed(PMIDS)) == PMIDS[:1000]
+
+
+@pytest.mark.parametrize("specification", ["0/3", "4/3", "2", "a/b"])
+def test_invalid_shards_are_rejected(specification):
+    with pytest.raises(ValueError):
+        PubMedPartition.parse(specification)
+
+
+def test_partition_file_name():
+    assert partition_file_name("out/results.xml", "shard-2-of-4") == "out/results.shard-2-of-4.xml"
+
+
+def test_work_queue_hands_out_expired_leases_again(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pubmed_partitioning.time, "time", lambda: now[0])
+
+    with PubMedWorkQueue(str(tmp_path / "queue.db"), lease_seconds=60) as queue:
+        assert queue.add(["1", "2", "3"]) == 3
+        assert queue.add(["3", "4"]) == 1
+
+        first = queue.acquire("worker-a", 2)
+        second = queue.acquire("worker-b", 10)
+        assert sorted(first + second) == ["1", "2", "3", "4"]
+
+        queue.complete(first[:1])
+        assert queue.acquire("worker-b", 10) == []
+
+        now[0] += 61
+        assert sorted(queue.acquire("worker-b", 10)) == sorted(first[1:] + second)
+        assert queue.counts() == {"open": 0, "leased": 3, "done": 1}
+
+
+def test_work_queue_iterate_completes_after_before_complete(tmp_path):
+    events = []
+
+    with PubMedWorkQueue(str(tmp_path / "queue.db")) as queue:
+        queue.add(["1", "2", "3"])
+
+        for batch in queue.iterate("worker", 2, lambda: events.append(queue.counts()["done"])):
+            events.append(batch)
+
+        assert queue.counts()["done"] == 3
+
+    assert events == [["1", "2"], 0, ["3"], 2]
+
+
+def test_interrupted_iteration_releases_the_batch(tmp_path):
+    with PubMedWorkQueue(str(tmp_path / "queue.db")) as queue:
+        queue.add(["1", "2"])
+
+        batches = queue.iterate("worker", 1)
+        next(batches)
+        batches.close()
+
+        assert queue.counts() == {"open": 2, "leased": 0, "done": 0}
+
+
+def test_merge_xml_files_keeps_the_publications_of_a_truncated_part(tmp_path):
+    header = '<?xml version="1.0" encoding="utf-8"?>\n<PubMedPublications>\n'
+    (tmp_path / "a.xml").write_text(header + '<PubMedPublication id="1" />\n<PubMedPublication id="2" />\n'
+                                    "</PubMedPublications>\n")
+    (tmp_path / "b.xml").write_text(header + '<PubMedPublication id="2" />\n<PubMedPublication id="3" />\n'
+                                    '<PubMedPublication id="4"><Tit')
+
+    count = merge_xml_files([str(tmp_path / "a.xml"), str(tmp_path / "b.xml")], str(tmp_path / "merged.xml"))
+
+    assert count == 3
+    assert [x.get("id") for x in ET.parse(tmp_path / "merged.xml").getroot()] == ["1", "2", "3"]
+
+
+def test_merge_bibtex_files_skips_duplicates_and_a_truncated_entry(tmp_path):
+    (tmp_path / "a.bib").write_text('@article{PMID:1,\n\ttitle = "A"\n}\n\n@article{PMID:2,\n\ttitle = "B"\n}\n\n')
+    (tmp_path / "b.bib").write_text('@article{PMID:2,\n\ttitle = "B"\n}\n\n@article{PMID:3,\n\ttitle = "C')
+
+    count = merge_bibtex_files([str(tmp_path / "a.bib"), str(tmp_path / "b.bib")], str(tmp_path / "merged.bib"))
+
+    assert count == 2
+    assert (tmp_path / "merged.bib").read_text().count("@article") == 2
@@ -0,0 +1,52 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from pubmed_publication_date import PubMedPublicationDate, parse_medline_date, parse_month
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2019 Nov-Dec", (2019, 11, 0)),
+    ("1998 Dec-1999 Jan", (1998, 12, 0)),
+    ("1975 Aug 15-21", (1975, 8, 15)),
+    ("2000-2001", (2000, 0, 0)),
+    ("2000 Spring", (2000, 3, 0)),
+    ("2003 Winter", (2003, 1, 0)),
+    ("2010 Fall-Winter", (2010, 9, 0)),
+    ("Summer 2001", (2001, 6, 0)),
+    ("Autumn 1999", (1999, 9, 0)),
+    ("2012 Jan-Feb", (2012, 1, 0)),
+    ("1999 Jul 32", (1999, 7, 0)),
+    ("unknown", (0, 0, 0)),
+])
+def test_parse_medline_date(text, expected):
+    assert parse_medline_date(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Jan", 1), ("january", 1), ("09", 9), ("13", 0), ("Spring", 3), ("Summer", 6), ("Fall", 9), ("Winter", 1),
+    ("Smarch", 0),
+])
+def test_parse_month(text, expected):
+    assert parse_month(text) == expected
+
+
+def test_from_xml_element_reads_a_medline_date():
+    x_date = ET.fromstring("<PubDate><MedlineDate>1998 Dec-1999 Jan</MedlineDate></PubDate>")
+    date = PubMedPublicationDate.from_xml_element(x_date)
+
+    assert (date.year, date.month, date.day) == (1998, 12, 0)
+
+
+def test_from_xml_element_reads_a_season():
+    x_date = ET.fromstring("<PubDate><Year>2004</Year><Season>Summer</Season></PubDate>")
+    date = PubMedPublicationDate.from_xml_element(x_date)
+
+    assert (date.year, date.month, date.day) == (2004, 6, 0)
+
+
+def test_ordinal_round_trip():
+    date = PubMedPublicationDate(2019, "Nov", 5)
+
+    assert date.ordinal == 20191105
+    assert PubMedPublicationDate.from_ordinal(date.ordinal).ordinal == date.ordinal
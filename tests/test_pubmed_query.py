@@ -0,0 +1,54 @@
+import pytest
+
+from pubmed_query import PubMedQuery
+
+
+def test_canonical_sorts_the_operands_of_and_and_or():
+    assert PubMedQuery("mri AND dicom").canonical() == PubMedQuery("dicom AND mri").canonical()
+    assert PubMedQuery("(pacs OR dicom) AND mri").canonical() == PubMedQuery("mri AND (dicom OR pacs)").canonical()
+
+
+def test_canonical_keeps_the_order_of_not():
+    assert PubMedQuery("dicom NOT review[pt]").canonical() != PubMedQuery("review[pt] NOT dicom").canonical()
+
+
+def test_operators_are_evaluated_from_left_to_right():
+    assert PubMedQuery("dicom OR pacs AND mri").canonical() == PubMedQuery("(dicom OR pacs) AND mri").canonical()
+
+
+def test_terms_keep_phrases_and_field_tags():
+    query = PubMedQuery('"prostate cancer"[mh] AND mri[tiab] NOT review[pt]')
+
+    assert query.terms() == {'"prostate cancer"[mh]', "mri[tiab]", "review[pt]"}
+
+
+def test_consecutive_words_form_a_single_term():
+    assert PubMedQuery("prostate cancer AND mri").terms() == {"prostate cancer", "mri"}
+
+
+def test_evaluate_uses_set_algebra():
+    ids_by_term = {"dicom": {1, 2, 3}, "pacs": {3, 4}, "review[pt]": {2, 3, 4}}
+
+    assert PubMedQuery("dicom AND pacs").evaluate(ids_by_term) == {3}
+    assert PubMedQuery("dicom OR pacs").evaluate(ids_by_term) == {1, 2, 3, 4}
+    assert PubMedQuery("(dicom OR pacs) NOT review[pt]").evaluate(ids_by_term) == {1}
+
+
+def test_evaluate_matches_the_canonical_query():
+    ids_by_term = {"a": {1, 2, 3, 5}, "b": {2, 3, 4}, "c": {3, 5}}
+    query = PubMedQuery("a OR b NOT c")
+
+    assert query.evaluate(ids_by_term) == PubMedQuery(query.canonical()).evaluate(ids_by_term) == {1, 2, 4}
+
+
+def test_from_topics_combines_the_topics_by_and():
+    query = PubMedQuery.from_topics(["dicom OR pacs", "mri"])
+
+    assert query.canonical() == PubMedQuery("mri AND (pacs OR dicom)").canonical()
+    assert query.evaluate({"dicom": {1, 2}, "pacs": {3}, "mri": {2, 3, 4}}) == {2, 3}
+
+
+@pytest.mark.parametrize("expression", ["(dicom AND mri", "dicom AND mri)", "dicom AND", "AND dicom"])
+def test_malformed_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        PubMedQuery(expression)
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from pubmed_shards import PubMedShardCodec, PubMedShardReader, PubMedShardWriter, merge_shard_folders
+
+RECORD = {"PMID": 12345, "PMCID": "PMC678", "text": "Ünïcode text\nwith two lines"}
+
+
+@pytest.mark.parametrize("compression", ["gzip", "none", "zstd"])
+def test_codec_round_trip(compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    codec = PubMedShardCodec(compression)
+
+    assert codec.decode(codec.encode(RECORD)) == RECORD
+
+
+def test_codec_rejects_unknown_compressions():
+    with pytest.raises(ValueError):
+        PubMedShardCodec("bzip2")
+
+
+def _write_folder(folder, pmids, maximum_shard_size=1):
+    with PubMedShardWriter(str(folder), maximum_shard_size) as writer:
+        for pmid in pmids:
+            writer.write({"PMID": pmid, "text": f"abstract {pmid}"}, [str(pmid), f"PMC{pmid}"])
+
+
+def test_writer_and_reader_round_trip(tmp_path):
+    _write_folder(tmp_path, [1, 2, 3])
+
+    with PubMedShardReader(str(tmp_path)) as reader:
+        assert reader["2"]["text"] == "abstract 2"
+        assert reader["PMC3"]["PMID"] == 3
+        assert "4" not in reader
+        assert sorted(record["PMID"] for record in reader) == [1, 2, 3]
+
+
+def test_merge_shard_folders(tmp_path):
+    _write_folder(tmp_path / "a", [1, 2])
+    _write_folder(tmp_path / "b", [2, 3, 4])
+
+    number_of_shards = merge_shard_folders([str(tmp_path / "a"), str(tmp_path / "b")], str(tmp_path / "merged"))
+
+    assert number_of_shards == 5
+    assert len([name for name in os.listdir(tmp_path / "merged") if name.startswith("shard-")]) == 5
+
+    with PubMedShardReader(str(tmp_path / "merged")) as reader:
+        assert [reader[str(pmid)]["text"] for pmid in (1, 2, 3, 4)] == [f"abstract {pmid}" for pmid in (1, 2, 3, 4)]
+        assert reader["PMC4"]["PMID"] == 4
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from pubmed_text_processor import CHUNKS_EXTENSION, PubMedTextProcessor, chunk_text, clean_text, process_document, \
+    write_document
+
+
+def _page(number: int, body: str) -> str:
+    return f"Journal of Imaging 2020; 12\n\n{body}\n\n{number}\n"
+
+
+PAGES = [
+    _page(1, "A study of DICOM\n\nAbstract\nWe evaluate struc-\ntured reports."),
+    _page(2, "1. Introduction\nReports are often free text. They are\nhard to parse."),
+    _page(3, "Methods:\nWe collected 100 reports.\n\nResults\nAll reports were valid."),
+    _page(4, "References\n1. Smith J. Reports. 2019.\n\nAppendix\nThe template."),
+]
+
+
+def test_clean_text_removes_running_lines_page_numbers_and_references():
+    cleaned_text, _ = clean_text("\f".join(PAGES))
+
+    assert "Journal of Imaging" not in cleaned_text
+    assert "Smith J." not in cleaned_text
+    assert "\n4\n" not in cleaned_text and not cleaned_text.endswith("4")
+    assert "We evaluate structured reports." in cleaned_text
+    assert "Reports are often free text. They are hard to parse." in cleaned_text
+
+
+def test_clean_text_sections_point_into_the_cleaned_text():
+    cleaned_text, sections = clean_text("\f".join(PAGES))
+
+    assert [name for name, _, _ in sections] == ["", "abstract", "introduction", "methods", "results", "appendix"]
+    assert cleaned_text[sections[0][1]: sections[0][2]] == "A study of DICOM"
+    assert cleaned_text[sections[3][1]: sections[3][2]] == "Methods:\n\nWe collected 100 reports."
+    assert sections[-1][2] == len(cleaned_text)
+    assert all(end <= next_start for (_, _, end), (_, next_start, _) in zip(sections, sections[1:]))
+
+
+def _section_text(words: int) -> str:
+    return " ".join(f"word{index}." if index % 10 == 9 else f"word{index}" for index in range(words))
+
+
+def test_chunks_stay_inside_their_sections_and_overlap():
+    text = _section_text(100) + "\n\n" + _section_text(25)
+    sections = [("introduction", 0, text.index("\n\n")), ("methods", text.index("\n\n") + 2, len(text))]
+
+    chunks = chunk_text(text, sections, chunk_size=32, chunk_overlap=8)
+
+    for chunk in chunks:
+        name, start, end = next(section for section in sections if section[0] == chunk["section"])
+        assert start <= chunk["start"] < chunk["end"] <= end
+        assert chunk["text"] == text[chunk["start"]: chunk["end"]]
+        assert chunk["tokens"] == len(chunk["text"].split()) <= 32
+
+    introduction = [chunk for chunk in chunks if chunk["section"] == "introduction"]
+    assert introduction[0]["start"] == 0 and introduction[-1]["end"] == sections[0][2]
+    assert all(previous["end"] > following["start"] for previous, following in zip(introduction, introduction[1:]))
+    assert [chunk["chunk"] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_chunks_end_at_a_sentence_end_in_their_last_quarter():
+    text = _section_text(100)
+
+    chunks = chunk_text(text, [("", 0, len(text))], chunk_size=32, chunk_overlap=4)
+
+    assert chunks[0]["tokens"] == 30
+    assert chunks[0]["text"].endswith("word29.")
+
+
+def test_overlap_must_be_smaller_than_the_chunk_size():
+    with pytest.raises(ValueError):
+        PubMedTextProcessor(chunk_size=8, chunk_overlap=8)
+
+
+def test_write_document(tmp_path):
+    cleaned_text, chunks = process_document("\f".join(PAGES), chunk_size=16, chunk_overlap=4)
+
+    write_document(str(tmp_path / "PMC1.txt"), cleaned_text, chunks)
+
+    assert (tmp_path / "PMC1.txt").read_text(encoding="utf-8") == cleaned_text
+    lines = (tmp_path / f"PMC1{CHUNKS_EXTENSION}").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["PMCID"] for line in lines] == ["PMC1"] * len(chunks)
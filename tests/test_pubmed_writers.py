@@ -0,0 +1,84 @@
+import csv
+import xml.etree.ElementTree as ET
+
+from pubmed_publication import PubMedPublication
+from pubmed_writers import INFO_FIELDS, PubMedInfoWriter, PubMedXmlWriter, export_bibtex, to_info_entry
+
+
+def _publication(pmid: int) -> PubMedPublication:
+    publication = PubMedPublication()
+    publication.publication_id = pmid
+    publication.article_title = f"Title, with a comma {pmid}"
+    publication.article_ids = {"PMC": f"PMC{pmid}", "DOI": f"10.1000/{pmid}"}
+
+    return publication
+
+
+def _read_rows(file_name) -> list[list[str]]:
+    with open(file_name, encoding="utf-8", newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_to_info_entry():
+    assert to_info_entry(_publication(7)) == {"PMCID": "PMC7", "PMID": 7, "DOI": "10.1000/7",
+                                              "Title": "Title, with a comma 7"}
+
+
+def test_info_writer_writes_the_pandas_layout(tmp_path):
+    with PubMedInfoWriter(str(tmp_path / "info.csv")) as writer:
+        for pmid in (1, 2):
+            writer.write(to_info_entry(_publication(pmid)))
+
+    assert _read_rows(tmp_path / "info.csv") == [[""] + INFO_FIELDS,
+                                                 ["0", "PMC1", "1", "10.1000/1", "Title, with a comma 1"],
+                                                 ["1", "PMC2", "2", "10.1000/2", "Title, with a comma 2"]]
+
+
+def test_info_writer_continues_the_index_when_appending(tmp_path):
+    with PubMedInfoWriter(str(tmp_path / "info.csv")) as writer:
+        writer.write(to_info_entry(_publication(1)))
+
+    with PubMedInfoWriter(str(tmp_path / "info.csv"), append=True) as writer:
+        writer.write(to_info_entry(_publication(2)))
+
+    rows = _read_rows(tmp_path / "info.csv")
+
+    assert [row[:3] for row in rows] == [["", "PMCID", "PMID"], ["0", "PMC1", "1"], ["1", "PMC2", "2"]]
+
+
+def test_entries_are_flushed_every_flush_every_entries(tmp_path):
+    writer = PubMedInfoWriter(str(tmp_path / "info.csv"), flush_every=2)
+
+    writer.write(to_info_entry(_publication(1)))
+    assert len(_read_rows(tmp_path / "info.csv")) == 0
+
+    writer.write(to_info_entry(_publication(2)))
+    assert len(_read_rows(tmp_path / "info.csv")) == 3
+
+    writer.write(to_info_entry(_publication(3)))
+    writer.flush()
+    assert len(_read_rows(tmp_path / "info.csv")) == 4
+
+    writer.close()
+    writer.close()
+
+
+def test_xml_writer_writes_a_well_formed_file(tmp_path):
+    with PubMedXmlWriter(str(tmp_path / "publications.xml")) as writer:
+        writer.write(_publication(1))
+        writer.write_element(_publication(2).to_xml())
+
+    x_root = ET.parse(tmp_path / "publications.xml").getroot()
+
+    assert x_root.tag == "PubMedPublications"
+    assert [x_publication.get("id") for x_publication in x_root] == ["1", "2"]
+
+
+def test_export_bibtex(tmp_path):
+    count = export_bibtex((_publication(pmid) for pmid in (1, 2, 3)), str(tmp_path / "references.bib"))
+
+    text = (tmp_path / "references.bib").read_text(encoding="utf-8")
+
+    assert count == 3
+    assert [line for line in text.splitlines() if line.startswith("@article")] == \
+           ["@article{PMID:1,", "@article{PMID:2,", "@article{PMID:3,"]